@@ -0,0 +1,48 @@
+"""add job retry columns
+
+Revision ID: a9d04e7c3f58
+Revises: f5c19d8b2a06
+Create Date: 2026-10-19 15:48:33.205117
+
+Cola durable de parse: reintentos con backoff (attempts/max_attempts/run_after),
+lock del worker (locked_by/locked_at) y status DEAD como dead-letter.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d04e7c3f58'
+down_revision: Union[str, Sequence[str], None] = 'f5c19d8b2a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("jobs", sa.Column("attempts", sa.Integer(), nullable=False, server_default=sa.text("0")))
+    op.add_column("jobs", sa.Column("max_attempts", sa.Integer(), nullable=False, server_default=sa.text("1")))
+    op.add_column("jobs", sa.Column("run_after", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")))
+    op.add_column("jobs", sa.Column("locked_by", sa.Text(), nullable=True))
+    op.add_column("jobs", sa.Column("locked_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("jobs", sa.Column("last_error", sa.Text(), nullable=True))
+    # lo que el worker busca: QUEUED listos para correr, por kind
+    op.create_index(
+        "ix_jobs_queue",
+        "jobs",
+        ["kind", "run_after"],
+        postgresql_where=sa.text("status = 'QUEUED'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_jobs_queue", table_name="jobs")
+    op.drop_column("jobs", "last_error")
+    op.drop_column("jobs", "locked_at")
+    op.drop_column("jobs", "locked_by")
+    op.drop_column("jobs", "run_after")
+    op.drop_column("jobs", "max_attempts")
+    op.drop_column("jobs", "attempts")
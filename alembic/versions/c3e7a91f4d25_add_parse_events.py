@@ -0,0 +1,41 @@
+"""add parse events
+
+Revision ID: c3e7a91f4d25
+Revises: a9d04e7c3f58
+Create Date: 2026-10-19 18:02:41.517304
+
+Eventos de progreso del parse (parse_events.py): los escribe el parse (API o worker) y los lee
+GET /v1/drafts/{id}/parse/stream, que puede reconectarse con Last-Event-ID sin re-parsear.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e7a91f4d25'
+down_revision: Union[str, Sequence[str], None] = 'a9d04e7c3f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "parse_events",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True),
+        sa.Column("draft_id", sa.Text(), nullable=False),
+        sa.Column("run_id", sa.Text(), nullable=False),
+        sa.Column("stage", sa.Text(), nullable=False),
+        sa.Column("data", postgresql.JSONB(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_parse_events_draft_id", "parse_events", ["draft_id", "id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_parse_events_draft_id", table_name="parse_events")
+    op.drop_table("parse_events")
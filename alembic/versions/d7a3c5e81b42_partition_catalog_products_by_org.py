@@ -0,0 +1,203 @@
+"""partition catalog_products by org_id
+
+Revision ID: d7a3c5e81b42
+Revises: b41f0c9e2d17
+Create Date: 2026-10-19 11:40:51.602114
+
+CATALOG_PARTITION_MODE=list (default): LIST por org_id, una partición por org
+  + partición DEFAULT. Las particiones nuevas se crean con ensure_catalog_partition(org_id)
+  (la sync del catálogo la llama antes de insertar).
+CATALOG_PARTITION_MODE=hash: HASH por org_id en CATALOG_HASH_PARTITIONS particiones
+  (para muchos orgs chicos; no requiere auto-creación).
+
+Base fresca (catalog_products lo creaba Supabase, no alembic): si la tabla no existe se crea
+directamente particionada con las columnas que usan search/matching. Si existe, se le agregan
+search_text/search_tsv si faltan, se copia a la tabla particionada y la original se borra.
+Con CATALOG_KEEP_LEGACY=true queda como catalog_products_legacy para verificar la copia; se
+borra a mano después con `DROP TABLE catalog_products_legacy` (el downgrade no la necesita).
+"""
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a3c5e81b42'
+down_revision: Union[str, Sequence[str], None] = 'b41f0c9e2d17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+ENSURE_PARTITION_FN = """
+CREATE OR REPLACE FUNCTION ensure_catalog_partition(p_org_id text) RETURNS text
+LANGUAGE plpgsql AS $$
+DECLARE
+  part_name text := 'catalog_products_o_' || substr(md5(p_org_id), 1, 12);
+  strategy "char";
+  cols text;
+BEGIN
+  SELECT pt.partstrat INTO strategy
+  FROM pg_partitioned_table pt
+  WHERE pt.partrelid = 'catalog_products'::regclass;
+
+  -- solo aplica a LIST; con HASH las particiones son fijas
+  IF strategy IS DISTINCT FROM 'l' THEN
+    RETURN NULL;
+  END IF;
+
+  IF to_regclass(part_name) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+
+  PERFORM pg_advisory_xact_lock(hashtext('catalog_partition:' || p_org_id));
+  IF to_regclass(part_name) IS NOT NULL THEN
+    RETURN part_name;
+  END IF;
+
+  SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum) INTO cols
+  FROM pg_attribute a
+  WHERE a.attrelid = 'catalog_products'::regclass
+    AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = '';
+
+  EXECUTE format(
+    'CREATE TABLE %I (LIKE catalog_products INCLUDING DEFAULTS INCLUDING GENERATED)', part_name);
+
+  -- filas que ya cayeron en DEFAULT para este org se mueven a su partición
+  EXECUTE format(
+    'WITH d AS (DELETE FROM catalog_products_default WHERE org_id = %L RETURNING %s) '
+    'INSERT INTO %I (%s) SELECT %s FROM d',
+    p_org_id, cols, part_name, cols, cols);
+
+  -- el CHECK evita el scan de validación al hacer ATTACH
+  EXECUTE format(
+    'ALTER TABLE %I ADD CONSTRAINT %I CHECK (org_id IS NOT NULL AND org_id = %L)',
+    part_name, part_name || '_org_chk', p_org_id);
+  EXECUTE format(
+    'ALTER TABLE catalog_products ATTACH PARTITION %I FOR VALUES IN (%L)', part_name, p_org_id);
+
+  RETURN part_name;
+END;
+$$;
+"""
+
+
+# columnas que leen POST /v1/catalog/search y el matching; la sync del catálogo llena search_*
+BASELINE_COLUMNS = """
+  org_id text NOT NULL,
+  provider text NOT NULL DEFAULT 'siigo',
+  code text NOT NULL,
+  name text,
+  description text,
+  brand text,
+  model text,
+  price1 numeric,
+  unit text,
+  search_text text,
+  search_tsv tsvector,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  updated_at timestamptz NOT NULL DEFAULT now()
+"""
+
+COPY_ROWS = """
+    DO $$
+    DECLARE cols text;
+    BEGIN
+      SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum) INTO cols
+      FROM pg_attribute a
+      WHERE a.attrelid = '{dst}'::regclass
+        AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = '';
+      EXECUTE format('INSERT INTO {dst} (%s) SELECT %s FROM {src}', cols, cols);
+    END;
+    $$
+"""
+
+
+def _table_exists(name: str) -> bool:
+    return op.get_bind().execute(sa.text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def _truthy(v: str) -> bool:
+    return (v or "").strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    mode = (os.getenv("CATALOG_PARTITION_MODE") or "list").strip().lower()
+    hash_parts = int(os.getenv("CATALOG_HASH_PARTITIONS", "16"))
+    keep_legacy = _truthy(os.getenv("CATALOG_KEEP_LEGACY", "false"))
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+
+    strategy = "HASH (org_id)" if mode == "hash" else "LIST (org_id)"
+    migrate_rows = _table_exists("catalog_products")
+    if migrate_rows:
+        op.execute("ALTER TABLE catalog_products ADD COLUMN IF NOT EXISTS search_text text")
+        op.execute("ALTER TABLE catalog_products ADD COLUMN IF NOT EXISTS search_tsv tsvector")
+        op.execute("ALTER TABLE catalog_products RENAME TO catalog_products_legacy")
+        op.execute(f"""
+            CREATE TABLE catalog_products
+              (LIKE catalog_products_legacy INCLUDING DEFAULTS INCLUDING GENERATED)
+              PARTITION BY {strategy}
+        """)
+    else:
+        op.execute(f"CREATE TABLE catalog_products ({BASELINE_COLUMNS}) PARTITION BY {strategy}")
+
+    if mode == "hash":
+        for i in range(hash_parts):
+            op.execute(
+                f"CREATE TABLE catalog_products_h{i:02d} PARTITION OF catalog_products "
+                f"FOR VALUES WITH (MODULUS {hash_parts}, REMAINDER {i})"
+            )
+    else:
+        op.execute("CREATE TABLE catalog_products_default PARTITION OF catalog_products DEFAULT")
+
+    # Índices en el padre: se propagan a cada partición (existente o futura)
+    op.execute("CREATE UNIQUE INDEX uq_catalog_products_p_org_provider_code ON catalog_products (org_id, provider, code)")
+    op.execute("CREATE INDEX ix_catalog_products_p_search_text_trgm ON catalog_products USING gin (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_catalog_products_p_search_tsv ON catalog_products USING gin (search_tsv)")
+
+    op.execute(ENSURE_PARTITION_FN)
+
+    if not migrate_rows:
+        return
+
+    if mode != "hash":
+        op.execute("""
+            DO $$
+            DECLARE r record;
+            BEGIN
+              FOR r IN SELECT DISTINCT org_id FROM catalog_products_legacy WHERE org_id IS NOT NULL LOOP
+                PERFORM ensure_catalog_partition(r.org_id);
+              END LOOP;
+            END;
+            $$
+        """)
+
+    op.execute(COPY_ROWS.format(dst="catalog_products", src="catalog_products_legacy"))
+    op.execute("ANALYZE catalog_products")
+    if not keep_legacy:
+        # sin esto el catálogo queda duplicado para siempre
+        op.execute("DROP TABLE catalog_products_legacy")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if _table_exists("catalog_products_legacy"):
+        op.execute("DROP TABLE catalog_products")
+        op.execute("ALTER TABLE catalog_products_legacy RENAME TO catalog_products")
+    else:
+        # la legacy ya se borró: se vuelve a una tabla plana con los datos actuales
+        op.execute("""
+            CREATE TABLE catalog_products_flat
+              (LIKE catalog_products INCLUDING DEFAULTS INCLUDING GENERATED)
+        """)
+        op.execute(COPY_ROWS.format(dst="catalog_products_flat", src="catalog_products"))
+        op.execute("DROP TABLE catalog_products")
+        op.execute("ALTER TABLE catalog_products_flat RENAME TO catalog_products")
+        op.execute("CREATE UNIQUE INDEX uq_catalog_products_org_provider_code ON catalog_products (org_id, provider, code)")
+        op.execute("CREATE INDEX ix_catalog_products_search_text_trgm ON catalog_products USING gin (search_text gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_catalog_products_search_tsv ON catalog_products USING gin (search_tsv)")
+    op.execute("DROP FUNCTION IF EXISTS ensure_catalog_partition(text)")
@@ -0,0 +1,41 @@
+"""add extraction cache
+
+Revision ID: e2b8f4a61c93
+Revises: d7a3c5e81b42
+Create Date: 2026-10-19 13:05:27.441906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b8f4a61c93'
+down_revision: Union[str, Sequence[str], None] = 'd7a3c5e81b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "extraction_cache",
+        sa.Column("cache_key", sa.Text(), primary_key=True),
+        sa.Column("sha256", sa.Text(), nullable=False),
+        sa.Column("source_type", sa.Text(), nullable=False),
+        sa.Column("config_json", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("result_json", postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("last_hit_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_extraction_cache_sha256", "extraction_cache", ["sha256"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_extraction_cache_sha256", table_name="extraction_cache")
+    op.drop_table("extraction_cache")
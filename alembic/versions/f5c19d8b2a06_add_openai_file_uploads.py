@@ -0,0 +1,41 @@
+"""add openai file uploads
+
+Revision ID: f5c19d8b2a06
+Revises: e2b8f4a61c93
+Create Date: 2026-10-19 14:21:09.873215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c19d8b2a06'
+down_revision: Union[str, Sequence[str], None] = 'e2b8f4a61c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "openai_file_uploads",
+        sa.Column("content_key", sa.Text(), primary_key=True),
+        sa.Column("file_id", sa.Text(), nullable=False),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=True),
+        sa.Column("uses", sa.Integer(), nullable=False, server_default=sa.text("1")),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_openai_file_uploads_expires_at", "openai_file_uploads", ["expires_at"])
+    op.create_index("ix_openai_file_uploads_file_id", "openai_file_uploads", ["file_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_openai_file_uploads_file_id", table_name="openai_file_uploads")
+    op.drop_index("ix_openai_file_uploads_expires_at", table_name="openai_file_uploads")
+    op.drop_table("openai_file_uploads")
@@ -0,0 +1,20 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query
+
+from app.services.jobs import get_job_scoped
+
+router = APIRouter(prefix="/v1", tags=["jobs"])
+
+
+@router.get("/jobs/{job_id}")
+def get_job_status(
+    job_id: str,
+    draft_id: Optional[str] = Query(default=None),
+    x_org_id: Optional[str] = Header(default=None, alias="X-Org-Id"),
+):
+    # draft_id (viene en poll_url) y X-Org-Id si el job es de una org; si no coinciden, 404 igual
+    job = get_job_scoped(job_id, draft_id, x_org_id)
+    if not job:
+        raise HTTPException(status_code=404, detail={"code": "JOB_NOT_FOUND"})
+    return job
@@ -3,9 +3,13 @@ import re
 import json
 import unicodedata
 from collections import defaultdict
-from fastapi import APIRouter, HTTPException, Body, Header
+from fastapi import APIRouter, HTTPException, Body, Header, Query
+from starlette.responses import JSONResponse
 from sqlalchemy import text
-from app.db_engine import get_engine
+from app.db_engine import execute_prepared, get_engine
+from app.observability import StageTimer
+from app.services.draft_parsing import cancel_llm_upgrade
+from app.services.jobs import submit_job, validate_callback_url
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -17,6 +21,9 @@ def _enabled() -> bool:
 def _always_suggest() -> bool:
     return os.getenv("ALWAYS_SUGGEST", "true").lower() in ("1", "true", "yes", "y")
 
+def _truthy(v) -> bool:
+    return str(v or "").lower() in ("1", "true", "yes", "y", "on")
+
 
 # =========================
 # Multi-tenant config
@@ -225,44 +232,47 @@ def _candidate_flags(row: dict, cfg: dict) -> dict:
         "txt_fold": _fold(txt),
     }
 
-def _spec_adjust(specs: dict, cand_flags: dict, cfg: dict, q_base: str) -> float:
-    w = (cfg.get("weights") or {})
-    adj = 0.0
+def _spec_terms(specs: dict, cand_flags: dict, cfg: dict, q_base: str) -> list[tuple[str, float]]:
+    """
+    Términos del ajuste por specs como (nombre_de_weight, signo), en orden.
+    El ajuste es lineal en `weights`: adj = sum(signo * weights[nombre]).
+    """
+    terms: list[tuple[str, float]] = []
 
     # AWG
     if specs.get("awg"):
         if cand_flags.get("awg") == specs["awg"]:
-            adj += float(w.get("awg_match_bonus", 0))
+            terms.append(("awg_match_bonus", 1.0))
         elif cand_flags.get("awg") is None:
-            adj -= float(w.get("awg_missing_penalty", 0))
+            terms.append(("awg_missing_penalty", -1.0))
         else:
-            adj -= float(w.get("awg_mismatch_penalty", 0))
+            terms.append(("awg_mismatch_penalty", -1.0))
 
     # AMP
     if specs.get("amp"):
         if cand_flags.get("amp") == specs["amp"]:
-            adj += float(w.get("amp_match_bonus", 0))
+            terms.append(("amp_match_bonus", 1.0))
         elif cand_flags.get("amp") is None:
-            adj -= float(w.get("amp_missing_penalty", 0))
+            terms.append(("amp_missing_penalty", -1.0))
         else:
-            adj -= float(w.get("amp_mismatch_penalty", 0))
+            terms.append(("amp_mismatch_penalty", -1.0))
 
     # aislado vs desnudo
     if specs.get("want_insulated"):
         if cand_flags.get("has_bare"):
-            adj -= float(w.get("want_insulated_bare_penalty", 0))
+            terms.append(("want_insulated_bare_penalty", -1.0))
         if cand_flags.get("has_insulated"):
-            adj += float(w.get("want_insulated_bonus", 0))
+            terms.append(("want_insulated_bonus", 1.0))
 
     if specs.get("want_bare"):
         if cand_flags.get("has_insulated"):
-            adj -= float(w.get("want_bare_insulated_penalty", 0))
+            terms.append(("want_bare_insulated_penalty", -1.0))
         if cand_flags.get("has_bare"):
-            adj += float(w.get("want_bare_bonus", 0))
+            terms.append(("want_bare_bonus", 1.0))
 
     # rollo
     if specs.get("want_roll") and cand_flags.get("has_roll"):
-        adj += float(w.get("want_roll_bonus", 0))
+        terms.append(("want_roll_bonus", 1.0))
 
     # penaliza términos extra (control/instrumentación/etc) si el query no los pidió
     cat = specs.get("cat")
@@ -272,7 +282,7 @@ def _spec_adjust(specs: dict, cand_flags: dict, cfg: dict, q_base: str) -> float
     for term in avoid:
         tf = _fold(term)
         if tf and tf in cf and tf not in qf:
-            adj -= float(w.get("avoid_term_penalty", 0))
+            terms.append(("avoid_term_penalty", -1.0))
 
     # si pidió aislado, preferimos estándares eléctricos típicos (THHN/THW/THHW/HFFR)
     if specs.get("want_insulated"):
@@ -280,9 +290,17 @@ def _spec_adjust(specs: dict, cand_flags: dict, cfg: dict, q_base: str) -> float
         for term in pref:
             tf = _fold(term)
             if tf and tf in cf:
-                adj += float(w.get("preferred_term_bonus", 0))
+                terms.append(("preferred_term_bonus", 1.0))
                 break
 
+    return terms
+
+
+def _spec_adjust(specs: dict, cand_flags: dict, cfg: dict, q_base: str) -> float:
+    w = (cfg.get("weights") or {})
+    adj = 0.0
+    for name, sign in _spec_terms(specs, cand_flags, cfg, q_base):
+        adj += sign * float(w.get(name, 0))
     return adj
 
 
@@ -293,6 +311,58 @@ def _strip_qty_noise(q: str) -> str:
     return _RE_TRAILING_QTY_NOISE.sub("", q).strip()
 
 
+def _prepare_item(it, cfg: dict) -> dict | None:
+    """Query base/enriquecido + specs de una línea del draft (None si no hay query)."""
+    q_base = _strip_qty_noise((it["q"] or "").strip())
+    raw_text = (it.get("raw_text") or "").strip()
+    if not q_base:
+        return None
+
+    # Parse item warnings
+    item_warnings_raw = it.get("warnings_json")
+    if isinstance(item_warnings_raw, str):
+        try:
+            item_warnings_list = json.loads(item_warnings_raw)
+        except Exception:
+            item_warnings_list = []
+    elif isinstance(item_warnings_raw, list):
+        item_warnings_list = item_warnings_raw
+    else:
+        item_warnings_list = []
+
+    is_low_confidence = "LOW_CONFIDENCE_KEPT" in item_warnings_list
+
+    specs = _extract_specs(q_base, cfg)
+
+    # For low-confidence items, skip category filter (broader recall)
+    if is_low_confidence:
+        specs["cat"] = None
+
+    q_enriched = q_base
+    if specs.get("cat") == "breaker" and specs.get("amp"):
+        q_enriched = f"breaker {specs['amp']}A {q_base}"
+    elif specs.get("cat") == "cable" and specs.get("awg"):
+        q_enriched = f"cable {specs['awg']} awg {q_base}"
+
+    # si raw trae keywords y no están en q_enriched, agregamos 1 keyword (solo recall)
+    all_kws = (cfg.get("keywords", {}).get("insulated", [])
+              + cfg.get("keywords", {}).get("bare", [])
+              + cfg.get("keywords", {}).get("roll", []))
+    for kw in all_kws:
+        if kw and _fold(kw) in _fold(raw_text) and _fold(kw) not in _fold(q_enriched):
+            q_enriched = f"{q_enriched} {kw}"
+            break
+
+    return {
+        "line_index": int(it["line_index"]),
+        "q_base": q_base,
+        "q_enriched": q_enriched,
+        "specs": specs,
+        "raw_text": raw_text,
+        "is_low_confidence": is_low_confidence,
+    }
+
+
 # =========================
 # SQL recall (solo recall) — single-item fallback
 # =========================
@@ -314,6 +384,8 @@ ORDER BY score_base DESC
 LIMIT :fetch_limit
 """
 
+_SQL_RECALL_NO_FILTER = _SQL_RECALL.format(extra_where="")
+
 # =========================
 # SQL batch recall with LATERAL
 # =========================
@@ -349,10 +421,40 @@ CROSS JOIN LATERAL (
 
 
 @router.post("/drafts/{draft_id}/match")
-def match_draft_items(draft_id: str, payload: dict = Body(...)):
+def match_draft_items(
+    draft_id: str,
+    payload: dict = Body(...),
+    async_mode: Optional[str] = Query(default=None, alias="async"),
+    x_debug_timings: Optional[str] = Header(default=None, alias="X-Debug-Timings"),
+):
     if not _enabled():
         raise HTTPException(status_code=404, detail={"code": "MATCHING_DISABLED"})
 
+    # report.timings solo se devuelve con debug; las métricas se exportan siempre
+    debug = _truthy(payload.get("debug")) or _truthy(x_debug_timings)
+
+    if not _truthy(async_mode):
+        return run_match(draft_id, payload, debug=debug)
+
+    # Modo job: validamos lo barato aquí y el worker pool corre el match
+    if not (payload.get("org_id") or "").strip():
+        raise HTTPException(status_code=400, detail={"code": "MISSING_ORG_ID"})
+
+    callback_url = validate_callback_url(payload.get("callback_url"))
+
+    request_payload = {k: v for k, v in payload.items() if k != "callback_url"}
+    job = submit_job(
+        kind="match",
+        draft_id=draft_id,
+        request_payload=request_payload,
+        runner=lambda: run_match(draft_id, request_payload, debug=debug),
+        callback_url=callback_url,
+    )
+    return JSONResponse(status_code=202, content=job)
+
+
+def run_match(draft_id: str, payload: dict, debug: bool = False) -> dict:
+    """Match síncrono (lo usan el endpoint y los jobs async)."""
     org_id = (payload.get("org_id") or "").strip()
     provider = (payload.get("provider") or "siigo").strip()
     limit = int(payload.get("limit") or 5)
@@ -366,8 +468,9 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
     fetch_limit = max(limit * recall_mult, limit)
 
     eng = get_engine()
+    timer = StageTimer()
 
-    with eng.connect() as conn:
+    with timer.stage("items_select"), eng.connect() as conn:
         items = conn.execute(
             text("""
                 SELECT line_index,
@@ -384,62 +487,20 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
 
     if not items:
         raise HTTPException(status_code=404, detail={"code": "DRAFT_HAS_NO_ITEMS"})
+    timer.count("items_loaded", len(items))
 
     results_out = []
 
     # ---- Pre-process all items in Python (specs, enrichment, category) ----
     prepared = []  # list of dicts with line_index, q_base, q_enriched, specs, raw_text, is_low_confidence
-    for it in items:
-        q_base = _strip_qty_noise((it["q"] or "").strip())
-        raw_text = (it.get("raw_text") or "").strip()
-        if not q_base:
-            continue
-
-        # Parse item warnings
-        item_warnings_raw = it.get("warnings_json")
-        if isinstance(item_warnings_raw, str):
-            try:
-                item_warnings_list = json.loads(item_warnings_raw)
-            except Exception:
-                item_warnings_list = []
-        elif isinstance(item_warnings_raw, list):
-            item_warnings_list = item_warnings_raw
-        else:
-            item_warnings_list = []
-
-        is_low_confidence = "LOW_CONFIDENCE_KEPT" in item_warnings_list
-
-        specs = _extract_specs(q_base, cfg)
-
-        # For low-confidence items, skip category filter (broader recall)
-        if is_low_confidence:
-            specs["cat"] = None
-
-        q_enriched = q_base
-        if specs.get("cat") == "breaker" and specs.get("amp"):
-            q_enriched = f"breaker {specs['amp']}A {q_base}"
-        elif specs.get("cat") == "cable" and specs.get("awg"):
-            q_enriched = f"cable {specs['awg']} awg {q_base}"
-
-        # si raw trae keywords y no están en q_enriched, agregamos 1 keyword (solo recall)
-        all_kws = (cfg.get("keywords", {}).get("insulated", [])
-                  + cfg.get("keywords", {}).get("bare", [])
-                  + cfg.get("keywords", {}).get("roll", []))
-        for kw in all_kws:
-            if kw and _fold(kw) in _fold(raw_text) and _fold(kw) not in _fold(q_enriched):
-                q_enriched = f"{q_enriched} {kw}"
-                break
-
-        prepared.append({
-            "line_index": int(it["line_index"]),
-            "q_base": q_base,
-            "q_enriched": q_enriched,
-            "specs": specs,
-            "raw_text": raw_text,
-            "is_low_confidence": is_low_confidence,
-        })
+    with timer.stage("spec_extraction"):
+        for it in items:
+            p = _prepare_item(it, cfg)
+            if p is not None:
+                prepared.append(p)
 
     if not prepared:
+        timer.export("match")
         return {"draft_id": draft_id, "org_id": org_id, "provider": provider, "apply": apply, "items": []}
 
     # ---- Batch SQL with LATERAL (one round-trip) ----
@@ -451,22 +512,26 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
     ]
 
     with eng.begin() as conn:
-        batch_rows = conn.execute(
-            text(_SQL_BATCH_LATERAL),
-            {
-                "line_indexes": line_indexes,
-                "enriched_queries": enriched_queries,
-                "cat_likes": cat_likes,
-                "org_id": org_id,
-                "provider": provider,
-                "fetch_limit": fetch_limit,
-            },
-        ).mappings().all()
+        with timer.stage("recall_lateral"):
+            batch_rows = execute_prepared(
+                conn,
+                "match_batch_lateral",
+                _SQL_BATCH_LATERAL,
+                {
+                    "line_indexes": line_indexes,
+                    "enriched_queries": enriched_queries,
+                    "cat_likes": cat_likes,
+                    "org_id": org_id,
+                    "provider": provider,
+                    "fetch_limit": fetch_limit,
+                },
+            )
+        timer.count("candidates_fetched", len(batch_rows))
 
         # Group results by line_index
         rows_by_line: dict[int, list[dict]] = defaultdict(list)
         for r in batch_rows:
-            rows_by_line[int(r["line_index"])].append(dict(r))
+            rows_by_line[int(r["line_index"])].append(r)
 
         # ---- Rerank and build output per item ----
         always_suggest = _always_suggest()
@@ -479,16 +544,20 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
 
             # Fallback: if no rows from batch lateral, try without category filter
             if not rows and always_suggest:
-                fallback_rows = conn.execute(
-                    text(_SQL_RECALL.format(extra_where="")),
-                    {
-                        "q": p["q_enriched"],
-                        "org_id": org_id,
-                        "provider": provider,
-                        "fetch_limit": fetch_limit,
-                    },
-                ).mappings().all()
-                rows = [dict(r) for r in fallback_rows]
+                with timer.stage("recall_fallback"):
+                    rows = execute_prepared(
+                        conn,
+                        "match_recall",
+                        _SQL_RECALL_NO_FILTER,
+                        {
+                            "q": p["q_enriched"],
+                            "org_id": org_id,
+                            "provider": provider,
+                            "fetch_limit": fetch_limit,
+                        },
+                    )
+                timer.count("fallback_lines")
+                timer.count("fallback_candidates_fetched", len(rows))
                 if rows:
                     item_warnings.append("FALLBACK_NO_CATEGORY")
 
@@ -512,18 +581,20 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
             specs = p["specs"]
             q_base = p["q_base"]
 
-            reranked = []
-            for rdict in rows:
-                flags = _candidate_flags(rdict, cfg)
-                adj = _spec_adjust(specs, flags, cfg, q_base=q_base)
-                score_base = float(rdict.get("score_base") or 0)
-                score_final = score_base + float(adj)
+            with timer.stage("rerank"):
+                reranked = []
+                for rdict in rows:
+                    flags = _candidate_flags(rdict, cfg)
+                    adj = _spec_adjust(specs, flags, cfg, q_base=q_base)
+                    score_base = float(rdict.get("score_base") or 0)
+                    score_final = score_base + float(adj)
 
-                rdict["specs_candidate"] = {k: v for k, v in flags.items() if k != "txt_fold"}
-                rdict["score_final"] = score_final
-                reranked.append(rdict)
+                    rdict["specs_candidate"] = {k: v for k, v in flags.items() if k != "txt_fold"}
+                    rdict["score_final"] = score_final
+                    reranked.append(rdict)
 
-            reranked.sort(key=lambda x: float(x.get("score_final") or 0), reverse=True)
+                reranked.sort(key=lambda x: float(x.get("score_final") or 0), reverse=True)
+            timer.count("candidates_reranked", len(reranked))
             top = reranked[:limit]
             best = top[0]
 
@@ -537,25 +608,27 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
             }
 
             if apply:
-                conn.execute(
-                    text("""
-                        UPDATE draft_items
-                        SET item_code=:code,
-                            item_name=:name,
-                            match_sim=:sim,
-                            match_rank=:rank,
-                            updated_at=now()
-                        WHERE draft_id=:draft_id AND line_index=:line_index
-                    """),
-                    {
-                        "draft_id": draft_id,
-                        "line_index": li,
-                        "code": selected["code"],
-                        "name": selected["name"],
-                        "sim": selected["sim"],
-                        "rank": selected["rank"],
-                    },
-                )
+                with timer.stage("apply_updates"):
+                    conn.execute(
+                        text("""
+                            UPDATE draft_items
+                            SET item_code=:code,
+                                item_name=:name,
+                                match_sim=:sim,
+                                match_rank=:rank,
+                                updated_at=now()
+                            WHERE draft_id=:draft_id AND line_index=:line_index
+                        """),
+                        {
+                            "draft_id": draft_id,
+                            "line_index": li,
+                            "code": selected["code"],
+                            "name": selected["name"],
+                            "sim": selected["sim"],
+                            "rank": selected["rank"],
+                        },
+                    )
+                timer.count("lines_applied")
 
             results_out.append({
                 "line_index": li,
@@ -580,21 +653,30 @@ def match_draft_items(draft_id: str, payload: dict = Body(...)):
                 "warnings": item_warnings or None,
             })
 
+        if apply and any(r.get("selected") is not None for r in results_out):
+            # items con match: un upgrade del LLM que llegue tarde ya no los reemplaza
+            cancel_llm_upgrade(conn, draft_id)
+
     total_input = len(prepared)
     matched = len([r for r in results_out if r.get("selected") is not None])
 
+    timer.export("match")
+    report = {
+        "total_input_items": total_input,
+        "matched_items": matched,
+        "unmatched_items": total_input - matched,
+        "unmatched_line_indexes": unmatched_line_indexes,
+    }
+    if debug:
+        report["timings"] = timer.as_dict()
+
     return {
         "draft_id": draft_id,
         "org_id": org_id,
         "provider": provider,
         "apply": apply,
         "items": results_out,
-        "report": {
-            "total_input_items": total_input,
-            "matched_items": matched,
-            "unmatched_items": total_input - matched,
-            "unmatched_line_indexes": unmatched_line_indexes,
-        },
+        "report": report,
     }
 
 
@@ -683,6 +765,7 @@ def select_item_for_draft_line(
                 "rank": rank,
             },
         )
+        cancel_llm_upgrade(conn, draft_id)
 
         # 4) upsert selección (para auditoría/UI)
         conn.execute(
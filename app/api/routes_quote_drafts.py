@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Request, UploadFile, File, Header, HTTPException, Body, Form
+from fastapi import APIRouter, Request, UploadFile, File, Header, HTTPException, Body, Form, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 import httpx
 from typing import Any, Dict, Optional
 import json as _json
 import logging
 import os
 
+from app.api.routes_matching import _truthy
 from app.services.local_fallback_parser import fallback_enabled, fallback_txt_lines_to_extraction
 
 logger = logging.getLogger("uvicorn.error")
@@ -49,6 +51,9 @@ async def _proxy(
     corr = request.headers.get("X-Correlation-Id")
     if corr:
         headers["X-Correlation-Id"] = corr
+    org = request.headers.get("X-Org-Id")
+    if org:
+        headers["X-Org-Id"] = org
 
     timeout = _timeout_for_path(path)
 
@@ -124,6 +129,17 @@ async def upload_quote_draft(
     )
 
 
+@router.get("/jobs/{job_id}")
+async def get_quote_draft_job(
+    request: Request,
+    job_id: str,
+    draft_id: Optional[str] = Query(default=None),
+    x_api_key: str = Header(..., alias="X-API-Key"),
+):
+    path = f"/v1/jobs/{job_id}" + (f"?draft_id={draft_id}" if draft_id else "")
+    return await _proxy(request, "GET", path, x_api_key)
+
+
 @router.get("/{draft_id}")
 async def get_quote_draft(
     request: Request,
@@ -137,11 +153,96 @@ async def get_quote_draft(
 async def parse_quote_draft(
     request: Request,
     draft_id: str,
+    async_mode: Optional[str] = Query(default=None, alias="async"),
     x_api_key: str = Header(..., alias="X-API-Key"),
 ):
+    if _truthy(async_mode):
+        # encola y responde 202 al toque (sin el timeout largo de parse)
+        job = await _proxy(request, "POST", f"/v1/drafts/{draft_id}/parse?async=1", x_api_key)
+        return JSONResponse(status_code=202, content=job)
     return await _proxy(request, "POST", f"/v1/drafts/{draft_id}/parse", x_api_key)
 
 
+async def _stream_proxy(request: Request, method: str, draft_id: str, x_api_key: str) -> StreamingResponse:
+    # pasa el SSE tal cual (sin bufferear); el read timeout solo aplica entre eventos/keepalives
+    path = f"/v1/drafts/{draft_id}/parse/stream"
+    headers = {"X-API-Key": x_api_key, "Accept": "text/event-stream"}
+    for h in ("X-Correlation-Id", "Last-Event-ID"):
+        if request.headers.get(h):
+            headers[h] = request.headers[h]
+
+    client = httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0))
+    try:
+        resp = await client.send(client.build_request(method, f"{_base_url(request)}{path}", headers=headers), stream=True)
+    except httpx.TimeoutException:
+        await client.aclose()
+        raise HTTPException(
+            status_code=504,
+            detail={"code": "UPSTREAM_TIMEOUT", "message": "El backend tardó demasiado en abrir el stream.", "debug": {"path": path}},
+        )
+    except httpx.RequestError as e:
+        await client.aclose()
+        raise HTTPException(
+            status_code=502,
+            detail={"code": "UPSTREAM_REQUEST_ERROR", "message": "Error de red llamando al backend.", "debug": {"path": path, "error": str(e)[:200]}},
+        )
+
+    if resp.status_code >= 400:
+        # error antes de empezar el stream (404, 409 parse en curso...): mismo formato que _proxy
+        try:
+            await resp.aread()
+            try:
+                data = resp.json()
+            except Exception:
+                data = resp.text
+        finally:
+            await resp.aclose()
+            await client.aclose()
+        if isinstance(data, dict) and set(data.keys()) == {"detail"}:
+            data = data["detail"]
+        raise HTTPException(status_code=resp.status_code, detail=data)
+
+    async def _relay():
+        try:
+            async for chunk in resp.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as e:
+            # el backend se cayó a mitad del stream: cerramos con un evento error en vez de cortar en seco
+            logger.warning("PARSE_STREAM_RELAY_FAILED draft_id=%s err=%s", draft_id, e)
+            err = {"status_code": 502, "detail": {"code": "UPSTREAM_REQUEST_ERROR", "message": str(e)[:200]}}
+            yield f"event: error\ndata: {_json.dumps(err, ensure_ascii=False)}\n\n".encode()
+        finally:
+            await resp.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        _relay(),
+        status_code=resp.status_code,
+        media_type=resp.headers.get("content-type", "text/event-stream"),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/{draft_id}/parse/stream")
+async def stream_quote_draft_parse(
+    request: Request,
+    draft_id: str,
+    x_api_key: str = Header(..., alias="X-API-Key"),
+):
+    # dispara el parse y lo transmite
+    return await _stream_proxy(request, "POST", draft_id, x_api_key)
+
+
+@router.get("/{draft_id}/parse/stream")
+async def observe_quote_draft_parse(
+    request: Request,
+    draft_id: str,
+    x_api_key: str = Header(..., alias="X-API-Key"),
+):
+    # solo observa (EventSource); reconectar con Last-Event-ID sigue desde el último evento
+    return await _stream_proxy(request, "GET", draft_id, x_api_key)
+
+
 @router.put("/{draft_id}/items")
 async def replace_quote_draft_items(
     request: Request,
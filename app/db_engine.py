@@ -1,14 +1,119 @@
 import os
-from sqlalchemy import create_engine
+import re
+from sqlalchemy import create_engine, text
 from sqlalchemy.engine import Engine
 
+from app.observability import incr, metrics_snapshot
+
 _ENGINE: Engine | None = None
 
+_PLAN_CACHE_MODES = {
+    "auto": "auto",
+    "generic": "force_generic_plan",
+    "force_generic_plan": "force_generic_plan",
+    "custom": "force_custom_plan",
+    "force_custom_plan": "force_custom_plan",
+}
+
+
+def _plan_cache_mode() -> str | None:
+    raw = (os.getenv("PG_PLAN_CACHE_MODE") or "").strip().lower()
+    return _PLAN_CACHE_MODES.get(raw)
+
+
 def get_engine() -> Engine:
     global _ENGINE
     if _ENGINE is None:
         db_url = os.getenv("DATABASE_URL")
         if not db_url:
             raise RuntimeError("DATABASE_URL not set")
-        _ENGINE = create_engine(db_url, pool_pre_ping=True)
+        connect_args = {}
+        mode = _plan_cache_mode()
+        if mode:
+            # aplica a los statements preparados de cada conexión del pool
+            connect_args["options"] = f"-c plan_cache_mode={mode}"
+        _ENGINE = create_engine(db_url, pool_pre_ping=True, connect_args=connect_args)
     return _ENGINE
+
+
+# =========================
+# Prepared statements (psycopg 3)
+# =========================
+def _prepared_enabled() -> bool:
+    # Con pgbouncer en modo transaction hay que apagarlo (los prepared viven por conexión)
+    return os.getenv("PG_PREPARED_STATEMENTS", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+_NAMED_PARAM_RE = re.compile(r"(?<![:\w]):(\w+)")
+_PYFORMAT_CACHE: dict[str, str] = {}
+
+
+def _to_pyformat(sql: str) -> str:
+    """':name' (estilo text()) -> '%(name)s' (psycopg). Respeta los casts '::tipo'."""
+    out = _PYFORMAT_CACHE.get(sql)
+    if out is None:
+        out = _NAMED_PARAM_RE.sub(r"%(\1)s", sql.replace("%", "%%"))
+        _PYFORMAT_CACHE[sql] = out
+    return out
+
+
+def _prepared_names(driver_conn) -> frozenset | None:
+    """
+    Nombres que psycopg tiene preparados en esta conexión (su PrepareManager). Es interno del
+    driver: si cambia de forma devolvemos None y no se cuenta hit/miss.
+    """
+    names = getattr(getattr(driver_conn, "_prepared", None), "_names", None)
+    if names is None:
+        return None
+    try:
+        return frozenset(names.values())
+    except Exception:
+        return None
+
+
+def execute_prepared(conn, name: str, sql: str, params: dict) -> list[dict]:
+    """
+    Ejecuta `sql` como prepared statement del lado del servidor sobre la conexión del pool.
+
+    psycopg nombra y cachea el statement por conexión (LRU de `prepared_max`, puede desalojarlo y
+    re-prepararlo sin avisar). Para saber si de verdad se reusó miramos su cache de esa conexión
+    antes y después: si apareció un nombre nuevo hubo PREPARE (miss), si no se reusó (hit).
+    /v1/metrics: sql.prepare.hit/miss(.<name>), sql.prepare.bypass.<name> y prepare_stats().
+    Si el driver no es psycopg 3 (o está apagado) cae a conn.execute(text(sql)).
+    """
+    pooled = conn.connection
+    driver_conn = getattr(pooled, "driver_connection", None)
+    if not _prepared_enabled() or not hasattr(driver_conn, "prepare_threshold"):
+        incr(f"sql.prepare.bypass.{name}")
+        incr("sql.prepare.bypass")
+        return [dict(r) for r in conn.execute(text(sql), params).mappings().all()]
+
+    incr(f"sql.prepare.exec.{name}")
+    before = _prepared_names(driver_conn)
+    cur = pooled.cursor()
+    try:
+        cur.execute(_to_pyformat(sql), params, prepare=True)
+        cols = [d[0] for d in cur.description]
+        rows = [dict(zip(cols, row)) for row in cur.fetchall()]
+    finally:
+        cur.close()
+
+    after = _prepared_names(driver_conn)
+    if before is not None and after is not None:
+        outcome = "miss" if after - before else "hit"
+        incr(f"sql.prepare.{outcome}.{name}")
+        incr(f"sql.prepare.{outcome}")
+    return rows
+
+
+def prepare_stats() -> dict:
+    """Para GET /v1/metrics: reuso real de los prepared statements en este proceso."""
+    counters = metrics_snapshot()["counters"]
+    hits, misses = counters.get("sql.prepare.hit", 0), counters.get("sql.prepare.miss", 0)
+    return {
+        "enabled": _prepared_enabled(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "bypass": counters.get("sql.prepare.bypass", 0),
+    }
@@ -1,31 +1,39 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
 import json
 import os
 import time, base64, json, threading
 import logging
 from ulid import ULID
-from fastapi import FastAPI, Request, HTTPException
-from starlette.responses import JSONResponse
+from fastapi import FastAPI, Query, Request, HTTPException
+from starlette.responses import JSONResponse, StreamingResponse
 import uuid
 from pathlib import Path
 from sqlalchemy import text
 from sqlalchemy import create_engine
 from app.upstream_gateway.factory import get_gateway
 from app.db import db_ping
+from app.observability import metrics_snapshot
+from app.services import llm_cache, parse_events
+from app.services.openai_clients import pool_stats as openai_pool_stats
 from dotenv import load_dotenv
 ##from app.api.routes_siigo_catalog import router as siigo_catalog_router
 from app.api.routes_quote_drafts import router as quote_drafts_router
-from app.services.document_extractor import DocumentExtractor
+from app.services.draft_parsing import _sanitize_text, parse_draft as parse_draft_sync, parse_draft_async, stream_parse_events
+from app.services.parse_queue import enqueue_parse
+from app.services.jobs import reconcile_lost_jobs, validate_callback_url
+from app.services.openai_files import start_cleanup_thread
 from app.api.routes_catalog import router as catalog_router
 
 from pydantic import BaseModel, Field
 from typing import Optional
-from app.api.routes_matching import router as matching_router
-from app.db_engine import get_engine
+from app.api.routes_matching import router as matching_router, _truthy
+from app.db_engine import get_engine, execute_prepared, prepare_stats
 from app.api.routes_overrides import router as overrides_router
 from app.api.routes_rut import router as rut_router
+from app.api.routes_jobs import router as jobs_router
 
 
 
@@ -34,12 +42,6 @@ load_dotenv()
 _SIIGO_TOKEN_CACHE = {"token": None, "exp": 0}
 _SIIGO_TOKEN_LOCK = threading.Lock()
 
-def _sanitize_text(value: str | None) -> str | None:
-    if value is None:
-        return None
-    # Elimina cualquier byte NUL que rompe PostgreSQL
-    return value.replace("\x00", "")
-
 def _jwt_exp(token: str) -> int:
     try:
         payload = token.split(".")[1]
@@ -62,6 +64,18 @@ app.include_router(catalog_router)
 app.include_router(matching_router)
 app.include_router(overrides_router)
 app.include_router(rut_router)
+app.include_router(jobs_router)
+
+
+@app.on_event("startup")
+def _start_background_tasks():
+    # limpia en OpenAI los PDFs subidos que ya vencieron (openai_file_uploads)
+    start_cleanup_thread()
+    # jobs del pool in-process que quedaron colgados por un reinicio
+    try:
+        reconcile_lost_jobs()
+    except Exception as e:
+        logging.getLogger(__name__).warning("JOBS_RECONCILE_FAILED err=%s", e)
 
 
 def new_correlation_id() -> str:
@@ -145,6 +159,15 @@ def ping_db():
     db_ping()
     return {"db": "ok"}
 
+@app.get("/v1/metrics")
+def get_metrics():
+    return {
+        **metrics_snapshot(),
+        "openai_pool": openai_pool_stats(),
+        "llm_cache": llm_cache.stats(),
+        "sql_prepare": prepare_stats(),
+    }
+
 
 from fastapi import UploadFile, File, HTTPException
 
@@ -234,93 +257,51 @@ def _parse_line_basic(line: str):
 
 
 @app.post("/v1/drafts/{draft_id}/parse")
-def parse_draft(draft_id: str, request: Request):
-    engine = get_engine()
-
-    with engine.connect() as conn:
-        draft = conn.execute(
-            text("SELECT id, status, stored_path, original_filename FROM drafts WHERE id = :id"),
-            {"id": draft_id},
-        ).mappings().first()
-
-    if not draft:
-        raise HTTPException(status_code=404, detail="Draft not found")
-
-    if (draft.get("status") or "").upper() == "COMMITTED":
-        raise HTTPException(status_code=409, detail="Draft is COMMITTED. Create a new draft to parse.")
-
-    with engine.connect() as conn:
-        cnt = conn.execute(
-            text("SELECT COUNT(1) FROM draft_items WHERE draft_id=:id"),
-            {"id": draft_id},
-        ).scalar() or 0
-    if int(cnt) > 0:
-        raise HTTPException(
-            status_code=409,
-            detail="Draft already has items. Use PUT /v1/quote-drafts/{draft_id}/items or create a new draft.",
-        )
-
-    stored_path = draft["stored_path"]
-    original_filename = draft.get("original_filename") or ""
-
-    extractor = DocumentExtractor()
-    result = extractor.extract(stored_path, original_filename, content_type=None)
-
-    with engine.begin() as conn:
-        conn.execute(text("DELETE FROM draft_items WHERE draft_id = :draft_id"), {"draft_id": draft_id})
-
-        for it in result.items:
-            item_warnings = it.warnings or []
-            conn.execute(
-                text("""
-                    INSERT INTO draft_items
-                        (id, draft_id, line_index, raw_text, description, quantity, uom, uom_raw, confidence, warnings_json)
-                    VALUES
-                        (:id, :draft_id, :line_index, :raw_text, :description, :quantity, :uom, :uom_raw, :confidence, CAST(:warnings_json AS jsonb))
-                """),
-                {
-                    "id": str(uuid.uuid4()),
-                    "draft_id": draft_id,
-                    "line_index": int(it.line_index),
-                    "raw_text": _sanitize_text(it.raw_text),
-                    "description": _sanitize_text(it.description),
-                    "quantity": float(it.quantity),
-                    "uom": it.uom,
-                    "uom_raw": _sanitize_text(it.uom_raw),
-                    "confidence": it.confidence,
-                    "warnings_json": json.dumps(item_warnings),
-                },
-            )
-
-        draft_warning_payload = {
-            "global_warnings": result.global_warnings or [],
-            "meta": result.meta or {},
-        }
-
-        conn.execute(
-            text("""
-                UPDATE drafts
-                SET status = CASE WHEN status='COMMITTED' THEN 'COMMITTED' ELSE :status END,
-                    warnings_json = CAST(:warnings_json AS jsonb),
-                    updated_at = NOW()
-                WHERE id = :id
-            """),
-            {
-                "id": draft_id,
-                "status": "PARSED",
-                "warnings_json": json.dumps(draft_warning_payload),
-            },
-        )
-
-    meta = result.meta or {}
-    return {
-        "draft_id": draft_id,
-        "status": "PARSED",
-        "items_created": len(result.items),
-        "input_line_count": meta.get("input_line_count"),
-        "warnings": result.global_warnings or [],
-        "meta": meta,
-    }
+def parse_draft(
+    draft_id: str,
+    request: Request,
+    async_mode: Optional[str] = Query(default=None, alias="async"),
+    callback_url: Optional[str] = Query(default=None),
+):
+    if not _truthy(async_mode):
+        return parse_draft_sync(get_engine(), draft_id)
+
+    # ?async=1: cola durable (la corre app.workers.parse_worker); el cliente hace polling del job
+    job = enqueue_parse(draft_id, callback_url=validate_callback_url(callback_url))
+    return JSONResponse(status_code=202, content=job)
+
+
+@app.post("/v1/drafts/{draft_id}/parse/stream")
+async def parse_draft_stream(draft_id: str, request: Request):
+    # SSE: cada etapa del parse (y los items de cada chunk de OpenAI) a medida que ocurren.
+    # POST dispara el parse; para seguirlo (o reconectar) está el GET de abajo
+    return StreamingResponse(
+        stream_parse_events(get_engine(), draft_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/v1/drafts/{draft_id}/parse/stream")
+async def observe_draft_parse(draft_id: str, request: Request):
+    # Solo observa el parse en curso (POST /parse?async=1 o POST /parse/stream), nunca lo dispara:
+    # un EventSource que reconecta manda Last-Event-ID y sigue desde ahí
+    eng = get_engine()
+    raw_last = (request.headers.get("Last-Event-ID") or "").strip()
+    last_event_id = int(raw_last) if raw_last.isdigit() else None
+    if last_event_id is None and await asyncio.to_thread(parse_events.last_event, eng, draft_id) is None:
+        raise HTTPException(status_code=404, detail={"code": "PARSE_NOT_STARTED"})
+    return StreamingResponse(
+        parse_events.observe(eng, draft_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/v1/drafts/{draft_id}/parse-async")
+async def parse_draft_aio(draft_id: str, request: Request):
+    # Igual que /parse, pero sobre AsyncOpenAI: la llamada al LLM no ocupa un thread del pool
+    return await parse_draft_async(get_engine(), draft_id)
 
 
 @app.get("/v1/drafts/{draft_id}")
@@ -497,8 +478,9 @@ def replace_draft_items(draft_id: str, payload: DraftItemsReplaceRequest):
     engine = get_engine()
 
     with engine.begin() as conn:
+        # FOR UPDATE: se serializa con apply_llm_upgrade (no pueden pisarse los items)
         draft_row = conn.execute(
-            text("SELECT id, status, warnings_json FROM drafts WHERE id = :id"),
+            text("SELECT id, status, warnings_json FROM drafts WHERE id = :id FOR UPDATE"),
             {"id": draft_id},
         ).mappings().first()
 
@@ -542,6 +524,12 @@ def replace_draft_items(draft_id: str, payload: DraftItemsReplaceRequest):
             text("""
                 UPDATE drafts
                 SET status = CASE WHEN status='COMMITTED' THEN 'COMMITTED' ELSE 'PARSED' END,
+                    -- items editados a mano: el LLM que llegue tarde (PDF con deadline) ya no los pisa
+                    warnings_json = CASE
+                        WHEN warnings_json -> 'meta' -> 'llm_upgrade_pending' IS NOT NULL
+                        THEN jsonb_set(warnings_json, '{meta,llm_upgrade_pending}', 'false'::jsonb)
+                        ELSE warnings_json
+                    END,
                     updated_at=now()
                 WHERE id=:id
             """),
@@ -1016,7 +1004,7 @@ def catalog_search(payload: CatalogSearchIn):
 
     eng = get_engine()  # ya lo tienes definido en este mismo main.py
 
-    sql = text("""
+    sql = """
         WITH q AS (
           SELECT
             unaccent(lower(:q)) AS q_norm,
@@ -1039,10 +1027,12 @@ def catalog_search(payload: CatalogSearchIn):
           AND cp.provider = :provider
         ORDER BY score DESC
         LIMIT :limit;
-    """)
+    """
 
     with eng.connect() as conn:
-        rows = conn.execute(
+        rows = execute_prepared(
+            conn,
+            "catalog_shadow_search",
             sql,
             {
                 "q": q,
@@ -1050,6 +1040,6 @@ def catalog_search(payload: CatalogSearchIn):
                 "provider": payload.provider,
                 "limit": int(payload.limit),
             },
-        ).mappings().all()
+        )
 
-    return {"items": [dict(r) for r in rows]}
+    return {"items": rows}
@@ -1,5 +1,7 @@
 import json
+import threading
 import time
+from contextlib import contextmanager
 from typing import Callable
 from ulid import ULID
 from starlette.requests import Request
@@ -30,3 +32,72 @@ async def request_logger(request: Request, call_next: Callable) -> Response:
     print(json.dumps(log, ensure_ascii=False))
     response.headers["X-Correlation-Id"] = corr_id
     return response
+
+
+# =========================
+# Métricas en proceso (contadores + tiempos)
+# =========================
+_METRICS_LOCK = threading.Lock()
+_COUNTERS: dict[str, float] = {}
+_TIMINGS: dict[str, dict] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _METRICS_LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + value
+
+
+def observe_ms(name: str, ms: float) -> None:
+    with _METRICS_LOCK:
+        t = _TIMINGS.setdefault(name, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0})
+        t["count"] += 1
+        t["sum_ms"] += ms
+        if ms > t["max_ms"]:
+            t["max_ms"] = ms
+
+
+def metrics_snapshot() -> dict:
+    with _METRICS_LOCK:
+        timings = {
+            k: {**v, "avg_ms": round(v["sum_ms"] / v["count"], 3) if v["count"] else 0.0}
+            for k, v in _TIMINGS.items()
+        }
+        return {"counters": dict(_COUNTERS), "timings": timings}
+
+
+class StageTimer:
+    """
+    Acumula tiempos monotónicos por etapa (ms) y conteos de filas.
+    Una misma etapa puede medirse varias veces (p.ej. dentro de un loop): se suma.
+    """
+
+    def __init__(self) -> None:
+        self.stages_ms: dict[str, float] = {}
+        self.counts: dict[str, int] = {}
+        self._start = time.monotonic()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages_ms[name] = self.stages_ms.get(name, 0.0) + (time.monotonic() - t0) * 1000
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + int(n)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round((time.monotonic() - self._start) * 1000, 3),
+            "stages_ms": {k: round(v, 3) for k, v in self.stages_ms.items()},
+            "counts": dict(self.counts),
+        }
+
+    def export(self, prefix: str) -> None:
+        """Publica las etapas y conteos en las métricas del proceso."""
+        observe_ms(f"{prefix}.total", (time.monotonic() - self._start) * 1000)
+        for k, v in self.stages_ms.items():
+            observe_ms(f"{prefix}.{k}", v)
+        for k, v in self.counts.items():
+            incr(f"{prefix}.{k}", v)
@@ -0,0 +1,115 @@
+# app/services/catalog_partitions.py
+"""
+Particionado de catalog_products por org_id (ver migración d7a3c5e81b42).
+
+- ensure_org_partition(): la sync del catálogo debe llamarlo antes del primer insert de un org
+  (crea la partición LIST y mueve lo que haya caído en DEFAULT). En modo HASH no hace nada.
+- check_partition_pruning(): corre EXPLAIN sobre las queries de search/matching y verifica que
+  solo se toque UNA partición (plan-time o runtime pruning).
+
+Uso:
+    python -m app.services.catalog_partitions ensure --org-id ORG
+    python -m app.services.catalog_partitions check --org-id ORG [--q "cable thhn 12"]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.api.routes_catalog import _SQL_SEARCH  # la query de POST /v1/catalog/search, tal cual
+from app.api.routes_matching import _SQL_BATCH_LATERAL, _SQL_RECALL
+
+
+def ensure_org_partition(conn, org_id: str) -> Optional[str]:
+    """Nombre de la partición del org (None si el catálogo no está particionado por LIST)."""
+    return conn.execute(
+        text("SELECT ensure_catalog_partition(:org_id)"),
+        {"org_id": org_id},
+    ).scalar()
+
+
+def _partition_names(conn) -> List[str]:
+    rows = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'catalog_products'::regclass
+    """)).scalars().all()
+    return list(rows)
+
+
+def _scanned_relations(plan: Dict[str, Any], out: List[str], removed: List[int]) -> None:
+    if "Relation Name" in plan:
+        out.append(plan["Relation Name"])
+    if "Subplans Removed" in plan:
+        removed.append(int(plan["Subplans Removed"]))
+    for child in plan.get("Plans") or []:
+        _scanned_relations(child, out, removed)
+
+
+def check_partition_pruning(conn, org_id: str, provider: str = "siigo", q: str = "cable") -> Dict[str, Any]:
+    partitions = set(_partition_names(conn))
+    if not partitions:
+        return {"partitioned": False, "ok": False, "queries": {}}
+
+    queries = {
+        "search": (_SQL_SEARCH, {"q": q, "org_id": org_id, "provider": provider, "limit": 5}),
+        "recall": (_SQL_RECALL.format(extra_where=""), {"q": q, "org_id": org_id, "provider": provider, "fetch_limit": 40}),
+        "batch_lateral": (_SQL_BATCH_LATERAL, {
+            "line_indexes": [0], "enriched_queries": [q], "cat_likes": [None],
+            "org_id": org_id, "provider": provider, "fetch_limit": 40,
+        }),
+    }
+
+    report: Dict[str, Any] = {"partitioned": True, "partitions": len(partitions), "queries": {}}
+    ok = True
+    for name, (sql, params) in queries.items():
+        plan_json = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar()
+        if isinstance(plan_json, str):
+            plan_json = json.loads(plan_json)
+        scanned: List[str] = []
+        removed: List[int] = []
+        _scanned_relations(plan_json[0]["Plan"], scanned, removed)
+        touched = sorted({r for r in scanned if r in partitions})
+        pruned = len(touched) <= 1
+        ok = ok and pruned
+        report["queries"][name] = {
+            "partitions_scanned": touched,
+            "subplans_removed": sum(removed),
+            "pruned": pruned,
+        }
+    report["ok"] = ok
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="catalog_partitions")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    en = sub.add_parser("ensure")
+    en.add_argument("--org-id", required=True)
+    ck = sub.add_parser("check")
+    ck.add_argument("--org-id", required=True)
+    ck.add_argument("--provider", default="siigo")
+    ck.add_argument("--q", default="cable")
+    args = ap.parse_args(argv)
+
+    from app.db_engine import get_engine
+    eng = get_engine()
+    if args.cmd == "ensure":
+        with eng.begin() as conn:
+            report: Dict[str, Any] = {"org_id": args.org_id, "partition": ensure_org_partition(conn, args.org_id)}
+    else:
+        with eng.connect() as conn:
+            report = check_partition_pruning(conn, args.org_id, provider=args.provider, q=args.q)
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0 if report.get("ok", True) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
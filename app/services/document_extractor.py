@@ -1,25 +1,208 @@
 # app/services/document_extractor.py
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import re
-from typing import Optional, Tuple, List
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Generator, NamedTuple, Optional, Tuple, List, Union
 
+from app.observability import incr
 from app.schemas.extraction import ExtractionResult, ExtractedItem, Uom
-from app.services.local_fallback_parser import fallback_txt_lines_to_extraction
+from app.services.line_triage import SECTION, triage_line
+from app.services.local_fallback_parser import fallback_table_text_to_extraction, fallback_txt_lines_to_extraction
 
 logger = logging.getLogger(__name__)
 
 
+class LlmCall(NamedTuple):
+    """
+    Llamada pendiente a un método de OpenAIExtractor / AsyncOpenAIExtractor.
+    background=True: el driver la arranca y devuelve de inmediato el handle (Future / Task),
+    que después se espera con LlmWait.
+    """
+    method: str
+    args: tuple = ()
+    kwargs: dict = {}
+    background: bool = False
+
+
+class LlmWait(NamedTuple):
+    """Espera una llamada en background; si pasa `timeout` se lanza LlmDeadlineExceeded (no la cancela)."""
+    handle: Any
+    timeout: Optional[float] = None
+
+
+class LlmDeadlineExceeded(Exception):
+    pass
+
+
+class PendingUpgrade(NamedTuple):
+    """LLM que siguió corriendo después del deadline: finalize(resultado crudo) -> resultado listo o None."""
+    handle: Any
+    finalize: Callable[[ExtractionResult], Optional[ExtractionResult]]
+
+
+Steps = Generator[Union[LlmCall, LlmWait], Any, ExtractionResult]
+ProgressFn = Callable[[str, Dict[str, Any]], None]
+
+_BACKGROUND: Optional[ThreadPoolExecutor] = None
+_BACKGROUND_LOCK = threading.Lock()
+
+
+def _background_pool() -> ThreadPoolExecutor:
+    """Threads para las llamadas LLM en background del driver síncrono (sobreviven al request)."""
+    global _BACKGROUND
+    with _BACKGROUND_LOCK:
+        if _BACKGROUND is None:
+            _BACKGROUND = ThreadPoolExecutor(
+                max_workers=int(os.getenv("LLM_BACKGROUND_WORKERS", "8")), thread_name_prefix="llm-bg"
+            )
+        return _BACKGROUND
+
+
+def _wait_sync(op: LlmWait) -> Any:
+    handle: Future = op.handle
+    try:
+        return handle.result(timeout=op.timeout)
+    except FutureTimeoutError:
+        if handle.done():
+            raise  # la llamada misma lanzó TimeoutError
+        raise LlmDeadlineExceeded() from None
+
+
+async def _wait_async(op: LlmWait) -> Any:
+    try:
+        return await asyncio.wait_for(asyncio.shield(op.handle), op.timeout)
+    except asyncio.TimeoutError:
+        if op.handle.done():
+            raise
+        raise LlmDeadlineExceeded() from None
+
+
+def _resume(op, value) -> Tuple[bool, Any]:
+    """Avanza el generador: (False, LlmCall) si pide otra llamada, (True, resultado) si terminó."""
+    try:
+        return False, op(value)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+_AWG_RE = re.compile(r"awg|\bthhn\b|\bthwn\b|\btpx\b|\bacsr\b|\bkcmil\b", re.I)
+_MULTI_CONDUCTOR_RE = re.compile(r"\d[xX]\d{1,2}")
+
+
+def _flag_for_enrichment(it: ExtractedItem) -> bool:
+    # Low confidence items
+    if (it.confidence or 0) < 0.5:
+        return True
+    # Items kept despite low confidence
+    if it.warnings and "LOW_CONFIDENCE_KEPT" in it.warnings:
+        return True
+    # Multi-conductor patterns in description without clear category
+    desc = (it.description or "").lower()
+    return bool(_MULTI_CONDUCTOR_RE.search(desc) and _AWG_RE.search(desc))
+
+
+def _enrich_item_dict(it: ExtractedItem) -> Dict[str, Any]:
+    return {
+        "line_index": it.line_index,
+        "description": it.description,
+        "quantity": it.quantity,
+        "uom": it.uom.value if isinstance(it.uom, Uom) else str(it.uom),
+        "confidence": it.confidence,
+        "warnings": it.warnings or [],
+    }
+
+
+def _context_for_lines(lines: List[str], indexes: List[int], window: int) -> str:
+    """
+    Fragmentos del texto original alrededor de `indexes` (±window líneas) más el encabezado de
+    sección más cercano hacia arriba de cada uno. Formato "[n] línea"; "..." marca los saltos.
+    """
+    keep = set()
+    for idx in indexes:
+        if not (0 <= idx < len(lines)):
+            continue
+        keep.update(range(max(0, idx - window), min(len(lines), idx + window + 1)))
+        for j in range(idx - 1, -1, -1):
+            if triage_line(lines[j]) == SECTION:
+                keep.add(j)
+                break
+
+    out: List[str] = []
+    prev = None
+    for j in sorted(keep):
+        if prev is not None and j != prev + 1:
+            out.append("...")
+        out.append(f"[{j}] {lines[j]}")
+        prev = j
+    return "\n".join(out)
+
+
 class DocumentExtractor:
-    def __init__(self) -> None:
+    def __init__(self, progress: Optional[ProgressFn] = None) -> None:
+        # callback opcional (stage, data) para reportar avance (SSE de parse)
+        self.progress = progress
         self.max_items = int(os.getenv("OPENAI_MAX_ITEMS", "200"))
         self.max_file_mb = int(os.getenv("OPENAI_MAX_FILE_MB", "10"))
         self.pdf_max_pages = int(os.getenv("OPENAI_PDF_MAX_PAGES", "10"))
         # Mismo default que OpenAIExtractor: este valor solo etiqueta meta.model,
         # así que si difiere del real deja los drafts con un modelo que nunca corrió.
         self.model = os.getenv("OPENAI_MODEL_EXTRACTOR", "gpt-4.1-mini")
+        # PDF con deadline (0 = esperar al LLM siempre): ver _hedge_pdf
+        self.pdf_hedge_deadline_s = float(os.getenv("PDF_HEDGE_DEADLINE_S", "0"))
+        # LLM que quedó corriendo tras devolver el resultado local; lo aplica draft_parsing
+        self.pending_upgrade: Optional[PendingUpgrade] = None
+
+    def _emit(self, stage: str, **data: Any) -> None:
+        if self.progress is None:
+            return
+        try:
+            self.progress(stage, data)
+        except Exception:
+            logger.warning("progress callback failed", exc_info=True)
+
+    def _local_parse(self, text: str) -> ExtractionResult:
+        res = fallback_txt_lines_to_extraction(text)
+        self._emit("local_parse_done", items=[it.model_dump(mode="json") for it in res.items])
+        return res
+
+    def _pdf_local_parse(self, pdf: Any, pdf_text: str) -> Optional[ExtractionResult]:
+        """
+        Parser local de un PDF: si el modo layout arma una tabla con encabezado, va por
+        fallback_table_text_to_extraction (columnas reales); si no, por líneas sobre pdf_text.
+        None si no hay texto.
+        """
+        from app.services.pdf_tables import pdf_tables_enabled  # lazy import
+
+        if not pdf_text.strip():
+            return None
+        table = pdf.table() if pdf_tables_enabled() else None
+        if table is not None:
+            table_text, table_meta = table
+            res = fallback_table_text_to_extraction(table_text, "pdf", max_items=self.max_items)
+            if res.items:
+                incr("pdf_table.used")
+                self._emit("local_parse_done", items=[it.model_dump(mode="json") for it in res.items])
+                res.meta = {**(res.meta or {}), "pdf_table": table_meta}
+                return res
+        return self._local_parse(pdf_text)
+
+    def _pdf_enrich_context(self, pdf: Any, res: ExtractionResult, pdf_text: str) -> str:
+        """
+        Texto sobre el que se arma el contexto de enrich: si los items salieron de la tabla, su
+        line_index es la fila de datos de esa tabla (sin encabezado), no una línea de pdf_text.
+        """
+        if "pdf_table" in (res.meta or {}):
+            table = pdf.table()
+            if table is not None:
+                rows = [ln for ln in table[0].splitlines() if ln.strip()][1:]
+                return "\n".join(rows)
+        return pdf_text
 
     def _openai_enabled(self) -> bool:
         return os.getenv("OPENAI_ENABLED", "false").lower() == "true"
@@ -29,48 +212,46 @@ class DocumentExtractor:
 
     def _needs_enrichment(self, items: List[ExtractedItem]) -> bool:
         """Check if any items would benefit from OpenAI enrichment."""
-        _AWG_RE = re.compile(r"awg|\bthhn\b|\bthwn\b|\btpx\b|\bacsr\b|\bkcmil\b", re.I)
-        for it in items:
-            # Low confidence items
-            if (it.confidence or 0) < 0.5:
-                return True
-            # Items kept despite low confidence
-            if it.warnings and "LOW_CONFIDENCE_KEPT" in it.warnings:
-                return True
-            # Multi-conductor patterns in description without clear category
-            desc = (it.description or "").lower()
-            if re.search(r"\d[xX]\d{1,2}", desc) and _AWG_RE.search(desc):
-                return True
-        return False
-
-    def _enrich_with_openai(self, result: ExtractionResult, raw_text: str) -> ExtractionResult:
+        return any(_flag_for_enrichment(it) for it in items)
+
+    def _enrich_batches(self, result: ExtractionResult, raw_text: str) -> List[Tuple[list, str]]:
+        """
+        Solo los items marcados, en lotes de OPENAI_ENRICH_BATCH_SIZE; cada lote lleva su propio
+        contexto (líneas vecinas + encabezados de sección), no todo el documento.
+        """
+        flagged = [it for it in result.items if _flag_for_enrichment(it)]
+        size = max(1, int(os.getenv("OPENAI_ENRICH_BATCH_SIZE", "20")))
+        window = max(0, int(os.getenv("OPENAI_ENRICH_CONTEXT_LINES", "2")))
+        lines = [ln.strip() for ln in (raw_text or "").splitlines() if ln.strip()]
+
+        batches = []
+        for i in range(0, len(flagged), size):
+            chunk = flagged[i:i + size]
+            batches.append((
+                [_enrich_item_dict(it) for it in chunk],
+                _context_for_lines(lines, [int(it.line_index) for it in chunk], window),
+            ))
+        return batches
+
+    def _enrich_with_openai(self, result: ExtractionResult, raw_text: str) -> Steps:
         """Post-parse enrichment: send problematic items to OpenAI for correction."""
         if not result.items:
             return result
 
         try:
-            from app.services.openai_extractor import OpenAIExtractor
-
-            # Convert items to dicts for the enrichment API
-            items_dicts = []
-            for it in result.items:
-                d = {
-                    "line_index": it.line_index,
-                    "description": it.description,
-                    "quantity": it.quantity,
-                    "uom": it.uom.value if isinstance(it.uom, Uom) else str(it.uom),
-                    "confidence": it.confidence,
-                    "warnings": it.warnings or [],
-                }
-                items_dicts.append(d)
-
-            enriched = OpenAIExtractor().enrich_items(items_dicts, raw_text)
-
-            if not enriched or len(enriched) != len(result.items):
+            batches = self._enrich_batches(result, raw_text)
+            if not batches:
                 return result
 
-            # Apply enriched data back to ExtractedItem objects
-            for orig, enr in zip(result.items, enriched):
+            enriched = yield LlmCall("enrich_batches", (batches,))
+
+            # merge por line_index: solo se tocan los items que fueron al LLM
+            by_line = {e.get("line_index"): e for e in (enriched or []) if isinstance(e, dict)}
+            sent = {d["line_index"] for items, _ in batches for d in items}
+            for orig in result.items:
+                enr = by_line.get(orig.line_index)
+                if orig.line_index not in sent or enr is None:
+                    continue
                 if enr.get("description"):
                     orig.description = str(enr["description"])[:160]
                 if "quantity" in enr:
@@ -99,7 +280,15 @@ class DocumentExtractor:
                     orig.warnings = ws
 
             result.global_warnings = (result.global_warnings or []) + ["OPENAI_ENRICHMENT_APPLIED"]
-            result.meta = {**(result.meta or {}), "enrichment": "openai"}
+            self._emit("enrichment_applied", items=[it.model_dump(mode="json") for it in result.items])
+            result.meta = {
+                **(result.meta or {}),
+                "enrichment": "openai",
+                "enrichment_items_sent": len(sent),
+                "enrichment_items_total": len(result.items),
+                "enrichment_batches": len(batches),
+                "enrichment_context_chars": sum(len(ctx) for _, ctx in batches),
+            }
 
         except Exception as e:
             logger.warning("OpenAI enrichment failed: %s", e)
@@ -144,13 +333,68 @@ class DocumentExtractor:
         return "txt"
 
     def extract(self, source_path: str, filename: str | None, content_type: str | None) -> ExtractionResult:
+        """Extracción síncrona (OpenAIExtractor)."""
+        steps = self._extract_steps(source_path, filename, content_type)
+        extractor = None
+        done, out = _resume(steps.send, None)
+        while not done:
+            try:
+                if isinstance(out, LlmWait):
+                    value = _wait_sync(out)
+                else:
+                    if extractor is None:
+                        from app.services.openai_extractor import OpenAIExtractor  # lazy import
+                        extractor = OpenAIExtractor(progress=self.progress)
+                    self._emit("llm_call_started", method=out.method)
+                    fn = getattr(extractor, out.method)
+                    if out.background:
+                        value = _background_pool().submit(fn, *out.args, **out.kwargs)
+                    else:
+                        value = fn(*out.args, **out.kwargs)
+            except Exception as e:
+                done, out = _resume(steps.throw, e)
+            else:
+                done, out = _resume(steps.send, value)
+        return out
+
+    async def extract_async(self, source_path: str, filename: str | None, content_type: str | None) -> ExtractionResult:
+        """
+        Misma lógica que extract(), pero las llamadas al LLM son awaits sobre AsyncOpenAIExtractor
+        y el trabajo local (lectura, pypdf, parser) corre en un thread para no bloquear el loop.
+        """
+        steps = self._extract_steps(source_path, filename, content_type)
+        extractor = None
+        done, out = await asyncio.to_thread(_resume, steps.send, None)
+        while not done:
+            try:
+                if isinstance(out, LlmWait):
+                    value = await _wait_async(out)
+                else:
+                    if extractor is None:
+                        from app.services.openai_extractor import AsyncOpenAIExtractor  # lazy import
+                        extractor = AsyncOpenAIExtractor(progress=self.progress)
+                    self._emit("llm_call_started", method=out.method)
+                    coro = getattr(extractor, out.method)(*out.args, **out.kwargs)
+                    value = asyncio.ensure_future(coro) if out.background else await coro
+            except Exception as e:
+                done, out = await asyncio.to_thread(_resume, steps.throw, e)
+            else:
+                done, out = await asyncio.to_thread(_resume, steps.send, value)
+        return out
+
+    def _extract_steps(self, source_path: str, filename: str | None, content_type: str | None) -> Steps:
+        """
+        Lógica de extracción como generador: cada llamada al LLM se hace con `yield LlmCall(...)`
+        y el driver (extract / extract_async) devuelve el resultado o lanza la excepción en ese punto.
+        """
         source_type = self.detect(source_path, filename, content_type)
+        self._emit("source_detected", source_type=source_type)
 
         # Guard simple de tamaño (no revienta el server; deja warning)
         try:
             size_bytes = os.path.getsize(source_path)
             if size_bytes > self.max_file_mb * 1024 * 1024:
-                res = fallback_txt_lines_to_extraction(f"[file too large: {filename or 'document'}]")
+                res = self._local_parse(f"[file too large: {filename or 'document'}]")
                 res.global_warnings = (res.global_warnings or []) + ["FILE_TOO_LARGE"]
                 res.meta = {
                     **(res.meta or {}),
@@ -169,7 +413,7 @@ class DocumentExtractor:
             text = open(source_path, "r", encoding="utf-8", errors="ignore").read()
 
             # 0) Siempre correr parser local primero (rápido y estable)
-            local_res = fallback_txt_lines_to_extraction(text)
+            local_res = self._local_parse(text)
             local_res.meta = {**(local_res.meta or {}), "extractor": "local", "model": "local-fallback-v1", "source_type": "txt"}
 
             # Heurística simple: si local ya encontró items suficientes -> NO OpenAI full extraction
@@ -179,15 +423,14 @@ class DocumentExtractor:
 
                 # Post-parse enrichment: if enabled and items need it, ask OpenAI to fix them
                 if self._enrich_enabled() and self._needs_enrichment(local_res.items):
-                    local_res = self._enrich_with_openai(local_res, text)
+                    local_res = yield from self._enrich_with_openai(local_res, text)
 
                 return self._enforce_max_items(local_res)
 
             # 1) Si local NO encontró items, ahí sí intenta OpenAI (si está habilitado)
             if self._openai_enabled():
                 try:
-                    from app.services.openai_extractor import OpenAIExtractor  # lazy import
-                    res = OpenAIExtractor().normalize_from_text(text)
+                    res = yield LlmCall("normalize_from_text", (text,))
                     res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model, "source_type": "txt"}
                     return self._enforce_max_items(res)
                 except Exception as e:
@@ -219,12 +462,11 @@ class DocumentExtractor:
 
             if self._openai_enabled():
                 try:
-                    from app.services.openai_extractor import OpenAIExtractor
-                    res = OpenAIExtractor().normalize_from_table(table_text)
+                    res = yield LlmCall("normalize_from_table", (table_text,))
                     res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model}
 
                 except Exception as e:
-                    res = fallback_txt_lines_to_extraction(text)
+                    res = self._local_parse(text)
                     res.global_warnings = (res.global_warnings or []) + [
                         "OPENAI_FAILED",
                         f"OPENAI_ERROR_{e.__class__.__name__}",
@@ -247,7 +489,7 @@ class DocumentExtractor:
                         "openai_error_message": str(e),
                     }
             else:
-                res = fallback_txt_lines_to_extraction(table_text)
+                res = self._local_parse(table_text)
                 res.meta = {**(res.meta or {}), "extractor": "local", "model": "local-fallback-v1"}
 
             if was_truncated:
@@ -267,12 +509,11 @@ class DocumentExtractor:
 
             if self._openai_enabled():
                 try:
-                    from app.services.openai_extractor import OpenAIExtractor
-                    res = OpenAIExtractor().normalize_from_table(table_text)
+                    res = yield LlmCall("normalize_from_table", (table_text,))
                     res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model}
                 
                 except Exception as e:
-                    res = fallback_txt_lines_to_extraction(text)
+                    res = self._local_parse(text)
                     res.global_warnings = (res.global_warnings or []) + [
                         "OPENAI_FAILED",
                         f"OPENAI_ERROR_{e.__class__.__name__}",
@@ -295,7 +536,7 @@ class DocumentExtractor:
                         "openai_error_message": str(e),
                     }
             else:
-                res = fallback_txt_lines_to_extraction(table_text)
+                res = self._local_parse(table_text)
                 res.meta = {**(res.meta or {}), "extractor": "local", "model": "local-fallback-v1"}
 
             if was_truncated:
@@ -306,48 +547,76 @@ class DocumentExtractor:
 
         # ---------------- PDF ----------------
         if source_type == "pdf":
-            pdf_path = source_path
-            truncated = False
-
-            # truncado de páginas (soporta retorno str o (path, truncated_bool))
+            # un solo PdfReader para contar páginas, texto y truncado (en memoria, solo si se sube)
+            from app.services.pdf_utils import PdfSource  # lazy import
+            pdf = PdfSource(source_path, max_pages=self.pdf_max_pages)
             try:
-                from app.services.pdf_utils import truncate_pdf_pages  # lazy import
-                out = truncate_pdf_pages(source_path, max_pages=self.pdf_max_pages)
-                if isinstance(out, tuple):
-                    pdf_path, truncated = out[0], bool(out[1])
-                else:
-                    pdf_path = out
-                    truncated = True  # si la util no dice, asumimos que truncó si devolvió nuevo path
+                truncated = pdf.truncated
             except Exception:
-                pdf_path = source_path
                 truncated = False
 
+            # Ruteo barato: un escaneado sin capa de texto no pasa por pypdf ni por el parser local
+            # (no pueden sacar nada) y va directo al modelo; uno de texto prueba local primero.
+            from app.services.pdf_utils import pdf_routing_enabled  # lazy import
+            pdf_class = pdf.classify() if pdf_routing_enabled() else {"kind": "unknown", "pages_sampled": 0}
+            scanned = pdf_class["kind"] == "scanned"
+            self._emit("pdf_classified", **pdf_class)
+            incr(f"pdf_route.{pdf_class['kind']}")
+
+            # Con deadline el LLM arranca YA en background y corre en paralelo con pypdf + parser local
+            hedge_t0 = time.monotonic()
+            hedged = None
+            self.pending_upgrade = None
+            if self._openai_enabled() and self.pdf_hedge_deadline_s > 0 and not scanned:
+                try:
+                    hedged = yield LlmCall(
+                        "extract_from_pdf", (pdf,),
+                        {"content_key": self._pdf_content_key(source_path, truncated)},
+                        background=True,
+                    )
+                except Exception as e:
+                    logger.warning("PDF_HEDGE_START_FAILED err=%s", e)
+
             # 0) Extract text with pypdf (needed for local fallback)
             pdf_text = ""
             try:
-                from pypdf import PdfReader
-                reader = PdfReader(pdf_path)
-                pages_text = []
-                for page in reader.pages:
-                    t = page.extract_text() or ""
-                    if t.strip():
-                        pages_text.append(t)
-                pdf_text = "\n".join(pages_text)
+                if not scanned:
+                    pages_text = [t for t in pdf.page_texts() if t.strip()]
+                    pdf_text = "\n".join(pages_text)
+                    self._emit("pdf_text_extracted", pages=pdf.pages_used, chars=len(pdf_text),
+                               page_ms=[st["ms"] for st in pdf.page_stats])
             except Exception as e:
                 logger.warning("pypdf text extraction failed: %s", e)
                 pdf_text = ""
 
+            # PDF de texto sin deadline: igual que TXT, si el parser local ya encontró items no se sube el archivo
+            res = None
+            if pdf_class["kind"] == "text" and hedged is None and self._openai_enabled() and pdf_text.strip():
+                local_res = self._pdf_local_parse(pdf, pdf_text)
+                if len(local_res.items) >= int(os.getenv("LOCAL_FIRST_MIN_ITEMS", "1")):
+                    local_res.global_warnings = (local_res.global_warnings or []) + ["LOCAL_FIRST_USED", "SKIPPED_OPENAI"]
+                    local_res.meta = {**(local_res.meta or {}), "extractor": "local", "model": "local-fallback-v1"}
+                    res = local_res
+                    if self._enrich_enabled() and self._needs_enrichment(res.items):
+                        res = yield from self._enrich_with_openai(res, self._pdf_enrich_context(pdf, res, pdf_text))
+
             # 1) Try OpenAI first (if enabled)
-            if self._openai_enabled():
+            if res is None and self._openai_enabled():
                 try:
-                    from app.services.openai_extractor import OpenAIExtractor
-                    res = OpenAIExtractor().extract_from_pdf(pdf_path)
-                    res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model}
+                    if hedged is not None:
+                        res = yield from self._hedge_pdf(hedged, self._pdf_local_parse(pdf, pdf_text), hedge_t0, truncated)
+                    else:
+                        res = yield LlmCall(
+                            "extract_from_pdf", (pdf,),
+                            {"content_key": self._pdf_content_key(source_path, truncated)},
+                        )
+                    if self.pending_upgrade is None:
+                        res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model}
 
                     # If OpenAI returned 0 items, fall back to local
-                    if len(res.items) == 0 and pdf_text.strip():
+                    if self.pending_upgrade is None and len(res.items) == 0 and pdf_text.strip():
                         logger.warning("OpenAI returned 0 items for PDF, falling back to local parser")
-                        res = fallback_txt_lines_to_extraction(pdf_text)
+                        res = self._pdf_local_parse(pdf, pdf_text)
                         res.global_warnings = (res.global_warnings or []) + [
                             "OPENAI_EMPTY_RESULT",
                             "FALLBACK_LOCAL_USED",
@@ -355,13 +624,13 @@ class DocumentExtractor:
                         res.meta = {**(res.meta or {}), "extractor": "local", "model": "local-fallback-v1"}
 
                         if self._enrich_enabled() and self._needs_enrichment(res.items):
-                            res = self._enrich_with_openai(res, pdf_text)
+                            res = yield from self._enrich_with_openai(res, self._pdf_enrich_context(pdf, res, pdf_text))
 
                 except Exception as e:
                     # OpenAI failed — use local pdf_text if available
                     logger.warning("OpenAI PDF extraction failed: %s — falling back to local", e)
-                    fallback_source = pdf_text if pdf_text.strip() else f"[uploaded pdf: {filename or 'document.pdf'}]"
-                    res = fallback_txt_lines_to_extraction(fallback_source)
+                    res = (self._pdf_local_parse(pdf, pdf_text)
+                           or self._local_parse(f"[uploaded pdf: {filename or 'document.pdf'}]"))
                     res.global_warnings = (res.global_warnings or []) + [
                         "OPENAI_FAILED",
                         f"OPENAI_ERROR_{e.__class__.__name__}",
@@ -376,32 +645,44 @@ class DocumentExtractor:
                     }
 
                     if self._enrich_enabled() and self._needs_enrichment(res.items):
-                        res = self._enrich_with_openai(res, pdf_text)
-            else:
+                        res = yield from self._enrich_with_openai(res, self._pdf_enrich_context(pdf, res, pdf_text))
+            elif res is None:
                 # 2) OpenAI disabled — local parser only
-                fallback_source = pdf_text if pdf_text.strip() else f"[uploaded pdf: {filename or 'document.pdf'}]"
-                res = fallback_txt_lines_to_extraction(fallback_source)
+                res = (self._pdf_local_parse(pdf, pdf_text)
+                       or self._local_parse(f"[uploaded pdf: {filename or 'document.pdf'}]"))
                 res.global_warnings = (res.global_warnings or []) + ["OPENAI_DISABLED", "FALLBACK_LOCAL_USED"]
+                if scanned:
+                    res.global_warnings.append("PDF_SCANNED_REQUIRES_OPENAI")
                 res.meta = {**(res.meta or {}), "extractor": "local", "model": "local-fallback-v1"}
 
                 if pdf_text.strip() and self._enrich_enabled() and self._needs_enrichment(res.items):
-                    res = self._enrich_with_openai(res, pdf_text)
+                    res = yield from self._enrich_with_openai(res, self._pdf_enrich_context(pdf, res, pdf_text))
 
             if truncated:
                 res.global_warnings = (res.global_warnings or []) + ["TRUNCATED_PDF_PAGES"]
 
-            res.meta = {**(res.meta or {}), "source_type": "pdf"}
+            res.meta = {**(res.meta or {}), "source_type": "pdf", "pdf_class": pdf_class}
+            if pdf.page_stats:
+                res.meta["pdf_text"] = {
+                    "mode": pdf.text_mode,
+                    "page_ms": [st["ms"] for st in pdf.page_stats],
+                    "pages_timed_out": [st["page"] for st in pdf.page_stats if st["timed_out"]],
+                }
             return self._enforce_max_items(res)
 
         # ---------------- IMAGE ----------------
         if source_type == "image":
             mime = (content_type or "image/jpeg").lower()
             img_bytes = open(source_path, "rb").read()
+            prep_meta = None
 
             if self._openai_enabled():
+                # orientar/recortar/reescalar/recomprimir antes del data URL (image_preprocess)
+                from app.services.image_preprocess import preprocess_image  # lazy import
+                img_bytes, mime, prep_meta = preprocess_image(img_bytes, mime)
+                self._emit("image_preprocessed", **prep_meta)
                 try:
-                    from app.services.openai_extractor import OpenAIExtractor
-                    res = OpenAIExtractor().extract_from_image(img_bytes, mime=mime)
+                    res = yield LlmCall("extract_from_image", (img_bytes,), {"mime": mime})
                     res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model}
                
                 
@@ -429,14 +710,79 @@ class DocumentExtractor:
                 )
 
             res.meta = {**(res.meta or {}), "source_type": "image"}
+            if prep_meta is not None:
+                res.meta["image_preprocess"] = prep_meta
             return self._enforce_max_items(res)
 
         # fallback final
         text = open(source_path, "r", encoding="utf-8", errors="ignore").read()
-        res = fallback_txt_lines_to_extraction(text)
+        res = self._local_parse(text)
         res.meta = {**(res.meta or {}), "source_type": source_type, "extractor": "local", "model": "local-fallback-v1"}
         return self._enforce_max_items(res)
 
+    def _pdf_content_key(self, source_path: str, truncated: bool) -> Optional[str]:
+        # truncado => la key es el original + límite de páginas (los bytes reescritos no son estables)
+        if not truncated:
+            return None
+        from app.services.openai_files import content_sha256
+        return f"{content_sha256(source_path)}:pages={self.pdf_max_pages}"
+
+    def _local_good_enough(self, res: ExtractionResult) -> bool:
+        items = res.items or []
+        if len(items) < int(os.getenv("PDF_HEDGE_MIN_ITEMS", "1")):
+            return False
+        avg_conf = sum(float(it.confidence or 0) for it in items) / len(items)
+        return avg_conf >= float(os.getenv("PDF_HEDGE_MIN_CONFIDENCE", "0.6"))
+
+    def _hedge_pdf(self, handle: Any, local: Optional[ExtractionResult], t0: float, truncated: bool) -> Steps:
+        """
+        Espera el LLM (ya corriendo) hasta PDF_HEDGE_DEADLINE_S. Pasado el deadline, si el parser
+        local (`local`, None sin texto) salió bien (PDF_HEDGE_MIN_ITEMS, PDF_HEDGE_MIN_CONFIDENCE)
+        se devuelve ese resultado y el LLM sigue en background (self.pending_upgrade); si no, se
+        sigue esperando al LLM.
+        """
+        remaining = max(self.pdf_hedge_deadline_s - (time.monotonic() - t0), 0.0)
+        hedge = {"deadline_s": self.pdf_hedge_deadline_s}
+        try:
+            res = yield LlmWait(handle, remaining)
+            winner = "llm"
+        except LlmDeadlineExceeded:
+            waited_ms = round((time.monotonic() - t0) * 1000, 1)
+            self._emit("llm_deadline_exceeded", waited_ms=waited_ms)
+            if local is None or not self._local_good_enough(local):
+                incr("pdf_hedge.local_insufficient")
+                res = yield LlmWait(handle, None)
+                winner = "llm_after_deadline"
+            else:
+                incr("pdf_hedge.local_used")
+                self.pending_upgrade = PendingUpgrade(handle, lambda raw: self._finalize_pdf_upgrade(raw, truncated))
+                local.global_warnings = (local.global_warnings or []) + [
+                    "LLM_DEADLINE_EXCEEDED", "LOCAL_RESULT_USED", "LLM_UPGRADE_PENDING",
+                ]
+                local.meta = {
+                    **(local.meta or {}),
+                    "extractor": "local",
+                    "model": "local-fallback-v1",
+                    "llm_upgrade_pending": True,
+                    "hedge": {**hedge, "winner": "local", "waited_ms": waited_ms},
+                }
+                return local
+
+        incr(f"pdf_hedge.{winner}")
+        res.meta = {**(res.meta or {}), "hedge": {
+            **hedge, "winner": winner, "llm_ms": round((time.monotonic() - t0) * 1000, 1),
+        }}
+        return res
+
+    def _finalize_pdf_upgrade(self, res: ExtractionResult, truncated: bool) -> Optional[ExtractionResult]:
+        """Resultado del LLM que llegó tarde, con la misma forma que el camino normal; None si vino vacío."""
+        if not res.items:
+            return None
+        res.meta = {**(res.meta or {}), "extractor": "openai", "model": self.model, "source_type": "pdf"}
+        if truncated:
+            res.global_warnings = (res.global_warnings or []) + ["TRUNCATED_PDF_PAGES"]
+        return self._enforce_max_items(res)
+
     def _enforce_max_items(self, res: ExtractionResult) -> ExtractionResult:
         if len(res.items) > self.max_items:
             res.items = res.items[: self.max_items]
@@ -0,0 +1,326 @@
+# app/services/draft_parsing.py
+"""
+Núcleo de POST /v1/drafts/{id}/parse: validar el draft, extraer (con cache) y guardar draft_items.
+
+- parse_draft():       síncrono (endpoint clásico).
+- parse_draft_async(): mismo flujo con DocumentExtractor.extract_async (AsyncOpenAI);
+                       la DB corre en un thread, las llamadas al LLM quedan en el event loop.
+- stream_parse_events(): corre parse_draft en un thread y emite cada etapa como SSE
+                       (POST /v1/drafts/{id}/parse/stream); las etapas quedan en parse_events
+                       y GET /parse/stream las observa.
+- apply_llm_upgrade(): PDF con deadline (PDF_HEDGE_DEADLINE_S): se guardó el resultado local y
+                       el del LLM, cuando llega, reemplaza los items si nadie los editó.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.observability import incr
+from app.schemas.extraction import ExtractionResult
+from app.services import parse_events
+from app.services.document_extractor import DocumentExtractor, PendingUpgrade, ProgressFn
+from app.services.extraction_cache import extract_cached, extract_cached_async
+
+logger = logging.getLogger(__name__)
+
+
+def _sanitize_text(value: str | None) -> str | None:
+    if value is None:
+        return None
+    # Elimina cualquier byte NUL que rompe PostgreSQL
+    return value.replace("\x00", "")
+
+
+def load_draft_for_parse(eng, draft_id: str) -> Dict[str, Any]:
+    with eng.connect() as conn:
+        draft = conn.execute(
+            text("SELECT id, status, stored_path, original_filename FROM drafts WHERE id = :id"),
+            {"id": draft_id},
+        ).mappings().first()
+
+    if not draft:
+        raise HTTPException(status_code=404, detail="Draft not found")
+
+    if (draft.get("status") or "").upper() == "COMMITTED":
+        raise HTTPException(status_code=409, detail="Draft is COMMITTED. Create a new draft to parse.")
+
+    with eng.connect() as conn:
+        cnt = conn.execute(
+            text("SELECT COUNT(1) FROM draft_items WHERE draft_id=:id"),
+            {"id": draft_id},
+        ).scalar() or 0
+    if int(cnt) > 0:
+        raise HTTPException(
+            status_code=409,
+            detail="Draft already has items. Use PUT /v1/quote-drafts/{draft_id}/items or create a new draft.",
+        )
+
+    return dict(draft)
+
+
+def _replace_items(conn, draft_id: str, result: ExtractionResult) -> None:
+    conn.execute(text("DELETE FROM draft_items WHERE draft_id = :draft_id"), {"draft_id": draft_id})
+
+    for it in result.items:
+        item_warnings = it.warnings or []
+        conn.execute(
+            text("""
+                INSERT INTO draft_items
+                    (id, draft_id, line_index, raw_text, description, quantity, uom, uom_raw, confidence, warnings_json)
+                VALUES
+                    (:id, :draft_id, :line_index, :raw_text, :description, :quantity, :uom, :uom_raw, :confidence, CAST(:warnings_json AS jsonb))
+            """),
+            {
+                "id": str(uuid.uuid4()),
+                "draft_id": draft_id,
+                "line_index": int(it.line_index),
+                "raw_text": _sanitize_text(it.raw_text),
+                "description": _sanitize_text(it.description),
+                "quantity": float(it.quantity),
+                "uom": it.uom,
+                "uom_raw": _sanitize_text(it.uom_raw),
+                "confidence": it.confidence,
+                "warnings_json": json.dumps(item_warnings),
+            },
+        )
+
+
+def save_parse_result(eng, draft_id: str, result: ExtractionResult) -> Dict[str, Any]:
+    with eng.begin() as conn:
+        _replace_items(conn, draft_id, result)
+
+        draft_warning_payload = {
+            "global_warnings": result.global_warnings or [],
+            "meta": result.meta or {},
+        }
+
+        conn.execute(
+            text("""
+                UPDATE drafts
+                SET status = CASE WHEN status='COMMITTED' THEN 'COMMITTED' ELSE :status END,
+                    warnings_json = CAST(:warnings_json AS jsonb),
+                    updated_at = NOW()
+                WHERE id = :id
+            """),
+            {
+                "id": draft_id,
+                "status": "PARSED",
+                "warnings_json": json.dumps(draft_warning_payload),
+            },
+        )
+
+    meta = result.meta or {}
+    return {
+        "draft_id": draft_id,
+        "status": "PARSED",
+        "items_created": len(result.items),
+        "input_line_count": meta.get("input_line_count"),
+        "warnings": result.global_warnings or [],
+        "meta": meta,
+    }
+
+
+def parse_draft(eng, draft_id: str, progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+    draft = load_draft_for_parse(eng, draft_id)
+    if progress:
+        progress("upload_stored", {
+            "filename": draft.get("original_filename"),
+            "size_bytes": os.path.getsize(draft["stored_path"]) if os.path.exists(draft["stored_path"]) else None,
+        })
+    extractor = DocumentExtractor(progress=progress)
+    # mismo archivo + misma config => reusa el ExtractionResult (meta.cache.hit)
+    result, _ = extract_cached(eng, extractor, draft["stored_path"], draft.get("original_filename") or "", content_type=None)
+    out = save_parse_result(eng, draft_id, result)
+    # después de guardar: si el LLM ya terminó, el callback corre aquí mismo y encuentra el flag
+    _schedule_llm_upgrade(eng, draft_id, extractor.pending_upgrade)
+    if progress:
+        progress("items_persisted", {"items_created": out["items_created"]})
+    return out
+
+
+async def parse_draft_async(eng, draft_id: str) -> Dict[str, Any]:
+    draft = await asyncio.to_thread(load_draft_for_parse, eng, draft_id)
+    extractor = DocumentExtractor()
+    result, _ = await extract_cached_async(
+        eng, extractor, draft["stored_path"], draft.get("original_filename") or "", content_type=None
+    )
+    out = await asyncio.to_thread(save_parse_result, eng, draft_id, result)
+    _schedule_llm_upgrade(eng, draft_id, extractor.pending_upgrade)
+    return out
+
+
+def cancel_llm_upgrade(conn, draft_id: str) -> None:
+    """
+    Apaga meta.llm_upgrade_pending: los items ya tienen trabajo encima (match aplicado, selección
+    manual) y el LLM que llegue tarde no debe reemplazarlos. Toma el lock de la fila del draft, así
+    que queda serializado con apply_llm_upgrade.
+    """
+    conn.execute(
+        text("""
+            UPDATE drafts
+            SET warnings_json = jsonb_set(warnings_json, '{meta,llm_upgrade_pending}', 'false'::jsonb),
+                updated_at = NOW()
+            WHERE id = :id AND (warnings_json -> 'meta' ->> 'llm_upgrade_pending') = 'true'
+        """),
+        {"id": draft_id},
+    )
+
+
+def apply_llm_upgrade(eng, draft_id: str, result: Optional[ExtractionResult], error: Optional[str] = None) -> bool:
+    """
+    Reemplaza los items provisorios (resultado local por deadline) por los del LLM que llegó tarde.
+    Solo si el draft sigue con meta.llm_upgrade_pending: PUT items (edición del usuario), el match
+    aplicado y la selección manual lo apagan, y un draft COMMITTED no se toca. Si igual hay items con
+    item_code (match que no pasó por cancel_llm_upgrade) tampoco se reemplaza. Devuelve True si se aplicó.
+    """
+    with eng.begin() as conn:
+        draft = conn.execute(
+            text("SELECT id, status, warnings_json FROM drafts WHERE id = :id FOR UPDATE"),
+            {"id": draft_id},
+        ).mappings().first()
+        w = (draft or {}).get("warnings_json") or {}
+        meta = w.get("meta") if isinstance(w, dict) else None
+        if (
+            not draft
+            or (draft.get("status") or "").upper() == "COMMITTED"
+            or not isinstance(meta, dict)
+            or not meta.get("llm_upgrade_pending")
+        ):
+            incr("pdf_hedge.upgrade_skipped")
+            return False
+
+        hedge = {**(meta.get("hedge") or {})}
+        matched = conn.execute(
+            text("SELECT 1 FROM draft_items WHERE draft_id = :id AND item_code IS NOT NULL LIMIT 1"),
+            {"id": draft_id},
+        ).first()
+        if matched:
+            conn.execute(
+                text("UPDATE drafts SET warnings_json = CAST(:warnings_json AS jsonb), updated_at = NOW() WHERE id = :id"),
+                {"id": draft_id, "warnings_json": json.dumps(
+                    {**w, "meta": {**meta, "llm_upgrade_pending": False, "llm_upgrade": "skipped_matched", "hedge": hedge}},
+                    default=str,
+                )},
+            )
+            incr("pdf_hedge.upgrade_skipped")
+            return False
+
+        if result is None:
+            # el LLM falló o vino vacío: se quedan los items locales
+            payload = {**w, "meta": {**meta, "llm_upgrade_pending": False, "llm_upgrade": "failed",
+                                     "llm_upgrade_error": error, "hedge": hedge}}
+            applied = False
+        else:
+            _replace_items(conn, draft_id, result)
+            payload = {
+                "global_warnings": (result.global_warnings or []) + ["LLM_UPGRADE_APPLIED"],
+                "meta": {**(result.meta or {}), "llm_upgrade_pending": False, "llm_upgrade": "applied",
+                         "hedge": {**hedge, "winner": "llm_upgrade"}},
+            }
+            applied = True
+
+        conn.execute(
+            text("UPDATE drafts SET warnings_json = CAST(:warnings_json AS jsonb), updated_at = NOW() WHERE id = :id"),
+            {"id": draft_id, "warnings_json": json.dumps(payload, default=str)},
+        )
+
+    incr("pdf_hedge.upgrade_applied" if applied else "pdf_hedge.upgrade_failed")
+    return applied
+
+
+_UPGRADE_TASKS: set = set()
+
+
+def _schedule_llm_upgrade(eng, draft_id: str, pending: Optional[PendingUpgrade]) -> None:
+    """Cuando termine el LLM en background, aplica su resultado al draft (en un thread, nunca en el loop)."""
+    if pending is None:
+        return
+
+    def _apply(handle) -> None:
+        try:
+            raw = handle.result()
+            result, error = pending.finalize(raw), None
+            if result is None:
+                error = "EMPTY_RESULT"
+        except BaseException as e:  # CancelledError incluido
+            result, error = None, e.__class__.__name__
+        try:
+            apply_llm_upgrade(eng, draft_id, result, error)
+        except Exception:
+            logger.exception("LLM_UPGRADE_FAILED draft_id=%s", draft_id)
+
+    handle = pending.handle
+    if isinstance(handle, asyncio.Future):
+        # referencia fuerte: el loop solo guarda weakrefs de las tasks
+        _UPGRADE_TASKS.add(handle)
+
+        def _done(task) -> None:
+            _UPGRADE_TASKS.discard(task)
+            task.get_loop().run_in_executor(None, _apply, task)
+
+        handle.add_done_callback(_done)
+    else:
+        handle.add_done_callback(_apply)
+
+
+async def stream_parse_events(eng, draft_id: str) -> AsyncIterator[str]:
+    """
+    Eventos: upload_stored, source_detected, pdf_classified, pdf_text_extracted, local_parse_done, llm_call_started,
+    llm_chunk_done (con los items de ese chunk), enrichment_applied, cache_hit, items_persisted,
+    y al final `done` (misma respuesta que POST /parse) o `error`.
+
+    Cada evento queda también en parse_events (con su `id:` en el SSE): si el cliente se corta,
+    GET /parse/stream con Last-Event-ID sigue la misma corrida sin disparar otro parse.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    keepalive_s = float(os.getenv("PARSE_STREAM_KEEPALIVE_S", "15"))
+    run_id = f"stream_{uuid.uuid4().hex}"
+    started = False
+
+    def progress(stage: str, data: Dict[str, Any]) -> None:
+        # llega desde el thread del parse (y de los threads de chunks)
+        nonlocal started
+        event_id = None
+        if stage == "upload_stored":
+            # el draft ya pasó load_draft_for_parse: recién ahí esta corrida reemplaza a la anterior
+            started = True
+            event_id = parse_events.start_run(eng, draft_id, run_id, stage, data)
+        elif started:
+            event_id = parse_events.record(eng, draft_id, run_id, stage, data)
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, (stage, data, event_id))
+        except RuntimeError:
+            pass  # loop cerrado: el cliente ya se fue, el parse sigue igual
+
+    async def _run() -> None:
+        # done / error también van a la DB: en un thread, no en el loop
+        try:
+            out = await asyncio.to_thread(parse_draft, eng, draft_id, progress)
+            await asyncio.to_thread(progress, "done", out)
+        except HTTPException as e:
+            await asyncio.to_thread(progress, "error", {"status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.exception("PARSE_STREAM_FAILED draft_id=%s", draft_id)
+            await asyncio.to_thread(progress, "error", {"status_code": 500, "detail": {"code": f"PARSE_ERROR_{e.__class__.__name__}", "message": str(e)[:300]}})
+
+    # si el cliente se desconecta el parse sigue (y persiste) en su thread
+    task = asyncio.create_task(_run())
+    while True:
+        try:
+            stage, data, event_id = await asyncio.wait_for(queue.get(), timeout=keepalive_s)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+            continue
+        yield parse_events.sse(stage, data, event_id)
+        if stage in parse_events.TERMINAL:
+            break
+    await task
@@ -0,0 +1,212 @@
+# app/services/extraction_cache.py
+"""
+Cache de ExtractionResult direccionado por contenido (tabla `extraction_cache`).
+
+key = sha256(bytes del archivo) + source_type + huella de la config del extractor
+(modelo, flags de OpenAI/enrichment, max_items, páginas PDF, ...). Si cambia cualquiera
+de esas cosas la key cambia y se vuelve a extraer; no hace falta invalidar a mano.
+
+No se cachean resultados con fallas transitorias de OpenAI (se reintentan en el próximo parse).
+Cualquier error del cache se loguea y se ignora: el parse nunca falla por el cache.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.observability import incr
+from app.schemas.extraction import ExtractionResult
+from app.services.document_extractor import DocumentExtractor
+from app.services.image_preprocess import preprocess_config
+from app.services.line_triage import triage_enabled
+from app.services.local_fallback_parser import fallback_enabled
+from app.services.pdf_tables import pdf_tables_enabled
+from app.services.pdf_utils import pdf_routing_enabled
+
+logger = logging.getLogger(__name__)
+
+# Subir cuando cambie la lógica de extracción (parser local, prompts) para invalidar todo
+EXTRACTION_CACHE_VERSION = "1"
+
+# Warnings de fallas transitorias: ese resultado no se guarda
+# LLM_UPGRADE_PENDING: resultado local provisorio (deadline de PDF), el del LLM llega después
+_TRANSIENT_WARNINGS = {"OPENAI_FAILED", "OPENAI_ENRICHMENT_FAILED", "OPENAI_EMPTY_RESULT", "LLM_UPGRADE_PENDING"}
+
+
+def cache_enabled() -> bool:
+    return os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def _ttl_days() -> int:
+    return int(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30"))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def extractor_fingerprint(extractor: DocumentExtractor) -> Dict[str, Any]:
+    return {
+        "v": EXTRACTION_CACHE_VERSION,
+        "model": extractor.model,
+        "openai_enabled": extractor._openai_enabled(),
+        "enrich_enabled": extractor._enrich_enabled(),
+        "fallback_enabled": fallback_enabled(),
+        "triage_enabled": triage_enabled(),
+        "max_items": extractor.max_items,
+        "max_file_mb": extractor.max_file_mb,
+        "pdf_max_pages": extractor.pdf_max_pages,
+        "local_first_min_items": int(os.getenv("LOCAL_FIRST_MIN_ITEMS", "1")),
+        "image_preprocess": preprocess_config(),
+        "pdf_routing": pdf_routing_enabled(),
+        "pdf_tables": pdf_tables_enabled(),
+    }
+
+
+def cache_key(sha256: str, source_type: str, fingerprint: Dict[str, Any]) -> str:
+    cfg = json.dumps(fingerprint, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{sha256}|{source_type}|{cfg}".encode("utf-8")).hexdigest()
+
+
+def _cacheable(res: ExtractionResult) -> bool:
+    return not (_TRANSIENT_WARNINGS & set(res.global_warnings or []))
+
+
+def _lookup(conn, key: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute(
+        text("""
+            UPDATE extraction_cache
+            SET hits = hits + 1, last_hit_at = now()
+            WHERE cache_key = :key
+              AND created_at > now() - make_interval(days => :ttl_days)
+            RETURNING result_json, created_at, hits
+        """),
+        {"key": key, "ttl_days": _ttl_days()},
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def _store(conn, key: str, sha256: str, source_type: str, fingerprint: Dict[str, Any], res: ExtractionResult) -> None:
+    conn.execute(
+        text("""
+            INSERT INTO extraction_cache (cache_key, sha256, source_type, config_json, result_json)
+            VALUES (:key, :sha256, :source_type, CAST(:config_json AS jsonb), CAST(:result_json AS jsonb))
+            ON CONFLICT (cache_key) DO UPDATE
+              SET result_json = EXCLUDED.result_json,
+                  config_json = EXCLUDED.config_json,
+                  created_at = now(),
+                  hits = 0
+        """),
+        {
+            "key": key,
+            "sha256": sha256,
+            "source_type": source_type,
+            "config_json": json.dumps(fingerprint),
+            "result_json": res.model_dump_json(),
+        },
+    )
+
+
+def _begin(eng, extractor: DocumentExtractor, source_path: str, filename: str | None, content_type: str | None) -> Dict[str, Any]:
+    """Lookup. Devuelve el contexto para _finish(); ctx["result"] trae el hit (o None)."""
+    source_type = extractor.detect(source_path, filename, content_type)
+    ctx: Dict[str, Any] = {
+        "source_type": source_type,
+        "fingerprint": extractor_fingerprint(extractor),
+        "key": None,
+        "result": None,
+        "info": {"enabled": True, "hit": False},
+    }
+    info = ctx["info"]
+    try:
+        sha = file_sha256(source_path)
+        ctx["key"] = cache_key(sha, source_type, ctx["fingerprint"])
+        info.update({"key": ctx["key"], "sha256": sha})
+        with eng.begin() as conn:
+            row = _lookup(conn, ctx["key"])
+        if row:
+            res = ExtractionResult.model_validate(row["result_json"])
+            created = row["created_at"]
+            info.update({
+                "hit": True,
+                "cached_at": created.isoformat() if hasattr(created, "isoformat") else created,
+                "hits": row["hits"],
+            })
+            incr(f"extraction_cache.hit.{source_type}")
+            extractor._emit("cache_hit", items=[it.model_dump(mode="json") for it in res.items])
+            res.meta = {**(res.meta or {}), "cache": info}
+            ctx["result"] = res
+            return ctx
+    except Exception as e:
+        logger.warning("EXTRACTION_CACHE_LOOKUP_FAILED err=%s", e)
+        info["error"] = e.__class__.__name__
+
+    incr(f"extraction_cache.miss.{source_type}")
+    return ctx
+
+
+def _finish(eng, ctx: Dict[str, Any], res: ExtractionResult) -> ExtractionResult:
+    """Guarda el resultado recién extraído (si corresponde) y le pega meta.cache."""
+    info = ctx["info"]
+    if ctx["key"] and _cacheable(res):
+        try:
+            with eng.begin() as conn:
+                _store(conn, ctx["key"], info["sha256"], ctx["source_type"], ctx["fingerprint"], res)
+            info["stored"] = True
+        except Exception as e:
+            logger.warning("EXTRACTION_CACHE_STORE_FAILED err=%s", e)
+            info["error"] = e.__class__.__name__
+    else:
+        info["stored"] = False
+
+    res.meta = {**(res.meta or {}), "cache": info}
+    return res
+
+
+def extract_cached(
+    eng,
+    extractor: DocumentExtractor,
+    source_path: str,
+    filename: str | None,
+    content_type: str | None,
+) -> Tuple[ExtractionResult, Dict[str, Any]]:
+    """
+    Igual que extractor.extract(), pero pasando por el cache.
+    Devuelve (resultado, info_cache); info_cache también queda en result.meta["cache"].
+    """
+    if not cache_enabled():
+        return extractor.extract(source_path, filename, content_type), {"enabled": False}
+
+    ctx = _begin(eng, extractor, source_path, filename, content_type)
+    if ctx["result"] is not None:
+        return ctx["result"], ctx["info"]
+    res = extractor.extract(source_path, filename, content_type)
+    return _finish(eng, ctx, res), ctx["info"]
+
+
+async def extract_cached_async(
+    eng,
+    extractor: DocumentExtractor,
+    source_path: str,
+    filename: str | None,
+    content_type: str | None,
+) -> Tuple[ExtractionResult, Dict[str, Any]]:
+    """extract_cached() con extractor.extract_async(); hash y DB corren en un thread."""
+    if not cache_enabled():
+        return await extractor.extract_async(source_path, filename, content_type), {"enabled": False}
+
+    ctx = await asyncio.to_thread(_begin, eng, extractor, source_path, filename, content_type)
+    if ctx["result"] is not None:
+        return ctx["result"], ctx["info"]
+    res = await extractor.extract_async(source_path, filename, content_type)
+    return await asyncio.to_thread(_finish, eng, ctx, res), ctx["info"]
@@ -0,0 +1,178 @@
+# app/services/image_preprocess.py
+"""
+Preproceso de imágenes antes de la llamada de visión (extract_from_image).
+
+Una foto de celular de 12MP llega como data URL de varios MB: lenta de subir y el modelo igual
+la reescala (detail=high: cabe en 2048x2048 y el lado corto baja a 768). Aquí:
+
+1. orienta según EXIF (las fotos de celular vienen giradas),
+2. recorta al área con contenido (márgenes de mesa/papel vacío),
+3. reescala a la resolución que usa el modelo (IMAGE_MAX_LONG_SIDE / IMAGE_MAX_SHORT_SIDE),
+4. pasa a escala de grises (IMAGE_GRAYSCALE) y recomprime a JPEG o WebP (IMAGE_FORMAT, IMAGE_QUALITY).
+
+Si el resultado no es más chico se manda el original. Resultado cacheado en memoria por
+sha256 + config (reintentos y re-parse del mismo archivo no repiten el trabajo).
+Pillow es opcional: sin Pillow (o con IMAGE_PREPROCESS_ENABLED=false) la imagen pasa tal cual.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from app.observability import incr, observe_ms
+
+logger = logging.getLogger(__name__)
+
+_CACHE: "OrderedDict[str, Tuple[bytes, str, Dict[str, Any]]]" = OrderedDict()
+_CACHE_BYTES = 0
+_CACHE_LOCK = threading.Lock()
+
+_MIMES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+def preprocess_enabled() -> bool:
+    return os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def preprocess_config() -> Dict[str, Any]:
+    """Config que cambia la salida (va en la clave del cache y en el fingerprint de extraction_cache)."""
+    fmt = os.getenv("IMAGE_FORMAT", "jpeg").lower()
+    return {
+        "enabled": preprocess_enabled(),
+        "max_long": int(os.getenv("IMAGE_MAX_LONG_SIDE", "2048")),
+        "max_short": int(os.getenv("IMAGE_MAX_SHORT_SIDE", "768")),
+        "grayscale": os.getenv("IMAGE_GRAYSCALE", "true").lower() in ("1", "true", "yes", "y", "on"),
+        "format": fmt if fmt in _MIMES else "jpeg",
+        "quality": int(os.getenv("IMAGE_QUALITY", "80")),
+        "crop": os.getenv("IMAGE_CROP_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on"),
+    }
+
+
+def _content_bbox(gray, threshold: int = 40, margin: float = 0.02):
+    """Caja con contenido: píxeles que difieren del fondo (mediana de las esquinas) + margen."""
+    from PIL import Image, ImageChops
+
+    w, h = gray.size
+    corners = sorted(gray.getpixel(p) for p in ((0, 0), (w - 1, 0), (0, h - 1), (w - 1, h - 1)))
+    bg = (corners[1] + corners[2]) // 2
+    diff = ImageChops.difference(gray, Image.new("L", gray.size, bg)).point(lambda v: 255 if v > threshold else 0)
+    bbox = diff.getbbox()
+    if not bbox:
+        return None
+    mx, my = int(w * margin), int(h * margin)
+    left, top, right, bottom = bbox
+    return max(left - mx, 0), max(top - my, 0), min(right + mx, w), min(bottom + my, h)
+
+
+def _process(img_bytes: bytes, cfg: Dict[str, Any]) -> Tuple[bytes, str, Dict[str, Any]]:
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(img_bytes))
+    size_in = img.size
+    oriented = img.getexif().get(0x0112, 1) not in (0, 1)  # tag Orientation
+    img = ImageOps.exif_transpose(img)
+
+    # transparencias sobre blanco (convertir RGBA directo a L deja el fondo negro)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        bg = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(bg, img)
+    img = img.convert("L" if cfg["grayscale"] else "RGB")
+
+    cropped = False
+    if cfg["crop"]:
+        box = _content_bbox(img if img.mode == "L" else img.convert("L"))
+        w, h = img.size
+        # solo si saca algo que valga la pena (>5% del área)
+        if box and (box[2] - box[0]) * (box[3] - box[1]) < 0.95 * w * h:
+            img = img.crop(box)
+            cropped = True
+
+    w, h = img.size
+    scale = min(1.0, cfg["max_long"] / max(w, h), cfg["max_short"] / min(w, h))
+    if scale < 1.0:
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+
+    out = io.BytesIO()
+    if cfg["format"] == "webp":
+        img.save(out, format="WEBP", quality=cfg["quality"], method=4)
+    else:
+        img.save(out, format="JPEG", quality=cfg["quality"], optimize=True, progressive=True)
+
+    return out.getvalue(), _MIMES[cfg["format"]], {
+        "size_in": list(size_in),
+        "size_out": list(img.size),
+        "oriented": oriented,
+        "cropped": cropped,
+        "grayscale": cfg["grayscale"],
+        "format": cfg["format"],
+        "quality": cfg["quality"],
+    }
+
+
+def _cache_put(key: str, value: Tuple[bytes, str, Dict[str, Any]]) -> None:
+    global _CACHE_BYTES
+    max_bytes = int(float(os.getenv("IMAGE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+    with _CACHE_LOCK:
+        if key in _CACHE:
+            return
+        _CACHE[key] = value
+        _CACHE_BYTES += len(value[0])
+        while _CACHE_BYTES > max_bytes and _CACHE:
+            _, (old, _, _) = _CACHE.popitem(last=False)
+            _CACHE_BYTES -= len(old)
+
+
+def preprocess_image(img_bytes: bytes, mime: str) -> Tuple[bytes, str, Dict[str, Any]]:
+    """
+    Devuelve (bytes, mime, meta) listos para el data URL. meta trae bytes_in/bytes_out/bytes_saved;
+    ante cualquier error (formato raro, Pillow ausente) devuelve la imagen original.
+    """
+    meta: Dict[str, Any] = {"bytes_in": len(img_bytes), "bytes_out": len(img_bytes), "bytes_saved": 0}
+    cfg = preprocess_config()
+    if not cfg["enabled"] or not img_bytes:
+        return img_bytes, mime, {**meta, "applied": False, "reason": "disabled"}
+
+    key = hashlib.sha256(
+        img_bytes + json.dumps(cfg, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    with _CACHE_LOCK:
+        hit = _CACHE.get(key)
+        if hit:
+            _CACHE.move_to_end(key)
+    if hit:
+        incr("image_preprocess.cache_hit")
+        out, out_mime, info = hit
+        return out, out_mime, {**info, "cache_hit": True}
+
+    t0 = time.monotonic()
+    try:
+        out, out_mime, info = _process(img_bytes, cfg)
+    except ImportError:
+        return img_bytes, mime, {**meta, "applied": False, "reason": "pillow_missing"}
+    except Exception as e:
+        logger.warning("IMAGE_PREPROCESS_FAILED err=%s", e)
+        incr("image_preprocess.failed")
+        return img_bytes, mime, {**meta, "applied": False, "reason": f"error_{e.__class__.__name__}"}
+    ms = (time.monotonic() - t0) * 1000
+    observe_ms("image_preprocess", ms)
+
+    if len(out) >= len(img_bytes) and not (info["oriented"] or info["cropped"] or info["size_out"] != info["size_in"]):
+        # no ganó nada: el original es igual de bueno para el modelo
+        result = (img_bytes, mime, {**meta, **info, "applied": False, "reason": "not_smaller", "ms": round(ms, 1)})
+    else:
+        saved = len(img_bytes) - len(out)
+        result = (out, out_mime, {**meta, **info, "applied": True, "bytes_out": len(out),
+                                  "bytes_saved": saved, "ms": round(ms, 1)})
+        incr("image_preprocess.bytes_saved", max(saved, 0))
+
+    incr("image_preprocess.processed")
+    _cache_put(key, result)
+    return result[0], result[1], {**result[2], "cache_hit": False}
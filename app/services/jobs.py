@@ -0,0 +1,338 @@
+# app/services/jobs.py
+"""
+Jobs asíncronos (tabla `jobs`).
+
+- submit_job(): registra el job (QUEUED) y lo corre en un worker pool del proceso.
+- El resultado (o el error) queda en la tabla: el cliente hace polling con GET /v1/jobs/{id}
+  (acotado al draft/org del job, ver job_visible) o registra un callback_url que recibe un POST
+  cuando el job termina. Los callback_url pasan por validate_callback_url (allowlist + sin IPs
+  privadas), al registrarse y otra vez antes de cada entrega.
+- Los jobs del pool in-process se pierden si el proceso se reinicia: reconcile_lost_jobs() (startup)
+  los marca FAILED con JOB_LOST_ON_RESTART y avisa por callback.
+"""
+from __future__ import annotations
+
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import text
+from ulid import ULID
+
+from app.db_engine import get_engine
+from app.observability import incr
+
+logger = logging.getLogger(__name__)
+
+_EXECUTOR: ThreadPoolExecutor | None = None
+_EXECUTOR_LOCK = threading.Lock()
+
+# dueño de los jobs in-process (locked_by): host:pid:arranque; el sufijo distingue un pid reciclado
+_INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{ULID()}"
+
+_JOB_LOST_ERROR = {"status_code": 500, "detail": {"code": "JOB_LOST_ON_RESTART"}}
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            workers = max(1, int(os.getenv("JOB_WORKERS", "4")))
+            _EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        return _EXECUTOR
+
+
+def _callback_allowed_hosts() -> List[str]:
+    return [h.strip().lower() for h in os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+
+
+def _host_allowed(host: str, allowed: List[str]) -> bool:
+    # "hooks.cliente.com" exacto o "*.cliente.com" para subdominios
+    return any(host == a or (a.startswith("*.") and host.endswith(a[1:])) for a in allowed)
+
+
+def _public_ip(ip: str) -> bool:
+    addr = ipaddress.ip_address(ip.split("%", 1)[0])
+    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return addr.is_global and not addr.is_multicast
+
+
+def validate_callback_url(callback_url: Optional[str]) -> Optional[str]:
+    """
+    Normaliza y valida un callback_url: http(s), host en JOB_CALLBACK_ALLOWED_HOSTS (vacía =
+    callbacks deshabilitados) y que todas las IPs a las que resuelve sean públicas (nada de
+    loopback, red privada, link-local/metadata). HTTPException 400 si no pasa.
+    """
+    callback_url = (callback_url or "").strip() or None
+    if callback_url is None:
+        return None
+    parts = urlsplit(callback_url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme.lower() not in ("http", "https") or not host:
+        raise HTTPException(status_code=400, detail={"code": "INVALID_CALLBACK_URL"})
+    if parts.username or parts.password or not _host_allowed(host, _callback_allowed_hosts()):
+        raise HTTPException(status_code=400, detail={"code": "CALLBACK_URL_NOT_ALLOWED"})
+    try:
+        infos = socket.getaddrinfo(host, parts.port or (443 if parts.scheme.lower() == "https" else 80))
+        ips = {info[4][0] for info in infos}
+    except (socket.gaierror, UnicodeError):
+        raise HTTPException(status_code=400, detail={"code": "CALLBACK_URL_UNRESOLVABLE"})
+    if not ips or not all(_public_ip(ip) for ip in ips):
+        raise HTTPException(status_code=400, detail={"code": "CALLBACK_URL_NOT_ALLOWED"})
+    return callback_url
+
+
+def new_job_id() -> str:
+    return f"job_{ULID()}"
+
+
+def _job_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    out = {
+        "job_id": row["id"],
+        "kind": row["kind"],
+        "draft_id": row.get("draft_id"),
+        "status": row["status"],
+        "callback_url": row.get("callback_url"),
+        "callback_status": row.get("callback_status"),
+        "created_at": row.get("created_at"),
+        "started_at": row.get("started_at"),
+        "finished_at": row.get("finished_at"),
+    }
+    # cola durable (parse): reintentos / dead-letter
+    if row.get("attempts"):
+        out.update({
+            "attempts": row["attempts"],
+            "max_attempts": row.get("max_attempts"),
+            "run_after": row.get("run_after"),
+            "last_error": row.get("last_error"),
+        })
+    for k in ("created_at", "started_at", "finished_at", "run_after"):
+        if k not in out:
+            continue
+        if out[k] is not None and hasattr(out[k], "isoformat"):
+            out[k] = out[k].isoformat()
+    if row.get("result_json") is not None:
+        out["result"] = row["result_json"]
+    if row.get("error_json") is not None:
+        out["error"] = row["error_json"]
+    return out
+
+
+def _get_row(job_id: str) -> Optional[Dict[str, Any]]:
+    with get_engine().connect() as conn:
+        row = conn.execute(
+            text("SELECT * FROM jobs WHERE id = :id"),
+            {"id": job_id},
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    row = _get_row(job_id)
+    return _job_view(row) if row else None
+
+
+def job_visible(row: Dict[str, Any], draft_id: Optional[str], org_id: Optional[str]) -> bool:
+    """
+    El job solo se muestra a quien conoce su draft (y su org, si el job se pidió para una org):
+    el job_id solo no alcanza para leer resultados de otro cliente.
+    """
+    if row.get("draft_id") and (draft_id or "").strip() != row["draft_id"]:
+        return False
+    req = row.get("request_json") or {}
+    job_org = req.get("org_id") if isinstance(req, dict) else None
+    if job_org and (org_id or "").strip() != job_org:
+        return False
+    return True
+
+
+def get_job_scoped(job_id: str, draft_id: Optional[str], org_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    row = _get_row(job_id)
+    if not row or not job_visible(row, draft_id, org_id):
+        return None
+    return _job_view(row)
+
+
+def poll_url(job_id: str, draft_id: Optional[str]) -> str:
+    return f"/v1/jobs/{job_id}?draft_id={draft_id}" if draft_id else f"/v1/jobs/{job_id}"
+
+
+def submit_job(
+    *,
+    kind: str,
+    draft_id: Optional[str],
+    request_payload: Dict[str, Any],
+    runner: Callable[[], Dict[str, Any]],
+    callback_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    job_id = new_job_id()
+    with get_engine().begin() as conn:
+        conn.execute(
+            text("""
+                INSERT INTO jobs (id, kind, draft_id, status, request_json, callback_url, locked_by, locked_at)
+                VALUES (:id, :kind, :draft_id, 'QUEUED', CAST(:request_json AS jsonb), :callback_url, :owner, now())
+            """),
+            {
+                "id": job_id,
+                "kind": kind,
+                "draft_id": draft_id,
+                "request_json": json.dumps(request_payload, default=str),
+                "callback_url": callback_url,
+                "owner": _INSTANCE_ID,
+            },
+        )
+
+    incr(f"jobs.{kind}.submitted")
+    _executor().submit(_run_job, job_id, kind, runner, callback_url)
+    return {
+        "job_id": job_id,
+        "kind": kind,
+        "draft_id": draft_id,
+        "status": "QUEUED",
+        "poll_url": poll_url(job_id, draft_id),
+    }
+
+
+def _run_job(job_id: str, kind: str, runner: Callable[[], Dict[str, Any]], callback_url: Optional[str]) -> None:
+    eng = get_engine()
+    with eng.begin() as conn:
+        conn.execute(
+            text("UPDATE jobs SET status='RUNNING', started_at=now(), updated_at=now() WHERE id=:id"),
+            {"id": job_id},
+        )
+
+    status = "SUCCEEDED"
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[Dict[str, Any]] = None
+    try:
+        result = runner()
+    except HTTPException as e:
+        status = "FAILED"
+        error = {"status_code": e.status_code, "detail": e.detail}
+    except Exception as e:
+        logger.exception("JOB_FAILED job_id=%s kind=%s", job_id, kind)
+        status = "FAILED"
+        error = {"status_code": 500, "detail": {"code": f"JOB_ERROR_{e.__class__.__name__}", "message": str(e)[:300]}}
+
+    with eng.begin() as conn:
+        conn.execute(
+            text("""
+                UPDATE jobs
+                SET status=:status,
+                    result_json=CAST(:result_json AS jsonb),
+                    error_json=CAST(:error_json AS jsonb),
+                    finished_at=now(),
+                    updated_at=now()
+                WHERE id=:id
+            """),
+            {
+                "id": job_id,
+                "status": status,
+                "result_json": json.dumps(result, default=str) if result is not None else None,
+                "error_json": json.dumps(error, default=str) if error is not None else None,
+            },
+        )
+    incr(f"jobs.{kind}.{status.lower()}")
+
+    if callback_url:
+        _deliver_callback(job_id, callback_url)
+
+
+def _deliver_callback(job_id: str, callback_url: str) -> None:
+    job = get_job(job_id) or {"job_id": job_id}
+    timeout_s = float(os.getenv("JOB_CALLBACK_TIMEOUT_S", "10"))
+    try:
+        # se revalida al entregar: la allowlist pudo cambiar y el DNS pudo pasar a una IP interna
+        validate_callback_url(callback_url)
+        r = httpx.post(callback_url, json=job, timeout=timeout_s, follow_redirects=False)
+        cb_status = f"HTTP_{r.status_code}"
+    except HTTPException as e:
+        logger.warning("JOB_CALLBACK_REFUSED job_id=%s code=%s", job_id, (e.detail or {}).get("code"))
+        cb_status = f"REFUSED_{(e.detail or {}).get('code')}"
+    except httpx.HTTPError as e:
+        logger.warning("JOB_CALLBACK_FAILED job_id=%s err=%s", job_id, e)
+        cb_status = f"ERROR_{e.__class__.__name__}"
+
+    with get_engine().begin() as conn:
+        conn.execute(
+            text("UPDATE jobs SET callback_status=:cb, updated_at=now() WHERE id=:id"),
+            {"id": job_id, "cb": cb_status},
+        )
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def owner_is_dead(locked_by: Optional[str]) -> bool:
+    """
+    True si el proceso dueño de un job in-process ya no existe: mismo host y (pid muerto, o
+    nuestro pid pero de otro arranque). Dueños de otros hosts solo caen por antigüedad.
+    """
+    if not locked_by:
+        return True  # jobs de antes de registrar dueño
+    host, _, rest = locked_by.partition(":")
+    pid_s, _, boot = rest.partition(":")
+    if host != socket.gethostname() or not pid_s.isdigit():
+        return False
+    if int(pid_s) == os.getpid():
+        return locked_by != _INSTANCE_ID
+    return not _pid_alive(int(pid_s))
+
+
+def reconcile_lost_jobs() -> int:
+    """
+    Startup: jobs in-process (todo kind salvo la cola durable de parse) QUEUED/RUNNING cuyo proceso
+    murió, o que llevan más de JOB_STALE_S sin moverse, no van a terminar nunca (el runner era un
+    closure en memoria): FAILED con JOB_LOST_ON_RESTART y callback, para que el cliente no espere.
+    """
+    stale_s = int(os.getenv("JOB_STALE_S", "900"))
+    with get_engine().connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT id, locked_by, callback_url,
+                       updated_at < now() - make_interval(secs => :stale_s) AS stale
+                FROM jobs
+                WHERE kind <> 'parse' AND status IN ('QUEUED', 'RUNNING')
+            """),
+            {"stale_s": stale_s},
+        ).mappings().all()
+    lost = [r for r in rows if r["stale"] or owner_is_dead(r["locked_by"])]
+    if not lost:
+        return 0
+
+    with get_engine().begin() as conn:
+        conn.execute(
+            text("""
+                UPDATE jobs
+                SET status = 'FAILED',
+                    error_json = CAST(:error_json AS jsonb),
+                    finished_at = now(),
+                    locked_by = NULL,
+                    locked_at = NULL,
+                    updated_at = now()
+                WHERE id = ANY(:ids) AND status IN ('QUEUED', 'RUNNING')
+            """),
+            {"ids": [r["id"] for r in lost], "error_json": json.dumps(_JOB_LOST_ERROR)},
+        )
+    incr("jobs.lost_on_restart", len(lost))
+    logger.warning("JOBS_LOST_ON_RESTART n=%s", len(lost))
+    for r in lost:
+        if r["callback_url"]:
+            _deliver_callback(r["id"], r["callback_url"])
+    return len(lost)
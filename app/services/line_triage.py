@@ -0,0 +1,120 @@
+# app/services/line_triage.py
+"""
+Triage local de líneas ANTES del LLM: cada línea queda como item, section, totals o noise.
+
+Al modelo van items y section (los encabezados le dan contexto: "ILUMINACIÓN:", "TUBERÍA"), más
+la línea de ruido inmediatamente antes/después de cada item como contexto mínimo. Totales/IVA/
+retenciones y el resto del ruido (saludos, firmas, contacto, paginación) no se mandan: el prompt
+igual los descartaría, pero se pagan sus tokens.
+
+Conservador a propósito: una línea dudosa es item (el LLM decide). Una línea solo es ruido o
+totales si el parser local NO le encuentra cantidad + unidad explícitas ("Fecha entrega: tubo PVC
+2 und" es item), y un número suelto ("100", "12.5") es item: puede ser la cantidad de la línea de
+al lado.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.local_fallback_parser import _TOTALS_RE, _extract_qty_uom_desc
+from app.services.token_budget import estimate_tokens
+
+ITEM = "item"
+SECTION = "section"
+TOTALS = "totals"
+NOISE = "noise"
+
+_SENT_LABELS = (ITEM, SECTION)
+
+_NOISE_RE = re.compile(
+    r"^(?:atentamente|cordialmente|saludos|gracias|muchas gracias|buen(?:os|as) (?:d[ií]as|tardes|noches)"
+    r"|estimad[oa]s?|se[ñn]or(?:es|a)?|p[aá]gina|p[aá]g|tel[eé]fono|tel|cel(?:ular)?|e-?mail|correo"
+    r"|direcci[oó]n|nit|fecha|solicitud de cotizaci[oó]n|favor cotizar|por favor cotizar"
+    r"|quedo atent[oa]|enviado desde)\b",
+    flags=re.IGNORECASE,
+)
+_CONTACT_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+|https?://|www\.", flags=re.IGNORECASE)
+_LETTER_RE = re.compile(r"[A-Za-zÁÉÍÓÚÜÑáéíóúüñ]")
+_DIGIT_RE = re.compile(r"\d")
+_BARE_QTY_RE = re.compile(r"^\d{1,6}(?:[.,]\d+)?$")
+
+
+def triage_enabled() -> bool:
+    return os.getenv("OPENAI_TRIAGE_ENABLED", "true").lower() in ("1", "true", "yes", "y")
+
+
+def _is_section(line: str) -> bool:
+    # encabezado corto sin números: "MATERIALES ELÉCTRICOS", "Iluminación:"
+    if _DIGIT_RE.search(line) or len(line) > 60 or len(line.split()) > 6:
+        return False
+    if line.endswith(":"):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 4 and all(c.isupper() for c in letters)
+
+
+def _has_qty_and_unit(line: str) -> Tuple[bool, float]:
+    _, _, _, warnings, conf, uom_raw = _extract_qty_uom_desc(line)
+    explicit = uom_raw is not None and "QTY_INFERRED" not in warnings and "UOM_INFERRED" not in warnings
+    return explicit, conf
+
+
+def triage_line(line: str) -> str:
+    ln = (line or "").strip()
+    if not _LETTER_RE.search(ln):
+        # solo números/puntuación: separadores, paginación... salvo una cantidad suelta
+        return ITEM if _BARE_QTY_RE.match(ln) else NOISE
+
+    explicit, conf = _has_qty_and_unit(ln)
+    if explicit:
+        return ITEM
+    if _CONTACT_RE.search(ln) or _NOISE_RE.match(ln):
+        return NOISE
+    if _TOTALS_RE.search(ln):
+        # "Subtotal 584,200.00", "IVA 19%": sin unidad física => es dinero
+        return TOTALS
+    if conf < 0.5 and _is_section(ln):
+        return SECTION
+    return ITEM
+
+
+def triage_lines(lines: List[str]) -> List[str]:
+    return [triage_line(ln) for ln in lines]
+
+
+def select_for_llm(lines: List[str]) -> Tuple[List[str], Optional[List[int]], Dict[str, Any]]:
+    """
+    Devuelve (líneas a mandar, índice original de cada una, meta del triage).
+    Si no queda nada para mandar, manda todo (mejor pagar tokens que perder el RFQ).
+    """
+    labels = triage_lines(lines)
+    sent = {i for i, lab in enumerate(labels) if lab in _SENT_LABELS}
+    # contexto mínimo: el ruido pegado a un item (±1) va igual; los totales nunca
+    context = {
+        j for i, lab in enumerate(labels) if lab == ITEM
+        for j in (i - 1, i + 1) if 0 <= j < len(lines) and labels[j] == NOISE
+    }
+    kept = sorted(sent | context)
+    if not kept:
+        kept = list(range(len(lines)))
+
+    counts: Dict[str, int] = {}
+    for lab in labels:
+        counts[lab] = counts.get(lab, 0) + 1
+
+    chars_in = sum(len(ln) + 1 for ln in lines)
+    chars_sent = sum(len(lines[i]) + 1 for i in kept)
+    tokens_in = sum(estimate_tokens(ln) + 1 for ln in lines)
+    tokens_sent = sum(estimate_tokens(lines[i]) + 1 for i in kept)
+    meta = {
+        "lines_in": len(lines),
+        "lines_sent": len(kept),
+        "context_lines": len(context),
+        "labels": counts,
+        "chars_saved": chars_in - chars_sent,
+        "est_tokens_in": tokens_in,
+        "est_tokens_saved": tokens_in - tokens_sent,
+    }
+    return [lines[i] for i in kept], (kept if len(kept) < len(lines) else None), meta
@@ -0,0 +1,232 @@
+# app/services/llm_cache.py
+"""
+Cache de respuestas del LLM a nivel de prompt (responses.create de _call_openai, chunks de texto
+y enrich_items).
+
+Clave = sha256 del request completo que afecta la salida: modelo, system prompt, contenido del
+usuario, schema (text.format), temperature y max_output_tokens. Solo se cachea con temperature=0
+(salida determinística) y respuestas completas (status != incomplete) cuyo JSON parsea: una
+salida rota no se repite durante todo el TTL.
+
+Muchos RFQs repiten bloques idénticos (listas de materiales que el contratista copia entre
+licitaciones): con chunks por presupuesto de tokens esos bloques generan el mismo prompt y no
+vuelven a pagar la llamada.
+
+Almacenamiento: SQLite en disco (LLM_CACHE_PATH), compartido por la API y los workers del
+mismo host. Desalojo LRU por tamaño total (LLM_CACHE_MAX_MB) y cantidad (LLM_CACHE_MAX_ENTRIES),
+más TTL (LLM_CACHE_TTL_DAYS). Los totales viven en llm_cache_totals (una fila, mantenida por
+triggers) para no hacer COUNT/SUM en cada put.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.observability import incr, metrics_snapshot
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_VERSION = 1
+
+_LOCK = threading.Lock()
+_CONN: Optional[sqlite3.Connection] = None
+_CONN_KEY: Optional[tuple] = None
+
+
+def cache_enabled() -> bool:
+    return os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def _path() -> str:
+    return os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite3")
+
+
+def _max_bytes() -> int:
+    return int(float(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def _max_entries() -> int:
+    return int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+
+def _ttl_s() -> float:
+    return float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400
+
+
+def _conn() -> sqlite3.Connection:
+    """Una conexión por proceso y path (se reabre tras fork o si cambia LLM_CACHE_PATH)."""
+    global _CONN, _CONN_KEY
+    key = (os.getpid(), _path())
+    if _CONN is None or _CONN_KEY != key:
+        Path(key[1]).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(key[1], timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                output_text TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_lru ON llm_responses (last_used_at)")
+        _ensure_totals(conn)
+        _CONN, _CONN_KEY = conn, key
+    return _CONN
+
+
+def _ensure_totals(conn: sqlite3.Connection) -> None:
+    """Fila única con (entries, bytes); los triggers la mueven en cada insert/update/delete."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                entries INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS llm_responses_totals_ins AFTER INSERT ON llm_responses BEGIN
+                UPDATE llm_cache_totals SET entries = entries + 1, bytes = bytes + NEW.size_bytes WHERE id = 1;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS llm_responses_totals_upd AFTER UPDATE OF size_bytes ON llm_responses BEGIN
+                UPDATE llm_cache_totals SET bytes = bytes + NEW.size_bytes - OLD.size_bytes WHERE id = 1;
+            END
+        """)
+        conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS llm_responses_totals_del AFTER DELETE ON llm_responses BEGIN
+                UPDATE llm_cache_totals SET entries = entries - 1, bytes = bytes - OLD.size_bytes WHERE id = 1;
+            END
+        """)
+        # cache creado antes de los triggers: se siembra una sola vez con lo que ya tenía
+        conn.execute("""
+            INSERT OR IGNORE INTO llm_cache_totals (id, entries, bytes)
+            SELECT 1, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_responses
+        """)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def request_key(kwargs: Dict[str, Any]) -> Optional[str]:
+    """Clave del request de responses.create; None si no se debe cachear (temperature != 0)."""
+    if not cache_enabled() or float(kwargs.get("temperature") or 0) != 0:
+        return None
+    # timeout no cambia la respuesta
+    material = {k: v for k, v in kwargs.items() if k != "timeout"}
+    raw = json.dumps({"v": LLM_CACHE_VERSION, **material}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    now = time.time()
+    try:
+        with _LOCK:
+            conn = _conn()
+            row = conn.execute(
+                "SELECT output_text, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > _ttl_s():
+                conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                conn.execute(
+                    "UPDATE llm_responses SET last_used_at = ?, hits = hits + 1 WHERE key = ?", (now, key)
+                )
+    except sqlite3.Error:
+        logger.warning("LLM_CACHE_LOOKUP_FAILED", exc_info=True)
+        return None
+
+    incr("llm_cache.hit" if row else "llm_cache.miss")
+    return row[0] if row else None
+
+
+def put(key: str, output_text: str) -> None:
+    now = time.time()
+    size = len(output_text.encode("utf-8"))
+    if size > _max_bytes():
+        return
+    try:
+        with _LOCK:
+            conn = _conn()
+            conn.execute(
+                """
+                INSERT INTO llm_responses (key, output_text, size_bytes, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    output_text = excluded.output_text,
+                    size_bytes = excluded.size_bytes,
+                    created_at = excluded.created_at,
+                    last_used_at = excluded.last_used_at
+                """,
+                (key, output_text, size, now, now),
+            )
+            evicted = _evict(conn)
+    except sqlite3.Error:
+        logger.warning("LLM_CACHE_STORE_FAILED", exc_info=True)
+        return
+
+    incr("llm_cache.store")
+    if evicted:
+        incr("llm_cache.evicted", evicted)
+
+
+def _evict(conn: sqlite3.Connection) -> int:
+    """LRU: si se pasa de tamaño o cantidad, borra los menos usados hasta quedar en ~90% del tope."""
+    entries, total = conn.execute("SELECT entries, bytes FROM llm_cache_totals WHERE id = 1").fetchone()
+    max_bytes, max_entries = _max_bytes(), _max_entries()
+    if total <= max_bytes and entries <= max_entries:
+        return 0
+
+    target_bytes, target_entries = int(max_bytes * 0.9), int(max_entries * 0.9)
+    evicted = 0
+    for key, size in conn.execute(
+        "SELECT key, size_bytes FROM llm_responses ORDER BY last_used_at ASC"
+    ).fetchall():
+        if total <= target_bytes and entries <= target_entries:
+            break
+        conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+        total -= size
+        entries -= 1
+        evicted += 1
+    return evicted
+
+
+def stats() -> Dict[str, Any]:
+    """Para GET /v1/metrics: tamaño actual + hit rate del proceso."""
+    counters = metrics_snapshot()["counters"]
+    hits, misses = counters.get("llm_cache.hit", 0), counters.get("llm_cache.miss", 0)
+    out: Dict[str, Any] = {
+        "enabled": cache_enabled(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+        "stores": counters.get("llm_cache.store", 0),
+        "evicted": counters.get("llm_cache.evicted", 0),
+    }
+    if not cache_enabled():
+        return out
+    try:
+        with _LOCK:
+            conn = _conn()
+            entries, total = conn.execute("SELECT entries, bytes FROM llm_cache_totals WHERE id = 1").fetchone()
+            lifetime_hits = conn.execute("SELECT COALESCE(SUM(hits), 0) FROM llm_responses").fetchone()[0]
+        out.update({"entries": entries, "bytes": total, "lifetime_hits": lifetime_hits,
+                    "max_bytes": _max_bytes(), "max_entries": _max_entries()})
+    except sqlite3.Error:
+        logger.warning("LLM_CACHE_STATS_FAILED", exc_info=True)
+    return out
@@ -1,7 +1,11 @@
 from __future__ import annotations
+import multiprocessing
 import os
 import re
-from typing import List, Optional
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from app.schemas.extraction import ExtractionResult, ExtractedItem, Uom
 
@@ -69,7 +73,7 @@ _TRAILING_BARE_QTY_RE = re.compile(
 
 # Líneas de resumen: nunca deben aportar cantidad (el número es dinero).
 _TOTALS_RE = re.compile(
-    r"\b(totales?|subtotal|iva|retefuente|retencion|reteica|abono|saldo|descuento)\b",
+    r"\b(total(?:es)?|subtotal|iva|retefuente|retencion|reteica|abono|saldo|descuento)\b",
     flags=re.IGNORECASE,
 )
 
@@ -90,11 +94,14 @@ def _to_float(s: str) -> Optional[float]:
         return None
 
 
+_NON_ALNUM_RE = re.compile(r"[^a-zA-Z0-9]+")
+
+
 def _infer_uom(token: Optional[str]) -> Optional[Uom]:
     if not token:
         return None
     t = token.strip().lower()
-    t = re.sub(r"[^a-zA-Z0-9]+", "", t)
+    t = _NON_ALNUM_RE.sub("", t)
     return _UOM_ALIASES.get(t)
 
 
@@ -109,7 +116,8 @@ def _normalize_specs_text(s: str) -> str:
     return s
 
 
-def _extract_qty_uom_desc(raw: str):
+def _extract_qty_uom_desc_legacy(raw: str):
+    """Cascada de regex original; referencia para el scanner (tests diferenciales y benchmark)."""
     warnings: List[str] = []
     raw_clean = _BULLET_PREFIX_RE.sub("", (raw or "").strip())
     raw_clean = _normalize_specs_text(raw_clean)
@@ -278,13 +286,440 @@ def _extract_qty_uom_desc(raw: str):
     return float(qty), uom, desc2, warnings, conf, uom_raw
 
 
+# ---------------------------------------------------------------------------
+# Scanner de una pasada (mismas reglas y misma precedencia que la cascada legacy)
+#
+# Todas las reglas 0a/1/1b/2/2b miran la COLA de la línea: [sep] NUM [\s* UNIDAD].
+# En vez de probar 8 regex ancladas con (.*?) perezoso, clasificamos esa cola una vez
+# (unidad, número, separador espacio/guion/x) y derivamos los mismos grupos.
+# Las formas raras (paréntesis final, QTY=, backtracking de la regla 3) siguen yendo
+# por la regex compilada equivalente, así el resultado es idéntico al legacy.
+# ---------------------------------------------------------------------------
+
+_SPEC_TOKENS_RE = re.compile(
+    r"\b(\d{1,4})\s*(?:amps?|amperios?|a)\b|\b(\d{1,5})\s*([wv])\b",
+    flags=re.IGNORECASE,
+)
+_QTY_DESC_FORMAT_RE = re.compile(
+    r"^\s*QTY\s*=\s*(\d+(?:[.,]\d+)?)\s*\|\s*DESC\s*=\s*(.+?)\s*$",
+    flags=re.IGNORECASE,
+)
+_TAIL_QTY_UOM_PAREN_RE = re.compile(
+    r"^(.*?)(?:\s*[-–—]\s*|\s+)(\d+(?:[.,]\d+)?)\s*([A-Za-zñÑ\.]+)(?:\s*\(\s*([^)]+?)\s*\))?\s*$"
+)
+_LEADING_QTY_RE = re.compile(r"^(\d+(?:[.,]\d+)?)\s*(?:x\s*)?([A-Za-zñÑ\.]+)?\s*(.+)$")
+_BARE_QTY_NUM_RE = re.compile(r"\d{1,5}(?:[.,]\d{1,2})?")
+_HAS_LETTER_RE = re.compile(r"[A-Za-zñÑ]")
+_LEADING_CONNECTORS = ("de", "del", "x", "por")
+
+_UNIT_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZñÑ.")
+_DASHES = "-–—"
+
+
+def _spec_token(m: re.Match) -> str:
+    if m.group(1) is not None:
+        return f"{m.group(1)}A"
+    return f"{m.group(2)}{m.group(3).upper()}"
+
+
+def _normalize_specs_once(s: str) -> str:
+    # las 3 sustituciones de _normalize_specs_text en un solo recorrido
+    return _SPEC_TOKENS_RE.sub(_spec_token, s)
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _is_multi_conductor(s: str) -> bool:
+    """Equivale a _MULTI_CONDUCTOR_RE.match (s ya viene sin espacios al inicio)."""
+    n = len(s)
+    if n < 3 or not s[0].isdecimal() or s[1] not in "xX" or not s[2].isdecimal():
+        return False
+    i = 3
+    if i < n and s[i].isdecimal():
+        i += 1
+    if i < n and s[i].isdecimal():
+        return False  # \d{1,2} seguido de otro dígito: no hay \b
+    if i == n or s[i].isspace():
+        return True
+    if s[i:i + 3].lower() == "awg":
+        return i + 3 == n or not _is_word(s[i + 3])
+    return not _is_word(s[i])
+
+
+def _num_start(s: str, end: int) -> int:
+    """Inicio de \\d+(?:[.,]\\d+)? que termina en `end` (s[end-1] es dígito)."""
+    i = end
+    while i and s[i - 1].isdecimal():
+        i -= 1
+    if i >= 2 and s[i - 1] in ".," and s[i - 2].isdecimal():
+        i -= 1
+        while i and s[i - 1].isdecimal():
+            i -= 1
+    return i
+
+
+def _scan_tail(s: str):
+    """
+    Una pasada de derecha a izquierda: (num_start, num_end, unit_start, end) o None.
+    unit_start == end => la línea termina en número (sin unidad).
+    """
+    n = len(s)
+    while n and s[n - 1].isspace():
+        n -= 1
+    u = n
+    while u and s[u - 1] in _UNIT_CHARS:
+        u -= 1
+    e = u
+    if u < n:
+        while e and s[e - 1].isspace():
+            e -= 1
+    if not e or not s[e - 1].isdecimal():
+        return None
+    return _num_start(s, e), e, u, n
+
+
+def _sep_ws(s: str, ns: int) -> int:
+    k = ns
+    while k and s[k - 1].isspace():
+        k -= 1
+    return k if k < ns else -1
+
+
+def _sep_char(s: str, ns: int, chars: str) -> int:
+    """\\s*[chars]\\s* justo antes del número; devuelve dónde empieza (el (.*?) perezoso)."""
+    d = ns
+    while d and s[d - 1].isspace():
+        d -= 1
+    if not d or s[d - 1] not in chars:
+        return -1
+    k = d - 1
+    while k and s[k - 1].isspace():
+        k -= 1
+    return k
+
+
+def _match_bare_dash_qty(s: str, n: int):
+    """Equivale a _TRAILING_BARE_QTY_RE: (left, num) o None."""
+    r = n
+    while r and (s[r - 1].isdecimal() or s[r - 1] in ".,"):
+        r -= 1
+    if r == n or not _BARE_QTY_NUM_RE.fullmatch(s, r, n):
+        return None
+    k = _sep_char(s, r, _DASHES)
+    if k < 0 or not _HAS_LETTER_RE.search(s, 0, k):
+        return None
+    return s[:k], s[r:n]
+
+
+def _match_leading_qty(s: str):
+    """Equivale a _LEADING_QTY_RE: (num, token, rest) o None."""
+    n = len(s)
+    if not n or not s[0].isdecimal():
+        return None
+    i = 1
+    while i < n and s[i].isdecimal():
+        i += 1
+    if i + 1 < n and s[i] in ".," and s[i + 1].isdecimal():
+        i += 2
+        while i < n and s[i].isdecimal():
+            i += 1
+    q = i
+    while i < n and s[i].isspace():
+        i += 1
+    if i < n and s[i] == "x":
+        i += 1
+        while i < n and s[i].isspace():
+            i += 1
+    t0 = i
+    while i < n and s[i] in _UNIT_CHARS:
+        i += 1
+    t1 = i
+    while i < n and s[i].isspace():
+        i += 1
+    if i < n:
+        return s[:q], s[t0:t1], s[i:]
+    # no queda resto para (.+): el regex retrocede ("12", "5 mts"); caso raro, que lo resuelva él
+    m = _LEADING_QTY_RE.match(s)
+    return (m.group(1), m.group(2) or "", m.group(3)) if m else None
+
+
+def _extract_qty_uom_desc(raw: str):
+    raw_clean = (raw or "").strip()
+    if raw_clean[:1] in ("-", "*", "•"):
+        raw_clean = _BULLET_PREFIX_RE.sub("", raw_clean)
+    if "\n" in raw_clean:
+        return _extract_qty_uom_desc_legacy(raw)
+    raw_clean = _normalize_specs_once(raw_clean)
+    warnings: List[str] = []
+
+    tail = _scan_tail(raw_clean)
+    ns = ne = us = n = -1
+    has_unit = False
+    if tail:
+        ns, ne, us, n = tail
+        has_unit = us < n
+
+    # 0a) Multi-conductor NxAWG: qty comes from trailing number+UOM, not from prefix
+    if has_unit and _is_multi_conductor(raw_clean):
+        k = _sep_ws(raw_clean, ns)
+        if k >= 0:
+            tail_qty = _to_float(raw_clean[ns:ne])
+            tail_unit = raw_clean[us:n]
+            tail_uom = _infer_uom(tail_unit)
+            if tail_qty is not None and tail_qty > 0 and tail_uom is not None:
+                return float(tail_qty), tail_uom, _normalize_specs_once(raw_clean[:k].strip()), warnings, 0.78, tail_unit
+
+    # 0) Formato fuerte frontend
+    if raw_clean[:3].lower() == "qty":
+        m = _QTY_DESC_FORMAT_RE.match(raw_clean)
+        if m:
+            qty = _to_float(m.group(1)) or 1.0
+            desc = (m.group(2) or "").strip()
+            if qty <= 0:
+                qty = 1.0
+                warnings.append("QTY_INFERRED")
+            return float(qty), Uom.UND, desc, warnings, 0.85, None
+
+    qty: Optional[float] = None
+    uom: Optional[Uom] = None
+    uom_raw: Optional[str] = None
+    desc = raw_clean
+
+    # 1) Cantidad al final + unidad + (paren opcional).
+    # 1b) (sin guion) es un caso particular de 1 con la misma unidad: no aporta nada nuevo.
+    r1 = None
+    if has_unit:
+        k = _sep_char(raw_clean, ns, _DASHES)
+        if k < 0:
+            k = _sep_ws(raw_clean, ns)
+        if k >= 0:
+            r1 = (raw_clean[:k], raw_clean[ns:ne], raw_clean[us:n], "")
+    elif tail is None and raw_clean.rstrip().endswith(")"):
+        m = _TAIL_QTY_UOM_PAREN_RE.match(raw_clean)
+        if m:
+            r1 = (m.group(1) or "", m.group(2), m.group(3) or "", (m.group(4) or "").strip())
+    if r1:
+        left, num, unit_raw, paren_raw = r1
+        left = left.strip()
+        qty2 = _to_float(num)
+        unit_raw = unit_raw.strip()
+
+        maybe_uom = _infer_uom(unit_raw)
+        paren_uom = _infer_uom(paren_raw) if paren_raw else None
+
+        if qty2 is not None and qty2 > 0 and (maybe_uom is not None or paren_uom is not None):
+            qty = qty2
+            desc = left
+            uom_raw = unit_raw
+
+            if maybe_uom is not None:
+                uom = maybe_uom
+                if uom == Uom.UND and paren_uom is not None and paren_uom != uom:
+                    uom = paren_uom
+                    warnings.append("UOM_FROM_PAREN")
+                    uom_raw = f"{unit_raw}({paren_raw})"
+            else:
+                uom = paren_uom
+                warnings.append("UOM_FROM_PAREN")
+                uom_raw = f"{unit_raw}({paren_raw})"
+
+            if paren_raw and "UOM_FROM_PAREN" not in warnings:
+                desc = f"{desc} ({paren_raw})".strip()
+
+    # 2) Cantidad al final con "x"
+    if qty is None and tail and not has_unit:
+        k = _sep_char(raw_clean, ns, "xX")
+        if k >= 0:
+            left = raw_clean[:k].strip()
+            qty2 = _to_float(raw_clean[ns:ne])
+            is_dimension = bool(left) and left[-1].isdigit()
+            if qty2 is not None and qty2 > 0 and not is_dimension:
+                qty = qty2
+                uom = Uom.UND
+                desc = left
+
+    # 2b) Cantidad al final, sin unidad, tras un guion ("CANALETA 8X4 NEGRA — 20")
+    if qty is None and tail and not has_unit:
+        m2 = _match_bare_dash_qty(raw_clean, n)
+        if m2:
+            left = m2[0].strip()
+            qty2 = _to_float(m2[1])
+            if qty2 is not None and qty2 > 0 and not _TOTALS_RE.search(left):
+                qty = qty2
+                uom = Uom.UND
+                desc = left
+
+    # 3) Cantidad al inicio
+    if qty is None:
+        m3 = _match_leading_qty(raw_clean)
+        if m3:
+            qty3 = _to_float(m3[0])
+            token_raw = m3[1].strip()
+            rest = m3[2].strip()
+
+            if qty3 is not None and qty3 > 0:
+                qty = qty3
+                token = token_raw.lower().strip(".")
+                maybe_uom = _infer_uom(token)
+
+                if maybe_uom is not None:
+                    uom = maybe_uom
+                    uom_raw = token_raw
+                    desc = rest
+                else:
+                    desc = f"{token_raw} {rest}".strip() if token_raw else rest
+
+    # Defaults
+    if qty is None or qty <= 0:
+        qty = 1.0
+        warnings.append("QTY_INFERRED")
+
+    if uom is None:
+        uom = Uom.UND
+        warnings.append("UOM_INFERRED")
+
+    desc2 = (desc or "").strip()
+    # Strip leading Spanish connectors left over after qty+unit removal
+    head, _, tail_txt = desc2.partition(" ")
+    if tail_txt and head.lower() in _LEADING_CONNECTORS:
+        desc2 = tail_txt.strip()
+    elif desc2[:1].lower() in ("d", "x", "p"):
+        desc2 = re.sub(r"^(?:de|del|x|por)\s+", "", desc2, flags=re.IGNORECASE).strip()
+    if not desc2:
+        desc2 = raw_clean
+        warnings.append("DESCRIPTION_FALLBACK")
+
+    conf = 0.4
+    if "QTY_INFERRED" not in warnings and "UOM_INFERRED" not in warnings:
+        conf = 0.78
+    elif "QTY_INFERRED" in warnings and "UOM_INFERRED" in warnings:
+        conf = 0.35
+
+    return float(qty), uom, desc2, warnings, conf, uom_raw
+
 
 def _keep_low_confidence() -> bool:
     return os.getenv("KEEP_LOW_CONFIDENCE_ITEMS", "true").lower() in ("1", "true", "yes", "y")
 
 
+# Fila liviana (tupla) del parser; ExtractedItem se construye solo al final (_rows_to_items).
+# (line_index, raw_text, description, quantity, uom, uom_raw, confidence, warnings)
+_Row = Tuple[int, str, str, float, Uom, Optional[str], float, List[str]]
+
+
+def _parse_lines(start: int, lines: List[str], keep_low: bool) -> List[Optional[_Row]]:
+    """Una entrada por línea (None = descartada por baja confianza). Corre también en los workers."""
+    rows: List[Optional[_Row]] = []
+    for off, ln in enumerate(lines):
+        qty, uom, desc, warnings, conf, uom_raw = _extract_qty_uom_desc(ln)
+
+        if "QTY_INFERRED" in warnings and "UOM_INFERRED" in warnings and conf < 0.5:
+            if not keep_low:
+                rows.append(None)
+                continue
+            warnings.append("LOW_CONFIDENCE_KEPT")
+
+        rows.append((start + off, ln, desc, qty, uom, uom_raw, conf, warnings))
+    return rows
+
+
+def _rows_to_items(rows: Iterable[_Row]) -> List[ExtractedItem]:
+    return [
+        ExtractedItem(
+            line_index=idx,
+            raw_text=ln,
+            description=desc,
+            quantity=qty,
+            uom=uom,
+            uom_raw=uom_raw,
+            confidence=conf,
+            warnings=warnings or None,
+        )
+        for idx, ln, desc, qty, uom, uom_raw, conf, warnings in rows
+    ]
+
+
+# ---- modo paralelo (exports BOM de 100k+ líneas) ----
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_PID: Optional[int] = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+def _parallel_min_lines() -> int:
+    return int(os.getenv("LOCAL_PARSE_PARALLEL_MIN_LINES", "20000"))
+
+
+def _parallel_workers() -> int:
+    return max(1, int(os.getenv("LOCAL_PARSE_WORKERS", str(os.cpu_count() or 1))))
+
+
+def _parallel_chunk_lines() -> int:
+    return max(1, int(os.getenv("LOCAL_PARSE_CHUNK_LINES", "5000")))
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, int]:
+    """(pool, workers reales). Si LOCAL_PARSE_WORKERS cambió se recrea, así meta reporta lo que corrió."""
+    global _POOL, _POOL_PID, _POOL_WORKERS
+    workers = _parallel_workers()
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid() or _POOL_WORKERS != workers:
+            if _POOL is not None and _POOL_PID == os.getpid():
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            # spawn: la API corre threads (uvicorn, jobs); fork con threads vivos puede colgarse
+            _POOL = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _POOL_PID = os.getpid()
+            _POOL_WORKERS = workers
+        return _POOL, _POOL_WORKERS
+
+
+def _parse_rows_parallel(lines: List[str], base: int, keep_low: bool, need: int) -> Tuple[List[_Row], bool, int, int]:
+    """
+    Parsea lines[base:] en chunks entre procesos y junta en orden (line_index global).
+    Solo hay `workers` chunks en vuelo: al juntar `need` filas deja de despachar y cancela el resto.
+    Devuelve (rows, truncated, chunks, workers).
+    """
+    size = _parallel_chunk_lines()
+    starts = iter(range(base, len(lines), size))
+    pool, workers = _get_pool()
+    pending: deque = deque()
+
+    def _submit() -> None:
+        st = next(starts, None)
+        if st is not None:
+            pending.append((st, pool.submit(_parse_lines, st, lines[st:st + size], keep_low)))
+
+    def _stop(truncated: bool) -> Tuple[List[_Row], bool, int, int]:
+        for _, f in pending:
+            f.cancel()
+        return rows, truncated, done, workers
+
+    for _ in range(workers):
+        _submit()
+    rows: List[_Row] = []
+    done = 0
+    while pending:
+        st, fut = pending.popleft()
+        done += 1
+        for row in fut.result():
+            if len(rows) >= need:
+                return _stop(True)
+            if row is not None:
+                rows.append(row)
+        if len(rows) >= need:
+            # el serial avisa TRUNCATED apenas queda una línea más tras el último item aceptado
+            return _stop(st + size < len(lines))
+        _submit()
+    return rows, False, done, workers
+
+
 def fallback_txt_lines_to_extraction(text: str, max_items: int = 200) -> ExtractionResult:
-    items: List[ExtractedItem] = []
     global_warnings: List[str] = []
 
     lines = [ln.strip() for ln in (text or "").splitlines()]
@@ -292,58 +727,88 @@ def fallback_txt_lines_to_extraction(text: str, max_items: int = 200) -> Extract
     input_line_count = len(lines)
 
     keep_low = _keep_low_confidence()
-
-    for idx, ln in enumerate(lines):
-        if len(items) >= max_items:
-            global_warnings.append("TRUNCATED_ITEMS_MAX_ITEMS")
+    meta = {"source_type": "txt", "extractor": "local", "model": "local-fallback-v1",
+            "input_line_count": input_line_count}
+
+    # Serial primero: con max_items=200 casi siempre se llena en pocas líneas y el pool (spawn +
+    # pickle de chunks) solo agrega costo. El resto va al pool únicamente si tras
+    # LOCAL_PARSE_PARALLEL_MIN_LINES líneas todavía faltan items (export grande con mucho ruido).
+    parallel = _parallel_workers() > 1
+    serial_end = min(input_line_count, _parallel_min_lines()) if parallel else input_line_count
+    rows: List[_Row] = []
+    truncated = False
+    for idx, ln in enumerate(lines[:serial_end]):
+        if len(rows) >= max_items:
+            truncated = True
             break
+        row = _parse_lines(idx, [ln], keep_low)[0]
+        if row is not None:
+            rows.append(row)
 
-        qty, uom, desc, warnings, conf, uom_raw = _extract_qty_uom_desc(ln)
-
-        if "QTY_INFERRED" in warnings and "UOM_INFERRED" in warnings and conf < 0.5:
-            if not keep_low:
-                continue
-            warnings.append("LOW_CONFIDENCE_KEPT")
+    if not truncated and serial_end < input_line_count:
+        if len(rows) >= max_items:
+            truncated = True
+        else:
+            more, truncated, chunks, workers = _parse_rows_parallel(lines, serial_end, keep_low, max_items - len(rows))
+            rows.extend(more)
+            meta["local_parse_workers"] = workers
+            meta["local_parse_chunks"] = chunks
 
-        items.append(
-            ExtractedItem(
-                line_index=idx,
-                raw_text=ln,
-                description=desc,
-                quantity=qty,
-                uom=uom,
-                uom_raw=uom_raw,
-                confidence=conf,
-                warnings=warnings or None,
-            )
-        )
+    if truncated:
+        global_warnings.append("TRUNCATED_ITEMS_MAX_ITEMS")
 
     return ExtractionResult(
-        items=items,
+        items=_rows_to_items(rows),
         global_warnings=global_warnings or None,
-        meta={"source_type": "txt", "extractor": "local", "model": "local-fallback-v1",
-              "input_line_count": input_line_count},
+        meta=meta,
     )
 
 
+# Encabezados de tabla por columna, en orden de prioridad: "item" va al final porque suele ser
+# la columna del consecutivo ("Item | Descripción | Cant.") y no la descripción.
+_HEADER_KEYS = {
+    "description": ["descripcion", "descripción", "desc", "producto", "material", "nombre", "item"],
+    "quantity": ["cantidad", "cant", "qty", "quantity"],
+    "uom": ["uom", "unidad", "unit", "und", "u.m", "u/m"],
+}
+# Claves cortas solo como palabra completa: "unit" dentro de "Vr. Unitario" no es la unidad.
+_HEADER_SUBSTRING_MIN_LEN = 5
+_HEADER_TOKEN_RE = re.compile(r"[^\s:;()\[\]]+")
+# columnas de plata ("Vr. Unitario", "Precio por unidad") nunca son cantidad ni unidad
+_HEADER_PRICE_TOKENS = {"vr", "vlr", "valor", "precio", "$"}
+
+
+def _header_tokens(h: str) -> List[str]:
+    return [t.strip(".") for t in _HEADER_TOKEN_RE.findall(h.strip().lower())]
+
+
+def table_header_columns(header: List[str]) -> Dict[str, Optional[int]]:
+    """
+    Índice de la columna de descripción / cantidad / unidad en un encabezado (None si no está).
+    Primero por palabra completa ("Und", "Cant."), recién después por substring con las claves
+    largas ("Cantidades", "Descripción/Referencia").
+    """
+    tokens = [_header_tokens(h) for h in header]
+    header_norm = ["" if _HEADER_PRICE_TOKENS & set(toks) else h.strip().lower() for h, toks in zip(header, tokens)]
+    tokens = [[] if not norm else toks for norm, toks in zip(header_norm, tokens)]
+    out: Dict[str, Optional[int]] = {}
+    for col, keys in _HEADER_KEYS.items():
+        idx = next((i for k in keys for i, toks in enumerate(tokens) if k in toks), None)
+        if idx is None:
+            idx = next((i for k in keys if len(k) >= _HEADER_SUBSTRING_MIN_LEN
+                        for i, h in enumerate(header_norm) if k in h), None)
+        out[col] = idx
+    return out
+
+
 def fallback_table_text_to_extraction(table_text: str, source_type: str, max_items: int = 200) -> ExtractionResult:
     lines = [ln.rstrip("\n") for ln in (table_text or "").splitlines() if ln.strip()]
     if not lines:
         return ExtractionResult(items=[], global_warnings=["EMPTY_TABLE"], meta={"source_type": source_type, "extractor": "local"})
 
     header = [h.strip() for h in lines[0].split("\t")]
-    header_norm = [h.lower() for h in header]
-
-    def find_col(keys: List[str]) -> Optional[int]:
-        for i, h in enumerate(header_norm):
-            for k in keys:
-                if k in h:
-                    return i
-        return None
-
-    desc_idx = find_col(["descripcion", "descripción", "desc", "producto", "item", "material", "nombre"])
-    qty_idx = find_col(["cantidad", "cant", "qty", "quantity"])
-    uom_idx = find_col(["uom", "unidad", "unit"])
+    cols_idx = table_header_columns(header)
+    desc_idx, qty_idx, uom_idx = cols_idx["description"], cols_idx["quantity"], cols_idx["uom"]
 
     items: List[ExtractedItem] = []
     global_warnings: List[str] = []
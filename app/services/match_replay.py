@@ -0,0 +1,324 @@
+# app/services/match_replay.py
+"""
+Replay offline para calibrar `weights` del matching.
+
+1) export: toma líneas históricas con la elección final del usuario (draft_item_selections),
+   corre el recall SQL UNA vez y guarda por candidato score_base + features del rerank.
+2) score:  re-puntúa el cache bajo miles de configuraciones de weights de forma vectorizada
+   (score_final = score_base + features · weights) y reporta accuracy top-1 por config.
+
+Solo se calibran los weights: categories/keywords/avoid_terms cambian las features,
+así que si se tocan hay que re-exportar.
+
+Los drafts no guardan org_id, así que el export exige la lista de drafts de la org
+(--draft-id repetible o --drafts-file, uno por línea) y además descarta selecciones cuyo código
+no está en el catálogo de esa org: sin eso se re-jugaban las elecciones de todas las orgs contra
+un solo catálogo y top1_accuracy quedaba sesgado.
+
+Uso:
+    python -m app.services.match_replay export --org-id ORG --drafts-file drafts.txt --out replay.jsonl [--since 2025-01-01]
+    python -m app.services.match_replay score --data replay.jsonl --configs 5000 [--top 20]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import text
+
+from app.api.routes_matching import (
+    _DEFAULT_MATCH_CONFIG,
+    _SQL_BATCH_LATERAL,
+    _SQL_RECALL,
+    _candidate_flags,
+    _prepare_item,
+    _spec_terms,
+    get_match_config,
+)
+
+WEIGHT_NAMES: List[str] = list(_DEFAULT_MATCH_CONFIG["weights"].keys())
+
+
+# =========================
+# Export (una pasada de recall por draft)
+# =========================
+_SQL_LABELED_LINES = """
+SELECT di.draft_id, di.line_index,
+       COALESCE(NULLIF(di.description,''), di.raw_text) AS q,
+       di.raw_text,
+       di.warnings_json,
+       sel.selected_code
+FROM draft_items di
+JOIN draft_item_selections sel
+  ON sel.draft_id = di.draft_id AND sel.line_index = di.line_index
+WHERE di.draft_id = ANY(:draft_ids)
+  AND sel.selected_code IS NOT NULL
+  AND sel.provider = :provider
+  AND EXISTS (
+    SELECT 1 FROM catalog_products cp
+    WHERE cp.org_id = :org_id AND cp.provider = sel.provider AND cp.code = sel.selected_code
+  )
+  AND (CAST(:since AS timestamptz) IS NULL OR sel.updated_at >= CAST(:since AS timestamptz))
+ORDER BY di.draft_id, di.line_index
+"""
+
+
+def candidate_features(specs: dict, flags: dict, cfg: dict, q_base: str) -> Dict[str, float]:
+    feats: Dict[str, float] = defaultdict(float)
+    for name, sign in _spec_terms(specs, flags, cfg, q_base):
+        feats[name] += sign
+    return dict(feats)
+
+
+def export_dataset(
+    eng,
+    org_id: str,
+    out_path: str,
+    draft_ids: List[str],
+    provider: str = "siigo",
+    since: Optional[str] = None,
+    limit: int = 5,
+) -> Dict[str, Any]:
+    draft_ids = sorted({d.strip() for d in draft_ids if d and d.strip()})
+    if not draft_ids:
+        raise ValueError("export_dataset requiere los draft_ids de la org (los drafts no guardan org_id)")
+    cfg = get_match_config(org_id)
+    fetch_limit = max(limit * int(cfg.get("recall_multiplier") or 8), limit)
+
+    with eng.connect() as conn:
+        rows = conn.execute(
+            text(_SQL_LABELED_LINES),
+            {"provider": provider, "since": since, "org_id": org_id, "draft_ids": draft_ids},
+        ).mappings().all()
+
+    by_draft: Dict[str, list] = defaultdict(list)
+    for r in rows:
+        by_draft[r["draft_id"]].append(dict(r))
+
+    n_lines = 0
+    with open(out_path, "w", encoding="utf-8") as out, eng.connect() as conn:
+        for draft_id, lines in by_draft.items():
+            prepared = []
+            labels = {}
+            for it in lines:
+                p = _prepare_item(it, cfg)
+                if p is not None:
+                    prepared.append(p)
+                    labels[p["line_index"]] = str(it["selected_code"])
+            if not prepared:
+                continue
+
+            batch_rows = conn.execute(
+                text(_SQL_BATCH_LATERAL),
+                {
+                    "line_indexes": [p["line_index"] for p in prepared],
+                    "enriched_queries": [p["q_enriched"] for p in prepared],
+                    "cat_likes": [f"%{p['specs']['cat']}%" if p["specs"].get("cat") else None for p in prepared],
+                    "org_id": org_id,
+                    "provider": provider,
+                    "fetch_limit": fetch_limit,
+                },
+            ).mappings().all()
+            rows_by_line: Dict[int, list] = defaultdict(list)
+            for r in batch_rows:
+                rows_by_line[int(r["line_index"])].append(dict(r))
+
+            for p in prepared:
+                cands = rows_by_line.get(p["line_index"], [])
+                if not cands:
+                    cands = [dict(r) for r in conn.execute(
+                        text(_SQL_RECALL.format(extra_where="")),
+                        {"q": p["q_enriched"], "org_id": org_id, "provider": provider, "fetch_limit": fetch_limit},
+                    ).mappings().all()]
+
+                rec = {
+                    "draft_id": draft_id,
+                    "line_index": p["line_index"],
+                    "q": p["q_enriched"],
+                    "label_code": labels[p["line_index"]],
+                    "candidates": [
+                        {
+                            "code": str(c["code"]),
+                            "score_base": float(c.get("score_base") or 0),
+                            "features": candidate_features(p["specs"], _candidate_flags(c, cfg), cfg, p["q_base"]),
+                        }
+                        for c in cands
+                    ],
+                }
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                n_lines += 1
+
+    return {"org_id": org_id, "drafts": len(by_draft), "lines": n_lines, "out": out_path}
+
+
+# =========================
+# Dataset vectorizado
+# =========================
+class ReplayDataset:
+    """
+    base:   (L, C) score_base por candidato (padding = 0)
+    feats:  (L, C, K) features por weight (K = len(WEIGHT_NAMES))
+    mask:   (L, C) True si el candidato existe
+    label:  (L,) índice del candidato elegido por el usuario, -1 si no quedó en el recall
+    """
+
+    def __init__(self, records: List[dict]) -> None:
+        self.records = records
+        L = len(records)
+        C = max((len(r["candidates"]) for r in records), default=0)
+        K = len(WEIGHT_NAMES)
+        col = {name: i for i, name in enumerate(WEIGHT_NAMES)}
+
+        self.base = np.zeros((L, C), dtype=np.float64)
+        self.feats = np.zeros((L, C, K), dtype=np.float64)
+        self.mask = np.zeros((L, C), dtype=bool)
+        self.label = np.full(L, -1, dtype=np.int64)
+
+        for i, r in enumerate(records):
+            for j, c in enumerate(r["candidates"]):
+                self.base[i, j] = c["score_base"]
+                self.mask[i, j] = True
+                for name, v in (c.get("features") or {}).items():
+                    if name in col:
+                        self.feats[i, j, col[name]] = v
+                if self.label[i] < 0 and c["code"] == r["label_code"]:
+                    self.label[i] = j
+
+    @classmethod
+    def load(cls, path: str) -> "ReplayDataset":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls([json.loads(line) for line in f if line.strip()])
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def weights_matrix(configs: Iterable[Dict[str, float]]) -> np.ndarray:
+    return np.array([[float(c.get(name, 0)) for name in WEIGHT_NAMES] for c in configs], dtype=np.float64)
+
+
+DEFAULT_MEM_BUDGET_MB = 256.0
+
+
+def block_size(L: int, C: int, budget_bytes: int) -> int:
+    """
+    Configs por bloque para que el bloque (L, C, B) float64 quepa en el presupuesto. Se cuenta x3
+    (scores + temporales de matmul/argmax) aunque las sumas van in-place sobre un solo buffer.
+    """
+    return max(1, int(budget_bytes) // max(L * C * 8 * 3, 1))
+
+
+def top1_accuracy(ds: ReplayDataset, W: np.ndarray, mem_budget_mb: float = DEFAULT_MEM_BUDGET_MB) -> np.ndarray:
+    """
+    Accuracy top-1 para cada fila de W (M, K). Procesa configs en bloques dimensionados por
+    mem_budget_mb: con 10k líneas x 40 candidatos un bloque fijo de 512 eran ~1.6 GB por temporal.
+    Empates: gana el primer candidato (mismo orden que el sort estable del endpoint).
+    """
+    M = W.shape[0]
+    if len(ds) == 0:
+        return np.zeros(M)
+
+    L, C = ds.base.shape
+    block = block_size(L, C, int(mem_budget_mb * 1024 * 1024))
+    neg_inf = np.where(ds.mask, 0.0, -np.inf)[:, :, None]  # (L, C, 1)
+    acc = np.empty(M, dtype=np.float64)
+    for s in range(0, M, block):
+        Wb = W[s:s + block]                                    # (B, K)
+        scores = ds.feats @ Wb.T                               # (L, C, B), único temporal grande
+        scores += ds.base[:, :, None]
+        scores += neg_inf
+        best = scores.argmax(axis=1)                           # (L, B)
+        acc[s:s + block] = (best == ds.label[:, None]).mean(axis=0)
+        del scores
+    return acc
+
+
+def sample_weight_configs(n: int, scale: float = 0.5, seed: int = 0, base: Optional[dict] = None) -> List[Dict[str, float]]:
+    """Config base + (n-1) perturbaciones multiplicativas log-normales."""
+    base = dict(base or _DEFAULT_MATCH_CONFIG["weights"])
+    rng = np.random.default_rng(seed)
+    b = np.array([float(base.get(name, 0)) for name in WEIGHT_NAMES])
+    jitter = np.exp(rng.normal(0.0, scale, size=(max(n - 1, 0), len(WEIGHT_NAMES))))
+    configs = [dict(base)]
+    for row in b[None, :] * jitter:
+        configs.append({name: round(float(v), 4) for name, v in zip(WEIGHT_NAMES, row)})
+    return configs
+
+
+def score_configs(
+    ds: ReplayDataset, configs: List[Dict[str, float]], top: int = 20, mem_budget_mb: float = DEFAULT_MEM_BUDGET_MB
+) -> Dict[str, Any]:
+    t0 = time.monotonic()
+    acc = top1_accuracy(ds, weights_matrix(configs), mem_budget_mb=mem_budget_mb)
+    elapsed = time.monotonic() - t0
+
+    order = np.argsort(-acc, kind="stable")
+    return {
+        "lines": len(ds),
+        "label_in_recall": int((ds.label >= 0).sum()),
+        "configs_scored": len(configs),
+        "elapsed_s": round(elapsed, 3),
+        "configs_per_min": round(len(configs) / elapsed * 60, 1) if elapsed > 0 else None,
+        "baseline_top1": float(acc[0]) if len(acc) else None,
+        "results": [
+            {"config_index": int(i), "top1_accuracy": float(acc[i]), "weights": configs[i]}
+            for i in order[:top]
+        ],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="match_replay")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("export")
+    ex.add_argument("--org-id", required=True)
+    ex.add_argument("--draft-id", action="append", default=[], help="draft de la org (repetible)")
+    ex.add_argument("--drafts-file", default=None, help="archivo con un draft_id de la org por línea")
+    ex.add_argument("--provider", default="siigo")
+    ex.add_argument("--since", default=None)
+    ex.add_argument("--limit", type=int, default=5)
+    ex.add_argument("--out", required=True)
+
+    sc = sub.add_parser("score")
+    sc.add_argument("--data", required=True)
+    sc.add_argument("--configs", type=int, default=1000)
+    sc.add_argument("--configs-file", default=None, help="JSON list de dicts de weights")
+    sc.add_argument("--scale", type=float, default=0.5)
+    sc.add_argument("--seed", type=int, default=0)
+    sc.add_argument("--top", type=int, default=20)
+    sc.add_argument("--mem-mb", type=float, default=DEFAULT_MEM_BUDGET_MB, help="memoria por bloque de configs")
+
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        from app.db_engine import get_engine
+        draft_ids = list(args.draft_id)
+        if args.drafts_file:
+            with open(args.drafts_file, "r", encoding="utf-8") as f:
+                draft_ids += [ln.strip() for ln in f if ln.strip()]
+        if not draft_ids:
+            ap.error("export requiere --draft-id o --drafts-file (drafts de la org)")
+        report = export_dataset(get_engine(), args.org_id, args.out, draft_ids,
+                                provider=args.provider, since=args.since, limit=args.limit)
+    else:
+        ds = ReplayDataset.load(args.data)
+        if args.configs_file:
+            with open(args.configs_file, "r", encoding="utf-8") as f:
+                configs = [dict(_DEFAULT_MATCH_CONFIG["weights"])] + json.load(f)
+        else:
+            configs = sample_weight_configs(args.configs, scale=args.scale, seed=args.seed)
+        report = score_configs(ds, configs, top=args.top, mem_budget_mb=args.mem_mb)
+
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,128 @@
+# app/services/openai_clients.py
+"""
+Clientes OpenAI compartidos por proceso.
+
+Antes cada OpenAIExtractor() creaba su propio OpenAI() (y su pool HTTP), así que cada extract /
+enrich / imagen pagaba TCP + TLS de nuevo. Aquí hay UN cliente sync por proceso y uno async por
+event loop, con pool keep-alive configurable:
+
+    OPENAI_HTTP_MAX_CONNECTIONS   (default 100)
+    OPENAI_HTTP_MAX_KEEPALIVE     (default 20)
+    OPENAI_HTTP_KEEPALIVE_S       (default 60)
+    OPENAI_HTTP_TIMEOUT_S         (opcional; si no, el default del SDK)
+
+pool_stats() expone conexiones abiertas/ociosas/activas por pool (va en /v1/metrics).
+Si el proceso hace fork (process pools), el hijo arma su propio cliente.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from app.observability import incr
+
+_LOCK = threading.Lock()
+_SYNC: Optional[OpenAI] = None
+_SYNC_PID: Optional[int] = None
+_ASYNC: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("OPENAI_HTTP_KEEPALIVE_S", "60")),
+    )
+
+
+def _http_kwargs() -> Dict[str, Any]:
+    kw: Dict[str, Any] = {"limits": _limits()}
+    timeout = os.getenv("OPENAI_HTTP_TIMEOUT_S")
+    if timeout:
+        kw["timeout"] = httpx.Timeout(float(timeout), connect=10.0)
+    return kw
+
+
+def _hooks(kind: str, is_async: bool) -> Dict[str, list]:
+    def on_request(request: httpx.Request) -> None:
+        incr(f"openai.http.{kind}.requests")
+
+    def on_response(response: httpx.Response) -> None:
+        incr(f"openai.http.{kind}.status_{response.status_code // 100}xx")
+
+    if not is_async:
+        return {"request": [on_request], "response": [on_response]}
+
+    async def a_on_request(request: httpx.Request) -> None:
+        on_request(request)
+
+    async def a_on_response(response: httpx.Response) -> None:
+        on_response(response)
+
+    return {"request": [a_on_request], "response": [a_on_response]}
+
+
+def get_openai_client() -> OpenAI:
+    global _SYNC, _SYNC_PID
+    pid = os.getpid()
+    with _LOCK:
+        if _SYNC is None or _SYNC_PID != pid:
+            http_client = DefaultHttpxClient(event_hooks=_hooks("sync", False), **_http_kwargs())
+            _SYNC = OpenAI(http_client=http_client)
+            _SYNC_PID = pid
+            incr("openai.http.sync.clients_created")
+        return _SYNC
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Un AsyncOpenAI por event loop (el pool async queda atado al loop donde se creó)."""
+    loop = asyncio.get_running_loop()
+    with _LOCK:
+        client = _ASYNC.get(loop)
+        if client is None:
+            http_client = DefaultAsyncHttpxClient(event_hooks=_hooks("async", True), **_http_kwargs())
+            client = AsyncOpenAI(http_client=http_client)
+            _ASYNC[loop] = client
+            incr("openai.http.async.clients_created")
+        return client
+
+
+def _pool_view(http_client: Any) -> Dict[str, Any]:
+    """
+    Conexiones del pool de httpx. httpx no expone el pool públicamente (`_transport._pool` de
+    httpcore): si una versión nueva lo cambia, se reporta available=False en vez de romper
+    /v1/metrics. Los máximos salen de nuestra config, no del objeto interno.
+    """
+    limits = _limits()
+    view: Dict[str, Any] = {
+        "max_connections": limits.max_connections,
+        "max_keepalive": limits.max_keepalive_connections,
+    }
+    try:
+        pool = http_client._transport._pool
+        conns = list(pool.connections)
+        idle = sum(1 for c in conns if c.is_idle())
+    except Exception:
+        incr("openai.http.pool_stats_unavailable")
+        return {**view, "available": False}
+    return {**view, "available": True, "connections": len(conns), "idle": idle, "active": len(conns) - idle}
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _LOCK:
+        sync_client = _SYNC if _SYNC_PID == os.getpid() else None
+        async_clients = list(_ASYNC.values())
+    # HTTP/1.1: conexiones "active" = requests en vuelo
+    return {
+        "sync": _pool_view(getattr(sync_client, "_client", None)) if sync_client else {"connections": 0},
+        "async": {
+            "clients": len(async_clients),
+            "pools": [_pool_view(getattr(c, "_client", None)) for c in async_clients],
+        },
+    }
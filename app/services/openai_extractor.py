@@ -1,16 +1,29 @@
 # app/services/openai_extractor.py
 from __future__ import annotations
 
+import asyncio
 import json
+import logging
 import os
 import re
-from typing import Any, Dict, Optional, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, List, Tuple
 
-from openai import OpenAI
+from openai import BadRequestError, NotFoundError
 from pydantic import ValidationError
 
+from app.observability import incr
 from app.schemas.extraction import ExtractionResult
+from app.services.openai_clients import get_async_openai_client, get_openai_client
+from app.services import llm_cache
+from app.services.document_extractor import ProgressFn
+from app.services.line_triage import select_for_llm, triage_enabled
 from app.services.local_fallback_parser import fallback_enabled, fallback_txt_lines_to_extraction
+from app.services.openai_files import Upload, forget, upload_or_reuse, upload_or_reuse_async
+from app.services.token_budget import estimate_tokens, plan_chunks
+
+logger = logging.getLogger(__name__)
 
 
 def _min_tokens(v: int) -> int:
@@ -18,6 +31,43 @@ def _min_tokens(v: int) -> int:
     return v if v >= 16 else 16
 
 
+def _text_lines(text: str) -> List[str]:
+    return [l.strip() for l in (text or "").splitlines() if l.strip()]
+
+
+def _is_missing_file_error(e: Exception, file_id: str) -> bool:
+    # según el endpoint un file_id inexistente llega como 404 o como 400 que lo menciona
+    return isinstance(e, NotFoundError) or file_id in str(e)
+
+
+def _cacheable(out_text: str, incomplete: bool) -> bool:
+    """Solo se guarda una salida completa que parsea: un JSON roto no se repite durante el TTL."""
+    if not out_text or incomplete:
+        return False
+    try:
+        json.loads(out_text)
+    except json.JSONDecodeError:
+        incr("llm_cache.skip_invalid_json")
+        return False
+    return True
+
+
+def _join_halves(left: ExtractionResult, right: ExtractionResult, offset: int) -> ExtractionResult:
+    """Une las dos mitades de un chunk que se partió; line_index de la derecha corre `offset`."""
+    for it in right.items or []:
+        try:
+            it.line_index = int(it.line_index) + offset
+        except Exception:
+            pass
+    warnings = list(dict.fromkeys((left.global_warnings or []) + (right.global_warnings or [])))
+    splits = 1 + int((left.meta or {}).get("chunk_splits", 0)) + int((right.meta or {}).get("chunk_splits", 0))
+    return ExtractionResult(
+        items=(left.items or []) + (right.items or []),
+        global_warnings=warnings,
+        meta={**(left.meta or {}), "chunk_splits": splits},
+    )
+
+
 class OpenAIExtractor:
     """
     Normaliza RFQs desde:
@@ -28,12 +78,29 @@ class OpenAIExtractor:
     Salida: ExtractionResult (items + global_warnings + meta)
     """
 
-    def __init__(self) -> None:
-        self.client = OpenAI()
+    def __init__(self, progress: Optional[ProgressFn] = None) -> None:
+        self.client = self._make_client()
+        # callback opcional (stage, data) para reportar avance (SSE de parse)
+        self.progress = progress
         # Por defecto usamos gpt-4.1-mini para extracción
         self.model = os.getenv("OPENAI_MODEL_EXTRACTOR", "gpt-4.1-mini")
         self.max_output_tokens = _min_tokens(int(os.getenv("OPENAI_MAX_OUTPUT_TOKENS", "2500")))
         self.temperature = float(os.getenv("OPENAI_TEMPERATURE", "0"))
+        # chunks de normalize_from_text: cuántas llamadas en paralelo y timeout por llamada
+        self.chunk_concurrency = max(1, int(os.getenv("OPENAI_CHUNK_CONCURRENCY", "4")))
+        self.chunk_timeout_s = float(os.getenv("OPENAI_CHUNK_TIMEOUT_S", "90"))
+        # presupuesto por chunk (ver token_budget.plan_chunks)
+        self.chunk_max_input_tokens = int(os.getenv("OPENAI_CHUNK_MAX_INPUT_TOKENS", "8000"))
+        self.output_tokens_per_item = int(os.getenv("OPENAI_OUTPUT_TOKENS_PER_ITEM", "40"))
+        self.chunk_max_lines = max(1, int(os.getenv("OPENAI_CHUNK_MAX_LINES", "150")))
+        # cuántas veces se puede partir en dos un chunk que salió incompleto (2^n llamadas como mucho)
+        self.chunk_max_split_depth = max(0, int(os.getenv("OPENAI_CHUNK_MAX_SPLIT_DEPTH", "3")))
+        # índice original de cada línea mandada al LLM (None = se mandaron todas), ver _triage
+        self._line_map: Optional[List[int]] = None
+
+    def _make_client(self):
+        # cliente compartido por proceso (pool keep-alive), ver openai_clients
+        return get_openai_client()
 
     # -------------------------
     # Public API
@@ -44,33 +111,103 @@ class OpenAIExtractor:
           ##  source_type="txt",
        ## )
     def normalize_from_text(self, text: str) -> ExtractionResult:
-        # Si el texto viene largo (muchas líneas), lo partimos para que NO se corte el JSON.
-        lines = [l.strip() for l in (text or "").splitlines() if l.strip()]
-
-        # <= 40 líneas: normal
-        if len(lines) <= 40:
-            raw = "\n".join(lines)
-            return self._call_openai(
-                user_content=[{"type": "input_text", "text": self._prompt_for_text(raw)}],
-                source_type="txt",
-                fallback_text=raw,
-            )
+        lines, triage_meta = self._triage(_text_lines(text))
+        return self._apply_triage(self._normalize_lines(lines), triage_meta)
+
+    def _normalize_lines(self, lines: List[str]) -> ExtractionResult:
+        # Chunks por presupuesto de tokens para que NO se corte el JSON (y sin llamadas medio vacías).
+        starts, chunks = self._plan_chunks(lines)
+
+        # cabe en una llamada: normal
+        if len(chunks) <= 1:
+            return self._text_result(lines, timeout=None)
+
+        # varios chunks en paralelo (con tope de concurrencia), combinamos en orden
+        wall_t0 = time.monotonic()
+        outcomes = self._run_chunks(starts, chunks)
+        return self._merge_chunks(starts, outcomes, (time.monotonic() - wall_t0) * 1000)
+
+    def _plan_chunks(self, lines: List[str]) -> Tuple[List[int], List[str]]:
+        # lo fijo de cada llamada: system prompt + instrucciones + schema (va en text.format)
+        overhead = (
+            estimate_tokens(self._system_prompt())
+            + estimate_tokens(self._prompt_for_text(""))
+            + estimate_tokens(json.dumps(self._json_schema()))
+        )
+        return plan_chunks(
+            lines,
+            input_budget=max(self.chunk_max_input_tokens - overhead, 1),
+            # margen: el estimador no es exacto y el JSON lleva envoltorio (global_warnings, meta)
+            output_budget=max(int(self.max_output_tokens * 0.85) - 40, 1),
+            output_per_item=self.output_tokens_per_item,
+            max_lines=self.chunk_max_lines,
+        )
 
+    def _should_split(self, lines: List[str], incomplete: bool, depth: int) -> bool:
+        # solo status=incomplete (se acabó max_output_tokens): un JSON malformado completo no se
+        # arregla partiendo, eso lo maneja _parse_output
+        return incomplete and len(lines) > 1 and depth < self.chunk_max_split_depth
+
+    def _text_result(self, lines: List[str], timeout: Optional[float], depth: int = 0) -> ExtractionResult:
+        """Una llamada de texto; si la respuesta sale incompleta, parte el chunk en dos y reintenta."""
+        raw = "\n".join(lines)
+        user_content = [{"type": "input_text", "text": self._prompt_for_text(raw)}]
+        out_text, incomplete = self._create_output(self._request_kwargs(user_content, timeout))
+        if self._should_split(lines, incomplete, depth):
+            mid = len(lines) // 2
+            logger.info("OPENAI_CHUNK_TRUNCATED lines=%s depth=%s -> split", len(lines), depth)
+            return _join_halves(
+                self._text_result(lines[:mid], timeout, depth + 1), self._text_result(lines[mid:], timeout, depth + 1), mid
+            )
+        return self._parse_output(out_text, "txt", raw)
+
+    def _triage(self, lines: List[str]) -> Tuple[List[str], Optional[Dict[str, Any]]]:
+        """Saca totales y ruido antes del LLM (line_triage); recuerda el índice original de cada línea."""
+        self._line_map = None
+        if not lines or not triage_enabled():
+            return lines, None
+        sent, self._line_map, meta = select_for_llm(lines)
+        return sent, meta
+
+    def _orig_index(self, i: int) -> int:
+        if self._line_map is None or not (0 <= i < len(self._line_map)):
+            return i
+        return self._line_map[i]
+
+    def _apply_triage(self, res: ExtractionResult, triage_meta: Optional[Dict[str, Any]]) -> ExtractionResult:
+        if triage_meta is None:
+            return res
+        # line_index del LLM cuenta solo las líneas mandadas: volver al índice del texto original
+        for it in res.items or []:
+            try:
+                it.line_index = self._orig_index(int(it.line_index))
+            except Exception:
+                pass
+        res.meta = {**(res.meta or {}), "triage": triage_meta}
+        return res
 
-        # > 40 líneas: chunk de 40, combinamos resultados
+    def _merge_chunks(
+        self,
+        starts: List[int],
+        outcomes: List[Tuple[ExtractionResult, float]],
+        wall_ms: float,
+    ) -> ExtractionResult:
         all_items = []
         all_warnings = []
         meta = {"extractor": "openai", "model": self.model, "source_type": "txt"}
 
-        for start in range(0, len(lines), 40):
-            chunk = "\n".join(lines[start:start + 40])
-            res = self._call_openai(
-                user_content=[{"type": "input_text", "text": self._prompt_for_text(chunk)}],
-                source_type="txt",
-                fallback_text=chunk,
-            )
-
-
+        calls_ms = [ms for _, ms in outcomes]
+        meta.update({
+            "chunks": len(outcomes),
+            "chunk_concurrency": min(self.chunk_concurrency, len(outcomes)),
+            "chunk_calls_ms": [round(ms, 1) for ms in calls_ms],
+            "chunk_serial_ms": round(sum(calls_ms), 1),
+            "chunk_wall_ms": round(wall_ms, 1),
+            "chunk_wall_saved_ms": round(max(sum(calls_ms) - wall_ms, 0.0), 1),
+            "chunk_splits": sum(int((res.meta or {}).get("chunk_splits", 0)) for res, _ in outcomes),
+        })
+
+        for start, (res, _) in zip(starts, outcomes):
             # reindex (para mantener orden global)
             for it in (res.items or []):
                 try:
@@ -91,6 +228,40 @@ class OpenAIExtractor:
 
         return ExtractionResult(items=all_items, global_warnings=dedup_warnings, meta=meta)
 
+    def _call_text_chunk(self, chunk: str) -> Tuple[ExtractionResult, float]:
+        t0 = time.monotonic()
+        res = self._text_result(chunk.split("\n"), timeout=self.chunk_timeout_s)
+        return res, (time.monotonic() - t0) * 1000
+
+    def _run_chunks(self, starts: List[int], chunks: List[str]) -> List[Tuple[ExtractionResult, float]]:
+        """Corre los chunks en paralelo y devuelve (resultado, ms) en el MISMO orden de entrada."""
+        def _one(i: int) -> Tuple[ExtractionResult, float]:
+            out = self._call_text_chunk(chunks[i])
+            self._chunk_done(i, starts[i], len(chunks), out)
+            return out
+
+        workers = max(1, min(self.chunk_concurrency, len(chunks)))
+        if workers == 1:
+            return [_one(i) for i in range(len(chunks))]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="openai-chunk") as pool:
+            # map preserva el orden; si un chunk falla, la excepción sube igual que en serie
+            return list(pool.map(_one, range(len(chunks))))
+
+    def _chunk_done(self, index: int, start: int, total: int, outcome: Tuple[ExtractionResult, float]) -> None:
+        """Avisa que terminó un chunk, con sus items ya en line_index global (sin tocar el resultado)."""
+        if self.progress is None:
+            return
+        res, ms = outcome
+        items = []
+        for it in res.items or []:
+            d = it.model_dump(mode="json")
+            d["line_index"] = self._orig_index(int(it.line_index) + start)
+            items.append(d)
+        try:
+            self.progress("llm_chunk_done", {"chunk": index, "chunks": total, "ms": round(ms, 1), "items": items})
+        except Exception:
+            logger.warning("progress callback failed", exc_info=True)
+
 
     def normalize_from_table(self, table_text: str) -> ExtractionResult:
         return self._call_openai(
@@ -98,42 +269,51 @@ class OpenAIExtractor:
             source_type="table",
         )
 
-    def normalize_from_pdf(self, pdf_path: str) -> ExtractionResult:
-        # Subir PDF y pasarlo como input_file (Responses API)
-        with open(pdf_path, "rb") as f:
-            uploaded = self.client.files.create(file=f, purpose="user_data")
+    def normalize_from_pdf(self, pdf_path: Upload, content_key: Optional[str] = None) -> ExtractionResult:
+        # Subir PDF (o reusar el file_id si ya se subió el mismo contenido) y pasarlo como input_file
+        file_id, reused = upload_or_reuse(self.client, pdf_path, content_key=content_key)
 
-        return self._call_openai(
-            user_content=[
-                {"type": "input_file", "file_id": uploaded.id},
-                {"type": "input_text", "text": self._prompt_for_pdf()},
-            ],
-            source_type="pdf",
-        )
+        try:
+            res = self._call_openai(user_content=self._pdf_content(file_id), source_type="pdf")
+        except (NotFoundError, BadRequestError) as e:
+            if not (reused and _is_missing_file_error(e, file_id)):
+                raise
+            # el archivo expiró/lo borraron del lado de OpenAI: re-subir una vez
+            forget(file_id)
+            file_id, reused = upload_or_reuse(self.client, pdf_path, content_key=content_key)
+            res = self._call_openai(user_content=self._pdf_content(file_id), source_type="pdf")
+
+        res.meta = {**(res.meta or {}), "openai_file_reused": reused}
+        return res
 
     # Alias para compatibilidad antigua
-    def extract_from_pdf(self, pdf_path: str) -> ExtractionResult:
-        return self.normalize_from_pdf(pdf_path)
+    def extract_from_pdf(self, pdf_path: Upload, content_key: Optional[str] = None) -> ExtractionResult:
+        return self.normalize_from_pdf(pdf_path, content_key=content_key)
 
     def extract_from_image(self, img_bytes: bytes, mime: str = "image/jpeg") -> ExtractionResult:
         """Extract items from an image using OpenAI vision (base64-encoded)."""
+        return self._call_openai(user_content=self._image_content(img_bytes, mime), source_type="image")
+
+    def _pdf_content(self, file_id: str) -> list[dict]:
+        return [
+            {"type": "input_file", "file_id": file_id},
+            {"type": "input_text", "text": self._prompt_for_pdf()},
+        ]
+
+    def _image_content(self, img_bytes: bytes, mime: str) -> list[dict]:
         import base64
         b64 = base64.b64encode(img_bytes).decode("ascii")
         data_url = f"data:{mime};base64,{b64}"
-
-        return self._call_openai(
-            user_content=[
-                {
-                    "type": "input_image",
-                    "image_url": data_url,
-                },
-                {
-                    "type": "input_text",
-                    "text": self._prompt_for_image(),
-                },
-            ],
-            source_type="image",
-        )
+        return [
+            {
+                "type": "input_image",
+                "image_url": data_url,
+            },
+            {
+                "type": "input_text",
+                "text": self._prompt_for_image(),
+            },
+        ]
 
     # -------------------------
     # Internals
@@ -143,9 +323,33 @@ class OpenAIExtractor:
         user_content: list[dict],
         source_type: str,
         fallback_text: Optional[str] = None,
+        timeout: Optional[float] = None,
     ) -> ExtractionResult:
-        resp = self.client.responses.create(
+        out_text, _ = self._create_output(self._request_kwargs(user_content, timeout))
+        return self._parse_output(out_text, source_type, fallback_text)
 
+    def _create_output(self, kwargs: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        responses.create pasando por llm_cache: mismo request con temperature=0 => misma salida,
+        no se vuelve a pagar. Devuelve (output_text, incomplete); las incompletas o con JSON roto
+        no se guardan.
+        """
+        key = llm_cache.request_key(kwargs)
+        if key:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached, False
+        resp = self.client.responses.create(**kwargs)
+        out_text = getattr(resp, "output_text", None) or ""
+        incomplete = getattr(resp, "status", None) == "incomplete"
+        if key and _cacheable(out_text, incomplete):
+            llm_cache.put(key, out_text)
+        return out_text, incomplete
+
+    def _request_kwargs(self, user_content: list[dict], timeout: Optional[float] = None) -> Dict[str, Any]:
+        extra = {"timeout": timeout} if timeout else {}
+        return dict(
+            **extra,
             model=self.model,
             input=[
                 {"role": "system", "content": self._system_prompt()},
@@ -163,9 +367,13 @@ class OpenAIExtractor:
             },
         )
 
-        out_text = getattr(resp, "output_text", None) or ""
-
-        # helper local (queda DENTRO de _call_openai)
+    def _parse_output(
+        self,
+        out_text: str,
+        source_type: str,
+        fallback_text: Optional[str] = None,
+    ) -> ExtractionResult:
+        # helper local (queda DENTRO de _parse_output)
         def _maybe_fallback(
             reason: str,
             extra_warnings: Optional[List[str]] = None,
@@ -464,6 +672,27 @@ class OpenAIExtractor:
         if not items:
             return items
 
+        try:
+            out_text, _ = self._create_output(self._enrich_request_kwargs(items, raw_text))
+            return self._merge_enriched(items, out_text)
+        except Exception:
+            # If enrichment fails, return original items unchanged
+            return items
+
+    def enrich_batches(self, batches: List[Tuple[list, str]]) -> list[dict]:
+        """
+        Varios lotes de enrich_items (items marcados + su contexto) en paralelo, con el mismo tope
+        de concurrencia que los chunks. Devuelve los items de todos los lotes, en orden.
+        """
+        workers = max(1, min(self.chunk_concurrency, len(batches)))
+        if workers == 1:
+            outs = [self.enrich_items(items, ctx) for items, ctx in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="openai-enrich") as pool:
+                outs = list(pool.map(lambda b: self.enrich_items(*b), batches))
+        return [it for out in outs for it in out]
+
+    def _enrich_request_kwargs(self, items: list[dict], raw_text: str) -> Dict[str, Any]:
         prompt = (
             "Eres un asistente experto en materiales eléctricos.\n"
             "Te doy una lista de ítems extraídos de una solicitud de cotización (RFQ) por un parser local.\n"
@@ -480,25 +709,27 @@ class OpenAIExtractor:
             "[tipo producto] [especificaciones] [material] [norma].\n"
             "- NO inventes ítems nuevos. Solo corrige los que te paso.\n"
             "- Devuelve SOLO el JSON array con los ítems corregidos.\n\n"
-            f"TEXTO ORIGINAL DE LA RFQ:\n{raw_text[:3000]}\n\n"
+            "FRAGMENTOS DEL TEXTO ORIGINAL ([n] = line_index del ítem; '...' = líneas omitidas):\n"
+            f"{raw_text[:3000]}\n\n"
             f"ÍTEMS PARSEADOS (JSON):\n{json.dumps(items, ensure_ascii=False)}\n\n"
             "Devuelve un JSON array con los ítems corregidos. Cada ítem debe tener:\n"
             "line_index, description, quantity, uom, confidence\n"
         )
 
-        try:
-            resp = self.client.responses.create(
-                model=self.model,
-                input=[
-                    {"role": "user", "content": [{"type": "input_text", "text": prompt}]},
-                ],
-                temperature=0,
-                max_output_tokens=_min_tokens(
-                    int(os.getenv("OPENAI_ENRICH_MAX_TOKENS", "2000"))
-                ),
-            )
+        return dict(
+            model=self.model,
+            input=[
+                {"role": "user", "content": [{"type": "input_text", "text": prompt}]},
+            ],
+            temperature=0,
+            max_output_tokens=_min_tokens(
+                int(os.getenv("OPENAI_ENRICH_MAX_TOKENS", "2000"))
+            ),
+        )
 
-            out_text = getattr(resp, "output_text", None) or ""
+    def _merge_enriched(self, items: list[dict], out_text: str) -> list[dict]:
+        """Merge de la respuesta de enrich_items sobre los items originales (por line_index)."""
+        try:
             # Try to parse JSON from the response
             # Strip markdown code fences if present
             cleaned = out_text.strip()
@@ -612,3 +843,125 @@ class OpenAIExtractor:
             "required": ["items", "global_warnings", "meta"],
             "additionalProperties": False,
         }
+
+
+class AsyncOpenAIExtractor(OpenAIExtractor):
+    """
+    Misma extracción que OpenAIExtractor, pero sobre AsyncOpenAI: cada llamada al LLM es un await,
+    así que muchas extracciones en vuelo comparten un solo event loop en vez de ocupar un thread
+    cada una. Prompts, schema, validación y fallbacks son los mismos (se heredan).
+    """
+
+    def _make_client(self):
+        return get_async_openai_client()
+
+    async def normalize_from_text(self, text: str) -> ExtractionResult:
+        lines, triage_meta = self._triage(_text_lines(text))
+        return self._apply_triage(await self._normalize_lines(lines), triage_meta)
+
+    async def _normalize_lines(self, lines: List[str]) -> ExtractionResult:
+        starts, chunks = self._plan_chunks(lines)
+        # el semáforo cubre cada llamada (también las mitades de un chunk partido), no el chunk entero
+        sem = asyncio.Semaphore(self.chunk_concurrency)
+        if len(chunks) <= 1:
+            return await self._text_result(lines, timeout=None, sem=sem)
+
+        async def _one(i: int) -> Tuple[ExtractionResult, float]:
+            out = await self._call_text_chunk(chunks[i], sem)
+            self._chunk_done(i, starts[i], len(chunks), out)
+            return out
+
+        wall_t0 = time.monotonic()
+        outcomes = await asyncio.gather(*(_one(i) for i in range(len(chunks))))
+        return self._merge_chunks(starts, list(outcomes), (time.monotonic() - wall_t0) * 1000)
+
+    async def _text_result(
+        self, lines: List[str], timeout: Optional[float], depth: int = 0, sem: Optional[asyncio.Semaphore] = None
+    ) -> ExtractionResult:
+        sem = sem or asyncio.Semaphore(self.chunk_concurrency)
+        raw = "\n".join(lines)
+        user_content = [{"type": "input_text", "text": self._prompt_for_text(raw)}]
+        async with sem:
+            out_text, incomplete = await self._create_output(self._request_kwargs(user_content, timeout))
+        if self._should_split(lines, incomplete, depth):
+            mid = len(lines) // 2
+            logger.info("OPENAI_CHUNK_TRUNCATED lines=%s depth=%s -> split", len(lines), depth)
+            left, right = await asyncio.gather(
+                self._text_result(lines[:mid], timeout, depth + 1, sem), self._text_result(lines[mid:], timeout, depth + 1, sem)
+            )
+            return _join_halves(left, right, mid)
+        return self._parse_output(out_text, "txt", raw)
+
+    async def _call_text_chunk(self, chunk: str, sem: Optional[asyncio.Semaphore] = None) -> Tuple[ExtractionResult, float]:
+        t0 = time.monotonic()
+        res = await self._text_result(chunk.split("\n"), timeout=self.chunk_timeout_s, sem=sem)
+        return res, (time.monotonic() - t0) * 1000
+
+    async def normalize_from_table(self, table_text: str) -> ExtractionResult:
+        return await self._call_openai(
+            user_content=[{"type": "input_text", "text": self._prompt_for_table(table_text)}],
+            source_type="table",
+        )
+
+    async def normalize_from_pdf(self, pdf_path: Upload, content_key: Optional[str] = None) -> ExtractionResult:
+        file_id, reused = await upload_or_reuse_async(self.client, pdf_path, content_key=content_key)
+        try:
+            res = await self._call_openai(user_content=self._pdf_content(file_id), source_type="pdf")
+        except (NotFoundError, BadRequestError) as e:
+            if not (reused and _is_missing_file_error(e, file_id)):
+                raise
+            await asyncio.to_thread(forget, file_id)
+            file_id, reused = await upload_or_reuse_async(self.client, pdf_path, content_key=content_key)
+            res = await self._call_openai(user_content=self._pdf_content(file_id), source_type="pdf")
+
+        res.meta = {**(res.meta or {}), "openai_file_reused": reused}
+        return res
+
+    async def extract_from_pdf(self, pdf_path: Upload, content_key: Optional[str] = None) -> ExtractionResult:
+        return await self.normalize_from_pdf(pdf_path, content_key=content_key)
+
+    async def extract_from_image(self, img_bytes: bytes, mime: str = "image/jpeg") -> ExtractionResult:
+        return await self._call_openai(user_content=self._image_content(img_bytes, mime), source_type="image")
+
+    async def enrich_items(self, items: list[dict], raw_text: str) -> list[dict]:
+        if not items:
+            return items
+        try:
+            out_text, _ = await self._create_output(self._enrich_request_kwargs(items, raw_text))
+            return self._merge_enriched(items, out_text)
+        except Exception:
+            return items
+
+    async def enrich_batches(self, batches: List[Tuple[list, str]]) -> list[dict]:
+        sem = asyncio.Semaphore(self.chunk_concurrency)
+
+        async def _one(items: list, ctx: str) -> list[dict]:
+            async with sem:
+                return await self.enrich_items(items, ctx)
+
+        outs = await asyncio.gather(*(_one(items, ctx) for items, ctx in batches))
+        return [it for out in outs for it in out]
+
+    async def _call_openai(
+        self,
+        user_content: list[dict],
+        source_type: str,
+        fallback_text: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> ExtractionResult:
+        out_text, _ = await self._create_output(self._request_kwargs(user_content, timeout))
+        return self._parse_output(out_text, source_type, fallback_text)
+
+    async def _create_output(self, kwargs: Dict[str, Any]) -> Tuple[str, bool]:
+        # sqlite es bloqueante: fuera del event loop
+        key = llm_cache.request_key(kwargs)
+        if key:
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                return cached, False
+        resp = await self.client.responses.create(**kwargs)
+        out_text = getattr(resp, "output_text", None) or ""
+        incomplete = getattr(resp, "status", None) == "incomplete"
+        if key and _cacheable(out_text, incomplete):
+            await asyncio.to_thread(llm_cache.put, key, out_text)
+        return out_text, incomplete
@@ -0,0 +1,241 @@
+# app/services/openai_files.py
+"""
+Reuso de archivos subidos a OpenAI (tabla `openai_file_uploads`).
+
+content_key (sha256 de los bytes que se suben, o lo que pase el caller) -> file_id, con expiración.
+- upload_or_reuse(): si hay un file_id vigente para ese contenido lo reusa; si no, sube y lo registra.
+  El archivo se sube con expires_after para que OpenAI lo borre solo aunque el cleanup no corra.
+- forget(): si OpenAI responde que el file_id ya no existe, se borra el mapeo y el caller re-sube.
+- cleanup_expired(): borra en OpenAI los archivos vencidos y sus filas. Corre en un thread de fondo
+  (start_cleanup_thread, desde el startup de la app).
+
+Si la DB falla se sube igual (sin reuso): nunca bloquea la extracción.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Optional, Tuple, Union
+
+from sqlalchemy import text
+
+from app.db_engine import get_engine
+from app.observability import incr
+from app.services.pdf_utils import PdfSource
+
+logger = logging.getLogger(__name__)
+
+Upload = Union[str, PdfSource]
+
+_CLEANUP_THREAD: threading.Thread | None = None
+_CLEANUP_LOCK = threading.Lock()
+
+
+def _ttl_s() -> int:
+    # margen bajo el expires_after real del archivo en OpenAI (ver _upload)
+    return int(os.getenv("OPENAI_FILE_TTL_S", str(7 * 24 * 3600)))
+
+
+def _reuse_enabled() -> bool:
+    return os.getenv("OPENAI_FILE_REUSE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def content_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _upload_kwargs(f) -> dict:
+    # OpenAI exige expires_after >= 1h; le damos 1 día más que nuestro TTL
+    return {
+        "file": f,
+        "purpose": "user_data",
+        "expires_after": {"anchor": "created_at", "seconds": max(_ttl_s() + 86400, 3600)},
+    }
+
+
+def _open_upload(source: Upload) -> Tuple[Any, int]:
+    """(argumento file de files.create, bytes). Un PdfSource sube su truncado armado en memoria."""
+    if isinstance(source, str):
+        return open(source, "rb"), os.path.getsize(source)
+    return source.upload_file()
+
+
+def _close(f) -> None:
+    if hasattr(f, "close"):
+        f.close()
+
+
+def _default_key(source: Upload) -> str:
+    if isinstance(source, str):
+        return content_sha256(source)
+    key = content_sha256(source.path)
+    return f"{key}:pages={source.max_pages}" if source.truncated else key
+
+
+def _upload(client, source: Upload) -> Tuple[str, int]:
+    f, size = _open_upload(source)
+    try:
+        return client.files.create(**_upload_kwargs(f)).id, size
+    finally:
+        _close(f)
+
+
+def _lookup(key: str) -> Optional[str]:
+    """file_id vigente para key; None si no hay o si la DB falla."""
+    try:
+        with get_engine().begin() as conn:
+            return conn.execute(
+                text("""
+                    UPDATE openai_file_uploads
+                    SET last_used_at = now(), uses = uses + 1
+                    WHERE content_key = :key AND expires_at > now()
+                    RETURNING file_id
+                """),
+                {"key": key},
+            ).scalar()
+    except Exception as e:
+        logger.warning("OPENAI_FILE_LOOKUP_FAILED err=%s", e)
+        return None
+
+
+def _remember(key: str, file_id: str, size_bytes: int) -> None:
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO openai_file_uploads (content_key, file_id, size_bytes, expires_at)
+                    VALUES (:key, :file_id, :size_bytes, now() + make_interval(secs => :ttl_s))
+                    ON CONFLICT (content_key) DO UPDATE
+                      SET file_id = EXCLUDED.file_id,
+                          size_bytes = EXCLUDED.size_bytes,
+                          created_at = now(),
+                          expires_at = EXCLUDED.expires_at,
+                          last_used_at = now(),
+                          uses = 1
+                """),
+                {"key": key, "file_id": file_id, "size_bytes": size_bytes, "ttl_s": _ttl_s()},
+            )
+    except Exception as e:
+        logger.warning("OPENAI_FILE_STORE_FAILED err=%s", e)
+
+
+def upload_or_reuse(client, path: Upload, content_key: Optional[str] = None) -> Tuple[str, bool]:
+    """Devuelve (file_id, reused). `path` puede ser un PdfSource (el truncado se arma solo si se sube)."""
+    if not _reuse_enabled():
+        return _upload(client, path)[0], False
+
+    key = content_key or _default_key(path)
+    file_id = _lookup(key)
+    if file_id:
+        incr("openai.files.reused")
+        return file_id, True
+
+    file_id, size = _upload(client, path)
+    incr("openai.files.uploaded")
+    _remember(key, file_id, size)
+    return file_id, False
+
+
+async def upload_or_reuse_async(client, path: Upload, content_key: Optional[str] = None) -> Tuple[str, bool]:
+    """Igual que upload_or_reuse con un AsyncOpenAI (hash, truncado y DB van en un thread)."""
+    async def _upload_async() -> Tuple[str, int]:
+        f, size = await asyncio.to_thread(_open_upload, path)
+        try:
+            return (await client.files.create(**_upload_kwargs(f))).id, size
+        finally:
+            _close(f)
+
+    if not _reuse_enabled():
+        return (await _upload_async())[0], False
+
+    key = content_key or await asyncio.to_thread(_default_key, path)
+    file_id = await asyncio.to_thread(_lookup, key)
+    if file_id:
+        incr("openai.files.reused")
+        return file_id, True
+
+    file_id, size = await _upload_async()
+    incr("openai.files.uploaded")
+    await asyncio.to_thread(_remember, key, file_id, size)
+    return file_id, False
+
+
+def forget(file_id: str) -> None:
+    try:
+        with get_engine().begin() as conn:
+            conn.execute(text("DELETE FROM openai_file_uploads WHERE file_id = :file_id"), {"file_id": file_id})
+    except Exception as e:
+        logger.warning("OPENAI_FILE_FORGET_FAILED err=%s", e)
+
+
+def cleanup_expired(client, limit: int = 200) -> int:
+    """Borra en OpenAI (y en la tabla) los archivos vencidos. Devuelve cuántos limpió."""
+    with get_engine().connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT content_key, file_id FROM openai_file_uploads
+                WHERE expires_at <= now()
+                ORDER BY expires_at
+                LIMIT :limit
+            """),
+            {"limit": limit},
+        ).mappings().all()
+
+    from openai import NotFoundError
+
+    cleaned = 0
+    for r in rows:
+        try:
+            client.files.delete(r["file_id"])
+        except NotFoundError:
+            pass  # ya lo borró OpenAI (expires_after)
+        except Exception as e:
+            logger.warning("OPENAI_FILE_DELETE_FAILED file_id=%s err=%s", r["file_id"], e)
+            continue
+        with get_engine().begin() as conn:
+            conn.execute(
+                text("DELETE FROM openai_file_uploads WHERE content_key = :key AND file_id = :file_id"),
+                {"key": r["content_key"], "file_id": r["file_id"]},
+            )
+        cleaned += 1
+
+    if cleaned:
+        incr("openai.files.cleaned", cleaned)
+    return cleaned
+
+
+def _cleanup_loop(stop: threading.Event, interval_s: float) -> None:
+    from app.services.openai_clients import get_openai_client
+
+    while not stop.wait(interval_s):
+        try:
+            n = cleanup_expired(get_openai_client())
+            if n:
+                logger.info("OPENAI_FILE_CLEANUP deleted=%s", n)
+        except Exception as e:
+            logger.warning("OPENAI_FILE_CLEANUP_FAILED err=%s", e)
+
+
+def start_cleanup_thread() -> Optional[threading.Thread]:
+    """Arranca (una vez por proceso) el cleanup periódico. No hace nada si OpenAI está apagado."""
+    global _CLEANUP_THREAD
+    if os.getenv("OPENAI_ENABLED", "false").lower() != "true" or not _reuse_enabled():
+        return None
+    with _CLEANUP_LOCK:
+        if _CLEANUP_THREAD is None:
+            interval_s = float(os.getenv("OPENAI_FILE_CLEANUP_INTERVAL_S", "3600"))
+            _CLEANUP_THREAD = threading.Thread(
+                target=_cleanup_loop,
+                args=(threading.Event(), interval_s),
+                name="openai-file-cleanup",
+                daemon=True,
+            )
+            _CLEANUP_THREAD.start()
+        return _CLEANUP_THREAD
@@ -0,0 +1,151 @@
+# app/services/parse_events.py
+"""
+Progreso del parse guardado en la tabla `parse_events`, para seguirlo desde otro request.
+
+El parse lo dispara un POST (POST /parse?async=1 -> worker, o POST /parse/stream); GET
+/v1/drafts/{id}/parse/stream solo observa: lee los eventos de la última corrida del draft y, si el
+EventSource se reconecta (Last-Event-ID), sigue desde ahí en vez de re-parsear o chocar con el 409.
+Funciona igual si el parse corre en el worker o en otro proceso de la API.
+
+- start_run(): primer evento de una corrida (borra las corridas anteriores del draft).
+- recorder():  ProgressFn que guarda cada etapa (el worker se lo pasa a parse_draft).
+- observe():   SSE con `id:` de los eventos desde last_event_id hasta `done` / `error`.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.observability import incr
+from app.services.document_extractor import ProgressFn
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = ("done", "error")
+
+
+def _poll_s() -> float:
+    return float(os.getenv("PARSE_STREAM_POLL_S", "0.5"))
+
+
+def _keepalive_s() -> float:
+    return float(os.getenv("PARSE_STREAM_KEEPALIVE_S", "15"))
+
+
+def _max_s() -> float:
+    return float(os.getenv("PARSE_STREAM_MAX_S", "900"))
+
+
+def sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _insert(conn, draft_id: str, run_id: str, stage: str, data: Any) -> int:
+    return conn.execute(
+        text("""
+            INSERT INTO parse_events (draft_id, run_id, stage, data)
+            VALUES (:draft_id, :run_id, :stage, CAST(:data AS jsonb))
+            RETURNING id
+        """),
+        {"draft_id": draft_id, "run_id": run_id, "stage": stage, "data": json.dumps(data, default=str)},
+    ).scalar()
+
+
+def start_run_conn(conn, draft_id: str, run_id: str, stage: str, data: Optional[Dict[str, Any]] = None) -> int:
+    """Dentro de una transacción ya abierta (enqueue_parse)."""
+    conn.execute(
+        text("DELETE FROM parse_events WHERE draft_id = :draft_id AND run_id <> :run_id"),
+        {"draft_id": draft_id, "run_id": run_id},
+    )
+    return _insert(conn, draft_id, run_id, stage, data or {})
+
+
+def start_run(eng, draft_id: str, run_id: str, stage: str, data: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    try:
+        with eng.begin() as conn:
+            return start_run_conn(conn, draft_id, run_id, stage, data)
+    except Exception as e:
+        # sin eventos el GET no puede seguir el parse, pero el parse no se frena por eso
+        logger.warning("PARSE_EVENTS_START_FAILED draft_id=%s err=%s", draft_id, e)
+        incr("parse_events.write_failed")
+        return None
+
+
+def record(eng, draft_id: str, run_id: str, stage: str, data: Any) -> Optional[int]:
+    try:
+        with eng.begin() as conn:
+            return _insert(conn, draft_id, run_id, stage, data)
+    except Exception as e:
+        logger.warning("PARSE_EVENTS_RECORD_FAILED draft_id=%s stage=%s err=%s", draft_id, stage, e)
+        incr("parse_events.write_failed")
+        return None
+
+
+def recorder(eng, draft_id: str, run_id: str) -> ProgressFn:
+    def progress(stage: str, data: Dict[str, Any]) -> None:
+        record(eng, draft_id, run_id, stage, data)
+    return progress
+
+
+def fetch_after(eng, draft_id: str, after_id: int, limit: int = 200) -> List[Dict[str, Any]]:
+    """Eventos de la última corrida del draft con id > after_id (en orden)."""
+    with eng.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT id, run_id, stage, data
+                FROM parse_events
+                WHERE draft_id = :draft_id
+                  AND run_id = (SELECT run_id FROM parse_events WHERE draft_id = :draft_id ORDER BY id DESC LIMIT 1)
+                  AND id > :after_id
+                ORDER BY id
+                LIMIT :limit
+            """),
+            {"draft_id": draft_id, "after_id": after_id, "limit": limit},
+        ).mappings().all()
+    return [dict(r) for r in rows]
+
+
+def last_event(eng, draft_id: str) -> Optional[Dict[str, Any]]:
+    with eng.connect() as conn:
+        row = conn.execute(
+            text("SELECT id, run_id, stage, data FROM parse_events WHERE draft_id = :draft_id ORDER BY id DESC LIMIT 1"),
+            {"draft_id": draft_id},
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+async def observe(eng, draft_id: str, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    SSE de la corrida actual desde last_event_id (0 = desde el principio). Si la corrida ya
+    terminó y el cliente tiene todo, re-emite el evento final para que cierre el EventSource.
+    """
+    after = int(last_event_id or 0)
+    t0 = last_sent = time.monotonic()
+    first = True
+    while time.monotonic() - t0 < _max_s():
+        rows = await asyncio.to_thread(fetch_after, eng, draft_id, after)
+        if first and not rows and after:
+            last = await asyncio.to_thread(last_event, eng, draft_id)
+            if last and last["stage"] in TERMINAL:
+                yield sse(last["stage"], last["data"], last["id"])
+                return
+        first = False
+        for r in rows:
+            after = r["id"]
+            yield sse(r["stage"], r["data"], r["id"])
+            last_sent = time.monotonic()
+            if r["stage"] in TERMINAL:
+                return
+        if not rows:
+            if time.monotonic() - last_sent >= _keepalive_s():
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(_poll_s())
+    yield sse("error", {"status_code": 504, "detail": {"code": "PARSE_STREAM_TIMEOUT"}})
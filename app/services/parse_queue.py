@@ -0,0 +1,291 @@
+# app/services/parse_queue.py
+"""
+Cola durable de parse sobre la tabla `jobs` (kind='parse').
+
+- enqueue_parse(): valida el draft, lo pasa a PARSING y registra el job QUEUED (202 al cliente).
+- claim_next():    el worker toma el siguiente job listo con FOR UPDATE SKIP LOCKED
+                   (varios workers/procesos no se pisan).
+- run_claimed():   corre el parse; éxito => SUCCEEDED (draft PARSED). Error transitorio =>
+                   vuelve a QUEUED con backoff exponencial hasta max_attempts; después DEAD
+                   (dead-letter, draft FAILED). Errores 4xx no se reintentan (FAILED).
+- requeue_stale(): jobs RUNNING con lock viejo (worker muerto) vuelven a la cola (o a DEAD, con
+                   callback, si ya no les quedan intentos).
+
+Mientras corre el parse, run_claimed renueva locked_at cada PARSE_JOB_HEARTBEAT_S: un parse lento
+pero vivo no vence. Y _finish solo escribe si el job sigue RUNNING con nuestro locked_by: si el
+lock se perdió igual (otro worker lo tomó, o quedó DEAD), el resultado se descarta sin callback.
+
+Cada etapa queda en parse_events (run_id = job id): GET /v1/drafts/{id}/parse/stream la sigue.
+
+El worker es un proceso aparte: python -m app.workers.parse_worker
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.db_engine import get_engine
+from app.observability import incr
+from app.services.draft_parsing import load_draft_for_parse, parse_draft
+from app.services.jobs import _deliver_callback, _job_view, new_job_id, poll_url
+from app.services.parse_events import record as record_event, recorder, start_run_conn
+
+logger = logging.getLogger(__name__)
+
+KIND = "parse"
+
+
+def _max_attempts() -> int:
+    return max(1, int(os.getenv("PARSE_JOB_MAX_ATTEMPTS", "3")))
+
+
+def _backoff_s(attempts: int) -> float:
+    base = float(os.getenv("PARSE_JOB_BACKOFF_S", "15"))
+    return min(base * (2 ** max(attempts - 1, 0)), float(os.getenv("PARSE_JOB_BACKOFF_MAX_S", "600")))
+
+
+def _lock_timeout_s() -> int:
+    # más que el peor parse (PDF + OpenAI lento)
+    return int(os.getenv("PARSE_JOB_LOCK_TIMEOUT_S", "900"))
+
+
+def _heartbeat_s() -> float:
+    return float(os.getenv("PARSE_JOB_HEARTBEAT_S", str(max(_lock_timeout_s() / 3, 1))))
+
+
+def enqueue_parse(draft_id: str, callback_url: Optional[str] = None) -> Dict[str, Any]:
+    eng = get_engine()
+    # 404/409 salen aquí, sincrónicos, antes del 202
+    load_draft_for_parse(eng, draft_id)
+
+    with eng.begin() as conn:
+        # un solo parse activo por draft: si ya hay uno, se devuelve ese (reintentos del UI)
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('parse_job:' || :draft_id))"), {"draft_id": draft_id})
+        existing = conn.execute(
+            text("""
+                SELECT * FROM jobs
+                WHERE kind = :kind AND draft_id = :draft_id AND status IN ('QUEUED', 'RUNNING')
+                ORDER BY created_at DESC
+                LIMIT 1
+            """),
+            {"kind": KIND, "draft_id": draft_id},
+        ).mappings().first()
+        if existing:
+            return {**_job_view(dict(existing)), "poll_url": poll_url(existing["id"], draft_id)}
+
+        job_id = new_job_id()
+        conn.execute(
+            text("""
+                INSERT INTO jobs (id, kind, draft_id, status, request_json, callback_url, max_attempts)
+                VALUES (:id, :kind, :draft_id, 'QUEUED', CAST(:request_json AS jsonb), :callback_url, :max_attempts)
+            """),
+            {
+                "id": job_id,
+                "kind": KIND,
+                "draft_id": draft_id,
+                "request_json": json.dumps({"draft_id": draft_id}),
+                "callback_url": callback_url,
+                "max_attempts": _max_attempts(),
+            },
+        )
+        conn.execute(
+            text("UPDATE drafts SET status = 'PARSING', updated_at = NOW() WHERE id = :id AND status <> 'COMMITTED'"),
+            {"id": draft_id},
+        )
+        # misma transacción: quien abra GET /parse/stream después del 202 ya ve esta corrida
+        start_run_conn(conn, draft_id, job_id, "job_queued", {"job_id": job_id})
+
+    incr("jobs.parse.submitted")
+    return {
+        "job_id": job_id,
+        "kind": KIND,
+        "draft_id": draft_id,
+        "status": "QUEUED",
+        "poll_url": poll_url(job_id, draft_id),
+    }
+
+
+def claim_next(worker_id: str) -> Optional[Dict[str, Any]]:
+    with get_engine().begin() as conn:
+        row = conn.execute(
+            text("""
+                UPDATE jobs
+                SET status = 'RUNNING',
+                    attempts = attempts + 1,
+                    locked_by = :worker_id,
+                    locked_at = now(),
+                    started_at = COALESCE(started_at, now()),
+                    updated_at = now()
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE kind = :kind AND status = 'QUEUED' AND run_after <= now()
+                    ORDER BY run_after, created_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING *
+            """),
+            {"kind": KIND, "worker_id": worker_id},
+        ).mappings().first()
+    return dict(row) if row else None
+
+
+def requeue_stale() -> int:
+    """Jobs RUNNING cuyo worker murió (lock vencido) vuelven a QUEUED; cuentan como intento."""
+    with get_engine().begin() as conn:
+        rows = conn.execute(
+            text("""
+                UPDATE jobs
+                SET status = CASE WHEN attempts >= max_attempts THEN 'DEAD' ELSE 'QUEUED' END,
+                    last_error = 'LOCK_EXPIRED',
+                    finished_at = CASE WHEN attempts >= max_attempts THEN now() ELSE NULL END,
+                    locked_by = NULL,
+                    locked_at = NULL,
+                    updated_at = now()
+                WHERE kind = :kind AND status = 'RUNNING'
+                  AND locked_at < now() - make_interval(secs => :lock_timeout_s)
+                RETURNING id, draft_id, status, callback_url
+            """),
+            {"kind": KIND, "lock_timeout_s": _lock_timeout_s()},
+        ).mappings().all()
+        dead_drafts = [r["draft_id"] for r in rows if r["status"] == "DEAD"]
+        if dead_drafts:
+            conn.execute(
+                text("UPDATE drafts SET status = 'FAILED', updated_at = NOW() WHERE id = ANY(:ids) AND status = 'PARSING'"),
+                {"ids": dead_drafts},
+            )
+    if rows:
+        incr("jobs.parse.requeued_stale", len(rows))
+    # DEAD es final: el cliente que registró callback tiene que enterarse igual que en run_claimed
+    for r in rows:
+        if r["status"] != "DEAD":
+            continue
+        record_event(get_engine(), r["draft_id"], r["id"], "error", {"status_code": 500, "detail": {"code": "LOCK_EXPIRED"}})
+        if r["callback_url"]:
+            _deliver_callback(r["id"], r["callback_url"])
+    return len(rows)
+
+
+def _refresh_lock(job: Dict[str, Any]) -> bool:
+    """Renueva locked_at; False si el job ya no es nuestro (requeue_stale o otro worker)."""
+    with get_engine().begin() as conn:
+        res = conn.execute(
+            text("""
+                UPDATE jobs SET locked_at = now(), updated_at = now()
+                WHERE id = :id AND status = 'RUNNING' AND locked_by = :worker_id
+            """),
+            {"id": job["id"], "worker_id": job.get("locked_by")},
+        )
+    return res.rowcount == 1
+
+
+def _keep_lock(job: Dict[str, Any], stop: threading.Event) -> None:
+    while not stop.wait(_heartbeat_s()):
+        try:
+            if not _refresh_lock(job):
+                logger.warning("PARSE_JOB_LOCK_LOST job_id=%s", job["id"])
+                return
+        except Exception as e:
+            # DB caída un rato: se reintenta en el próximo tick
+            logger.warning("PARSE_JOB_HEARTBEAT_FAILED job_id=%s err=%s", job["id"], e)
+
+
+def _finish(job: Dict[str, Any], status: str, *, result=None, error=None, retry_in_s: Optional[float] = None) -> bool:
+    """Cierra el intento. False (sin tocar nada) si el lock ya no es de este worker."""
+    with get_engine().begin() as conn:
+        res = conn.execute(
+            text("""
+                UPDATE jobs
+                SET status = :status,
+                    result_json = CAST(:result_json AS jsonb),
+                    error_json = CAST(:error_json AS jsonb),
+                    last_error = :last_error,
+                    run_after = CASE WHEN CAST(:retry_in_s AS double precision) IS NULL THEN run_after
+                                     ELSE now() + make_interval(secs => CAST(:retry_in_s AS double precision)) END,
+                    finished_at = CASE WHEN :status = 'QUEUED' THEN NULL ELSE now() END,
+                    locked_by = NULL,
+                    locked_at = NULL,
+                    updated_at = now()
+                WHERE id = :id AND status = 'RUNNING' AND locked_by = :worker_id
+            """),
+            {
+                "id": job["id"],
+                "worker_id": job.get("locked_by"),
+                "status": status,
+                "result_json": json.dumps(result, default=str) if result is not None else None,
+                "error_json": json.dumps(error, default=str) if error is not None else None,
+                "last_error": (json.dumps(error, default=str)[:500] if error is not None else None),
+                "retry_in_s": retry_in_s,
+            },
+        )
+        if res.rowcount != 1:
+            return False
+        if status in ("FAILED", "DEAD"):
+            conn.execute(
+                text("""
+                    UPDATE drafts
+                    SET status = 'FAILED',
+                        warnings_json = CAST(:warnings_json AS jsonb),
+                        updated_at = NOW()
+                    WHERE id = :id AND status = 'PARSING'
+                """),
+                {
+                    "id": job["draft_id"],
+                    "warnings_json": json.dumps({"global_warnings": ["PARSE_FAILED"], "meta": {"job_id": job["id"], "error": error}}, default=str),
+                },
+            )
+    return True
+
+
+def _record_outcome(job: Dict[str, Any], status: str, payload: Any) -> None:
+    # evento final para GET /parse/stream: done / error cierran el stream; un reintento no
+    if status == "QUEUED":
+        stage, payload = "retry_scheduled", {"attempt": job["attempts"], "error": payload}
+    else:
+        stage = "done" if status == "SUCCEEDED" else "error"
+    record_event(get_engine(), job["draft_id"], job["id"], stage, payload)
+
+
+def run_claimed(job: Dict[str, Any]) -> str:
+    """Corre un job ya tomado por claim_next. Devuelve el status final (LOCK_LOST si otro lo tomó)."""
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_keep_lock, args=(job, stop), name=f"parse-lock-{job['id']}", daemon=True)
+    heartbeat.start()
+    try:
+        result = parse_draft(get_engine(), job["draft_id"], recorder(get_engine(), job["draft_id"], job["id"]))
+    except HTTPException as e:
+        # 404/409: reintentar no cambia nada
+        status, error = "FAILED", {"status_code": e.status_code, "detail": e.detail}
+        finished = _finish(job, status, error=error)
+    except Exception as e:
+        logger.exception("PARSE_JOB_FAILED job_id=%s attempt=%s", job["id"], job["attempts"])
+        error = {"status_code": 500, "detail": {"code": f"JOB_ERROR_{e.__class__.__name__}", "message": str(e)[:300]}}
+        if int(job["attempts"]) < int(job["max_attempts"]):
+            status = "QUEUED"
+            finished = _finish(job, status, error=error, retry_in_s=_backoff_s(int(job["attempts"])))
+        else:
+            status = "DEAD"
+            finished = _finish(job, status, error=error)
+    else:
+        status, error = "SUCCEEDED", None
+        finished = _finish(job, status, result=result)
+    finally:
+        stop.set()
+
+    if not finished:
+        # requeue_stale lo devolvió a la cola (o a DEAD) mientras corría: ese estado manda
+        logger.warning("PARSE_JOB_LOCK_LOST job_id=%s discarded_status=%s", job["id"], status)
+        incr("jobs.parse.lock_lost")
+        return "LOCK_LOST"
+
+    incr(f"jobs.parse.{'retried' if status == 'QUEUED' else status.lower()}")
+    _record_outcome(job, status, result if status == "SUCCEEDED" else error)
+    if status != "QUEUED" and job.get("callback_url"):
+        _deliver_callback(job["id"], job["callback_url"])
+    return status
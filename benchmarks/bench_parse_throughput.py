@@ -0,0 +1,192 @@
+"""
+Throughput de extracción (DocumentExtractor, el mismo camino que /parse) contra el stand-in
+local de OpenAI (benchmarks.fake_openai_server), sin tokens ni red.
+
+    python -m benchmarks.bench_parse_throughput
+    python -m benchmarks.bench_parse_throughput --docs 200 --lines 400 --concurrency 16 --latency-ms 800
+    python -m benchmarks.bench_parse_throughput --mode sync --error-rate 0.05 --error-status 429
+    python -m benchmarks.bench_parse_throughput --workload enrich
+
+--workload llm     fuerza el camino LLM completo para TXT (LOCAL_FIRST_MIN_ITEMS alto): chunks,
+                   truncados, merge.
+--workload enrich  local-first + enrich_batches de los items marcados.
+--workload pdf     PDF de texto subido con files.create y extraído por responses.create.
+
+El server corre en un thread de este proceso (uvicorn); OPENAI_BASE_URL apunta a él.
+El cache de respuestas LLM se apaga salvo --llm-cache (si no, después del primer documento todo es hit).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from benchmarks.bench_local_parser import synthetic_lines
+
+
+def _start_server(fake, port: int):
+    import uvicorn
+
+    from benchmarks.fake_openai_server import create_app
+
+    server = uvicorn.Server(uvicorn.Config(create_app(fake), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("fake OpenAI server did not start")
+        time.sleep(0.02)
+    return server
+
+
+def _write_docs(tmp: str, workload: str, docs: int, lines: int) -> List[Tuple[str, str, str]]:
+    out = []
+    for d in range(docs):
+        body = synthetic_lines(lines, seed=d)
+        if workload == "pdf":
+            path = os.path.join(tmp, f"doc{d}.pdf")
+            _write_pdf(path, body)
+            out.append((path, f"doc{d}.pdf", "application/pdf"))
+        else:
+            path = os.path.join(tmp, f"doc{d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(body))
+            out.append((path, f"doc{d}.txt", "text/plain"))
+    return out
+
+
+def _write_pdf(path: str, lines: List[str]) -> None:
+    # PDF mínimo de texto (una página por cada 50 líneas), sin dependencias extra
+    pages = [lines[i:i + 50] for i in range(0, len(lines), 50)] or [[]]
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        esc = [ln.encode("latin-1", "replace").decode("latin-1").replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+               for ln in page]
+        stream = "BT /F1 9 Tf 12 TL 40 800 Td " + " ".join(f"({ln}) '" for ln in esc) + " ET"
+        objs.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objs)} 0 R >>")
+        kids.append(f"{len(objs)} 0 R")
+    objs[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs, start=1):
+        offsets.append(len(data))
+        data += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    data += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(bytes(data))
+
+
+def _configure_env(args, port: int) -> None:
+    os.environ.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "OPENAI_API_KEY": "fake",
+        "OPENAI_ENABLED": "true",
+        "OPENAI_FILE_REUSE_ENABLED": "false",  # sin Postgres en el benchmark
+        "LLM_CACHE_ENABLED": "true" if args.llm_cache else "false",
+        "OPENAI_MAX_ITEMS": str(max(args.lines, 200)),
+    })
+    if args.workload == "enrich":
+        os.environ["OPENAI_ENRICH_ENABLED"] = "true"
+    else:
+        os.environ["LOCAL_FIRST_MIN_ITEMS"] = str(10 ** 9)
+        os.environ["OPENAI_ENRICH_ENABLED"] = "false"
+
+
+async def _run_async(docs, concurrency: int):
+    from app.services.document_extractor import DocumentExtractor
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def _one(doc):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                res = await DocumentExtractor().extract_async(*doc)
+                return (time.perf_counter() - t0) * 1000, len(res.items), res.global_warnings or []
+            except Exception as e:
+                return (time.perf_counter() - t0) * 1000, 0, [f"EXC_{e.__class__.__name__}"]
+
+    return await asyncio.gather(*(_one(d) for d in docs))
+
+
+def _run_sync(docs, concurrency: int):
+    from app.services.document_extractor import DocumentExtractor
+
+    def _one(doc):
+        t0 = time.perf_counter()
+        try:
+            res = DocumentExtractor().extract(*doc)
+            return (time.perf_counter() - t0) * 1000, len(res.items), res.global_warnings or []
+        except Exception as e:
+            return (time.perf_counter() - t0) * 1000, 0, [f"EXC_{e.__class__.__name__}"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(_one, docs))
+
+
+def _pct(values: List[float], p: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workload", choices=("llm", "enrich", "pdf"), default="llm")
+    ap.add_argument("--mode", choices=("async", "sync"), default="async")
+    ap.add_argument("--docs", type=int, default=50)
+    ap.add_argument("--lines", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--latency-ms", type=float, default=300)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--ms-per-token", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--llm-cache", action="store_true")
+    args = ap.parse_args()
+
+    from benchmarks.fake_openai_server import FakeOpenAI
+
+    fake = FakeOpenAI(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, ms_per_token=args.ms_per_token,
+                      error_rate=args.error_rate, error_status=args.error_status)
+    server = _start_server(fake, args.port)
+    _configure_env(args, args.port)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = _write_docs(tmp, args.workload, args.docs, args.lines)
+        t0 = time.perf_counter()
+        if args.mode == "async":
+            results = asyncio.run(_run_async(docs, args.concurrency))
+        else:
+            results = _run_sync(docs, args.concurrency)
+        wall = time.perf_counter() - t0
+
+    server.should_exit = True
+    lat = [r[0] for r in results]
+    failed = sum(1 for r in results if any(w.startswith(("EXC_", "OPENAI_FAILED")) for w in r[2]))
+    print(f"workload={args.workload} mode={args.mode} docs={args.docs} lines/doc={args.lines} "
+          f"concurrency={args.concurrency} latency={args.latency_ms:.0f}±{args.jitter_ms:.0f}ms "
+          f"error_rate={args.error_rate}")
+    print(f"  wall        {wall:8.2f} s")
+    print(f"  throughput  {args.docs / wall:8.2f} docs/s   {args.docs * args.lines / wall:10.0f} lines/s")
+    print(f"  latency     p50 {_pct(lat, 50):8.0f} ms   p95 {_pct(lat, 95):8.0f} ms   max {max(lat):8.0f} ms")
+    print(f"  items       {sum(r[1] for r in results)}   docs_failed {failed}")
+    print(f"  server      {fake.stats}")
+
+
+if __name__ == "__main__":
+    main()
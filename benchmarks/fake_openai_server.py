@@ -0,0 +1,283 @@
+"""
+Stand-in local del subset de la API de OpenAI que usa OpenAIExtractor, para benchmarks y
+pruebas de carga sin gastar tokens (y sin red):
+
+    POST   /v1/files              (files.create, multipart)
+    DELETE /v1/files/{file_id}    (files.delete del cleanup)
+    POST   /v1/responses          (responses.create; json_schema -> ExtractionResult, sin format -> enrich)
+    GET    /fake/stats            (contadores del server)
+
+Las respuestas son determinísticas: salen del parser local sobre el texto del prompt (o del
+texto del PDF subido). Si la salida estimada no cabe en max_output_tokens, la respuesta llega
+cortada con status=incomplete, igual que la real.
+
+    python -m benchmarks.fake_openai_server --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake ...
+
+Inyección por env (o por argumentos de create_app):
+    FAKE_OPENAI_LATENCY_MS      latencia base por response (default 300)
+    FAKE_OPENAI_JITTER_MS       +- uniforme sobre la latencia (default 100)
+    FAKE_OPENAI_MS_PER_TOKEN    latencia extra por token de salida (default 0)
+    FAKE_OPENAI_ERROR_RATE      fracción de responses que fallan (default 0)
+    FAKE_OPENAI_ERROR_STATUS    status de esos fallos (default 500; 429 para rate limit)
+    FAKE_OPENAI_SEED            semilla de latencia/errores (default 7)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from starlette.responses import JSONResponse
+
+from app.services.local_fallback_parser import fallback_txt_lines_to_extraction
+from app.services.token_budget import estimate_tokens
+
+_PROMPT_MARKERS = ("TEXTO:\n", "TABLA:\n")
+_ENRICH_ITEMS_RE = re.compile(r"ÍTEMS PARSEADOS \(JSON\):\n(.*?)\n\n", flags=re.DOTALL)
+_JSON_PUNCT_RE = re.compile(r'[{}\[\]":,]+')
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _output_tokens(out_text: str) -> int:
+    # el BPE real junta la puntuación del JSON ('": "', '"},{"'): cada racha cuenta como 1 token
+    return estimate_tokens(_JSON_PUNCT_RE.sub(" ", out_text)) + len(_JSON_PUNCT_RE.findall(out_text))
+
+
+def _pdf_text(data: bytes) -> str:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    return "\n".join((page.extract_text() or "") for page in reader.pages)
+
+
+def _extraction_output(text: str, source_type: str, model: str) -> Dict[str, Any]:
+    res = fallback_txt_lines_to_extraction(text)
+    items = [
+        {
+            "line_index": int(it.line_index),
+            "raw_text": it.raw_text,
+            "description": it.description,
+            "quantity": float(it.quantity),
+            "uom": it.uom.value if hasattr(it.uom, "value") else str(it.uom),
+            "uom_raw": it.uom_raw,
+            "confidence": float(it.confidence),
+            "warnings_json": list(it.warnings or []) or None,
+        }
+        for it in res.items
+    ]
+    return {
+        "items": items,
+        "global_warnings": [],
+        "meta": {"source_type": source_type, "extractor": "openai", "model": model},
+    }
+
+
+def _enrich_output(prompt: str) -> List[Dict[str, Any]]:
+    m = _ENRICH_ITEMS_RE.search(prompt)
+    try:
+        items = json.loads(m.group(1)) if m else []
+    except json.JSONDecodeError:
+        items = []
+    return [
+        {
+            "line_index": it.get("line_index"),
+            "description": it.get("description"),
+            "quantity": it.get("quantity"),
+            "uom": it.get("uom"),
+            "confidence": max(float(it.get("confidence") or 0), 0.9),
+            "warnings": ["OPENAI_ENRICHED"],
+        }
+        for it in items
+        if isinstance(it, dict)
+    ]
+
+
+class FakeOpenAI:
+    """Estado del server: archivos subidos, contadores y RNG de latencia/errores."""
+
+    def __init__(
+        self,
+        latency_ms: Optional[float] = None,
+        jitter_ms: Optional[float] = None,
+        ms_per_token: Optional[float] = None,
+        error_rate: Optional[float] = None,
+        error_status: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency_ms = _env_float("FAKE_OPENAI_LATENCY_MS", 300) if latency_ms is None else latency_ms
+        self.jitter_ms = _env_float("FAKE_OPENAI_JITTER_MS", 100) if jitter_ms is None else jitter_ms
+        self.ms_per_token = _env_float("FAKE_OPENAI_MS_PER_TOKEN", 0) if ms_per_token is None else ms_per_token
+        self.error_rate = _env_float("FAKE_OPENAI_ERROR_RATE", 0) if error_rate is None else error_rate
+        self.error_status = int(os.getenv("FAKE_OPENAI_ERROR_STATUS", "500")) if error_status is None else error_status
+        self.rnd = random.Random(int(os.getenv("FAKE_OPENAI_SEED", "7")) if seed is None else seed)
+        self.files: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "responses": 0, "responses_incomplete": 0, "errors_injected": 0,
+            "files_uploaded": 0, "files_deleted": 0, "input_tokens": 0, "output_tokens": 0,
+        }
+
+    def _count(self, **inc: int) -> None:
+        with self.lock:
+            for k, v in inc.items():
+                self.stats[k] = self.stats.get(k, 0) + v
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self.lock:
+            latency = self.latency_ms + self.rnd.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self.rnd.random() < self.error_rate
+        return max(latency, 0.0), fail
+
+    def _answer(self, body: Dict[str, Any]) -> Tuple[str, int]:
+        """(output_text, tokens de entrada estimados) para el request."""
+        model = str(body.get("model") or "fake")
+        texts: List[str] = []
+        file_text: Optional[str] = None
+        image = False
+        for msg in body.get("input") or []:
+            content = msg.get("content")
+            parts = [{"type": "input_text", "text": content}] if isinstance(content, str) else (content or [])
+            for part in parts:
+                kind = part.get("type")
+                if kind == "input_text":
+                    texts.append(part.get("text") or "")
+                elif kind == "input_file":
+                    data = self.files.get(part.get("file_id"))
+                    file_text = _pdf_text(data) if data else ""
+                elif kind == "input_image":
+                    image = True
+        prompt = "\n".join(texts)
+        tokens_in = estimate_tokens(prompt) + (estimate_tokens(file_text) if file_text else 0)
+
+        fmt = ((body.get("text") or {}).get("format") or {}).get("type")
+        if fmt != "json_schema":
+            return json.dumps(_enrich_output(prompt), ensure_ascii=False), tokens_in
+
+        if file_text is not None:
+            source_type, doc = "pdf", file_text
+        elif image:
+            source_type, doc = "image", ""  # sin OCR: el stand-in no ve imágenes
+        else:
+            source_type, doc = "txt", prompt
+            for marker in _PROMPT_MARKERS:
+                if marker in prompt:
+                    source_type = "table" if marker == "TABLA:\n" else "txt"
+                    doc = prompt.split(marker, 1)[1]
+                    break
+        return json.dumps(_extraction_output(doc, source_type, model), ensure_ascii=False), tokens_in
+
+    async def respond(self, body: Dict[str, Any]) -> JSONResponse:
+        latency_ms, fail = self._draw()
+        if fail:
+            await asyncio.sleep(latency_ms / 1000 / 4)
+            self._count(errors_injected=1)
+            return JSONResponse(
+                status_code=self.error_status,
+                content={"error": {"message": "injected failure", "type": "server_error", "code": None}},
+            )
+
+        out_text, tokens_in = await asyncio.to_thread(self._answer, body)
+        tokens_out = _output_tokens(out_text)
+        max_out = int(body.get("max_output_tokens") or 0)
+        status, incomplete = "completed", None
+        if max_out and tokens_out > max_out:
+            # corta la salida en proporción, como cuando el modelo llega a max_output_tokens
+            out_text = out_text[: max(1, len(out_text) * max_out // tokens_out)]
+            tokens_out = max_out
+            status, incomplete = "incomplete", {"reason": "max_output_tokens"}
+
+        await asyncio.sleep((latency_ms + tokens_out * self.ms_per_token) / 1000)
+        self._count(responses=1, responses_incomplete=int(status == "incomplete"),
+                    input_tokens=tokens_in, output_tokens=tokens_out)
+        return JSONResponse(content={
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": status,
+            "incomplete_details": incomplete,
+            "error": None,
+            "model": body.get("model"),
+            "temperature": body.get("temperature"),
+            "max_output_tokens": body.get("max_output_tokens"),
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "output": [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex}",
+                "status": status,
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": out_text, "annotations": []}],
+            }],
+            "usage": {
+                "input_tokens": tokens_in,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": tokens_out,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": tokens_in + tokens_out,
+            },
+        })
+
+
+def create_app(fake: Optional[FakeOpenAI] = None) -> FastAPI:
+    fake = fake or FakeOpenAI()
+    api = FastAPI(title="fake-openai")
+    api.state.fake = fake
+
+    @api.post("/v1/files")
+    async def files_create(file: UploadFile = File(...), purpose: str = Form("user_data")):
+        data = await file.read()
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        fake.files[file_id] = data
+        fake._count(files_uploaded=1)
+        return {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": file.filename or "upload", "purpose": purpose, "status": "processed",
+        }
+
+    @api.delete("/v1/files/{file_id}")
+    async def files_delete(file_id: str):
+        deleted = fake.files.pop(file_id, None) is not None
+        if not deleted:
+            return JSONResponse(status_code=404, content={"error": {
+                "message": f"No such File object: {file_id}", "type": "invalid_request_error", "code": None}})
+        fake._count(files_deleted=1)
+        return {"id": file_id, "object": "file", "deleted": True}
+
+    @api.post("/v1/responses")
+    async def responses_create(request: Request):
+        return await fake.respond(await request.json())
+
+    @api.get("/fake/stats")
+    async def stats():
+        with fake.lock:
+            return {**fake.stats, "files_stored": len(fake.files)}
+
+    return api
+
+
+def main() -> None:
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
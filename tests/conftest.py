@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_llm_cache(monkeypatch, tmp_path):
+    # cada test con su propio cache de respuestas: los fakes de OpenAI no deben verse entre sí
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
@@ -0,0 +1,72 @@
+"""extract() and extract_async() share one step generator and must agree."""
+from __future__ import annotations
+
+import asyncio
+
+from app.schemas.extraction import ExtractedItem, ExtractionResult
+from app.services.document_extractor import DocumentExtractor
+
+RFQ = "Solicitud de cotizacion\nfavor cotizar lo siguiente\n"
+
+
+def _llm_result(text: str) -> ExtractionResult:
+    return ExtractionResult(
+        items=[ExtractedItem(line_index=0, raw_text="cable", description="CABLE THHN 12", quantity=100, uom="M")],
+        global_warnings=[],
+        meta={"extractor": "openai"},
+    )
+
+
+class _FakeSync:
+    def __init__(self, progress=None):
+        self.progress = progress
+
+    def normalize_from_text(self, text):
+        return _llm_result(text)
+
+
+class _FakeAsync:
+    def __init__(self, progress=None):
+        self.progress = progress
+
+    async def normalize_from_text(self, text):
+        await asyncio.sleep(0)
+        return _llm_result(text)
+
+
+class _FailingAsync:
+    def __init__(self, progress=None):
+        self.progress = progress
+
+    async def normalize_from_text(self, text):
+        raise TimeoutError("llm timeout")
+
+
+def _setup(monkeypatch, tmp_path, async_cls):
+    monkeypatch.setenv("OPENAI_ENABLED", "true")
+    monkeypatch.setenv("LOCAL_FIRST_MIN_ITEMS", "999")
+    monkeypatch.setattr("app.services.openai_extractor.OpenAIExtractor", _FakeSync)
+    monkeypatch.setattr("app.services.openai_extractor.AsyncOpenAIExtractor", async_cls)
+    src = tmp_path / "rfq.txt"
+    src.write_text(RFQ, encoding="utf-8")
+    return str(src)
+
+
+def test_async_and_sync_paths_agree(monkeypatch, tmp_path):
+    path = _setup(monkeypatch, tmp_path, _FakeAsync)
+    ext = DocumentExtractor()
+
+    sync_res = ext.extract(path, "rfq.txt", None)
+    async_res = asyncio.run(ext.extract_async(path, "rfq.txt", None))
+
+    assert [it.description for it in async_res.items] == [it.description for it in sync_res.items] == ["CABLE THHN 12"]
+    assert async_res.meta["extractor"] == "openai"
+
+
+def test_async_llm_error_is_thrown_into_fallback_branch(monkeypatch, tmp_path):
+    path = _setup(monkeypatch, tmp_path, _FailingAsync)
+
+    res = asyncio.run(DocumentExtractor().extract_async(path, "rfq.txt", None))
+
+    assert "OPENAI_FAILED" in res.global_warnings
+    assert "OPENAI_ERROR_TimeoutError" in res.global_warnings
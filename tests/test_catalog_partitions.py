@@ -0,0 +1,87 @@
+"""Chequeo de partition pruning: EXPLAIN sobre las queries reales de search y matching."""
+from __future__ import annotations
+
+import json
+
+from app.api.routes_catalog import _SQL_SEARCH
+from app.services import catalog_partitions
+
+
+class _Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+    def scalars(self):
+        return self
+
+    def all(self):
+        return self.value
+
+
+class _Conn:
+    """EXPLAIN devuelve un plan que toca `touched` particiones; registra el SQL explicado."""
+
+    def __init__(self, touched):
+        self.touched = touched
+        self.explained = []
+
+    def execute(self, stmt, params=None):
+        sql = str(stmt)
+        if "pg_inherits" in sql:
+            return _Result(["catalog_products_o_a", "catalog_products_o_b", "catalog_products_default"])
+        self.explained.append((sql, params))
+        plan = {"Node Type": "Append", "Subplans Removed": 2,
+                "Plans": [{"Node Type": "Seq Scan", "Relation Name": r} for r in self.touched]}
+        return _Result(json.dumps([{"Plan": plan}]))
+
+
+def test_check_uses_catalog_search_sql_and_reports_pruning():
+    conn = _Conn(["catalog_products_o_a"])
+    report = catalog_partitions.check_partition_pruning(conn, "org_a", q="cable thhn")
+
+    assert report["ok"] and set(report["queries"]) == {"search", "recall", "batch_lateral"}
+    search_sql, params = conn.explained[0]
+    assert search_sql == "EXPLAIN (FORMAT JSON) " + _SQL_SEARCH
+    assert "ts_rank" in search_sql and params["limit"] == 5
+
+
+def test_check_fails_when_several_partitions_are_scanned():
+    report = catalog_partitions.check_partition_pruning(_Conn(["catalog_products_o_a", "catalog_products_default"]), "org_a")
+
+    assert not report["ok"]
+    assert report["queries"]["search"]["partitions_scanned"] == ["catalog_products_default", "catalog_products_o_a"]
+
+
+def _migration(monkeypatch, table_exists):
+    import importlib.util
+    from pathlib import Path
+
+    path = Path(__file__).resolve().parents[1] / "alembic/versions/d7a3c5e81b42_partition_catalog_products_by_org.py"
+    spec = importlib.util.spec_from_file_location("mig_d7a3c5e81b42", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    executed = []
+    monkeypatch.setattr(mod, "op", type("Op", (), {"execute": staticmethod(lambda sql: executed.append(" ".join(str(sql).split())))})())
+    monkeypatch.setattr(mod, "_table_exists", lambda name: table_exists)
+    return mod, executed
+
+
+def test_migration_creates_partitioned_table_on_fresh_db(monkeypatch):
+    mod, executed = _migration(monkeypatch, table_exists=False)
+    mod.upgrade()
+
+    assert not any("RENAME" in sql or "catalog_products_legacy" in sql for sql in executed)
+    assert any(sql.startswith("CREATE TABLE catalog_products ( org_id text NOT NULL") for sql in executed)
+    assert "CREATE EXTENSION IF NOT EXISTS pg_trgm" in executed
+
+
+def test_migration_copies_and_drops_legacy(monkeypatch):
+    monkeypatch.delenv("CATALOG_KEEP_LEGACY", raising=False)
+    mod, executed = _migration(monkeypatch, table_exists=True)
+    mod.upgrade()
+
+    assert "ALTER TABLE catalog_products RENAME TO catalog_products_legacy" in executed
+    assert executed[-1] == "DROP TABLE catalog_products_legacy"
@@ -0,0 +1,111 @@
+"""Conversión de SQL estilo text() (':name') al paramstyle de psycopg para execute_prepared."""
+from __future__ import annotations
+
+from app.db_engine import _to_pyformat
+
+
+def test_named_params_become_pyformat():
+    assert _to_pyformat("SELECT * FROM t WHERE org_id = :org_id AND code=:code") == (
+        "SELECT * FROM t WHERE org_id = %(org_id)s AND code=%(code)s"
+    )
+
+
+def test_casts_are_kept():
+    sql = "SELECT unnest(:line_indexes ::int[]), unnest(:qs::text[]), ''::tsvector, x::numeric(10,2)"
+    assert _to_pyformat(sql) == (
+        "SELECT unnest(%(line_indexes)s ::int[]), unnest(%(qs)s::text[]), ''::tsvector, x::numeric(10,2)"
+    )
+
+
+def test_percent_is_escaped():
+    assert _to_pyformat("SELECT * FROM t WHERE name ILIKE '%cable%' AND org_id=:org") == (
+        "SELECT * FROM t WHERE name ILIKE '%%cable%%' AND org_id=%(org)s"
+    )
+
+
+class _FakePsycopg:
+    """driver_connection con el cache de psycopg: prepare=True registra un nombre nuevo la primera vez."""
+
+    prepare_threshold = 5
+
+    def __init__(self, prepared_max=10):
+        from collections import OrderedDict
+        self._prepared = type("PM", (), {"_names": OrderedDict()})()
+        self.prepared_max = prepared_max
+        self.seq = 0
+
+    def execute(self, sql, prepare):
+        names = self._prepared._names
+        if sql in names:
+            names.move_to_end(sql)
+            return
+        names[sql] = f"_pg3_{self.seq}".encode()
+        self.seq += 1
+        if len(names) > self.prepared_max:
+            names.popitem(last=False)
+
+
+class _FakeCursor:
+    description = [("id",)]
+
+    def __init__(self, driver):
+        self.driver = driver
+
+    def execute(self, sql, params, prepare):
+        self.driver.execute(sql, prepare)
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def _sa_conn(driver):
+    pooled = type("Pooled", (), {"driver_connection": driver, "cursor": lambda self: _FakeCursor(driver)})()
+    return type("Conn", (), {"connection": pooled})()
+
+
+def _counters():
+    from app.observability import metrics_snapshot
+    return metrics_snapshot()["counters"]
+
+
+def _delta(before, key):
+    return _counters().get(key, 0) - before.get(key, 0)
+
+
+def test_prepare_hits_and_misses_follow_the_connection_cache(monkeypatch):
+    from app.db_engine import execute_prepared, prepare_stats
+
+    monkeypatch.setenv("PG_PREPARED_STATEMENTS", "true")
+    driver = _FakePsycopg(prepared_max=1)
+    conn = _sa_conn(driver)
+    before = _counters()
+
+    assert execute_prepared(conn, "t_a", "SELECT id FROM a WHERE x = :x", {"x": 1}) == [{"id": 1}]
+    execute_prepared(conn, "t_a", "SELECT id FROM a WHERE x = :x", {"x": 2})
+    # otro statement desaloja al primero (prepared_max=1): volver a usarlo es PREPARE otra vez
+    execute_prepared(conn, "t_b", "SELECT id FROM b", {})
+    execute_prepared(conn, "t_a", "SELECT id FROM a WHERE x = :x", {"x": 3})
+
+    assert _delta(before, "sql.prepare.hit.t_a") == 1
+    assert _delta(before, "sql.prepare.miss.t_a") == 2
+    assert _delta(before, "sql.prepare.miss.t_b") == 1
+    stats = prepare_stats()
+    assert stats["hits"] >= 1 and stats["misses"] >= 3 and stats["hit_rate"] is not None
+
+    # cada conexión del pool tiene su propio cache: en una nueva el primer uso es miss
+    before = _counters()
+    execute_prepared(_sa_conn(_FakePsycopg()), "t_a", "SELECT id FROM a WHERE x = :x", {"x": 1})
+    assert _delta(before, "sql.prepare.miss.t_a") == 1
+
+
+def test_psycopg_still_exposes_its_prepared_cache():
+    # execute_prepared lee PrepareManager._names (interno): si psycopg lo cambia, este test avisa
+    from psycopg._preparing import PrepareManager
+
+    from app.db_engine import _prepared_names
+
+    driver = type("D", (), {"_prepared": PrepareManager()})()
+    assert _prepared_names(driver) == frozenset()
@@ -0,0 +1,42 @@
+"""Extraction cache keys and degradation when the cache is unavailable."""
+from __future__ import annotations
+
+from app.schemas.extraction import ExtractionResult
+from app.services.document_extractor import DocumentExtractor
+from app.services.extraction_cache import (
+    _cacheable,
+    cache_key,
+    extract_cached,
+    extractor_fingerprint,
+)
+
+
+class _BrokenEngine:
+    def begin(self):
+        raise RuntimeError("db down")
+
+
+def test_cache_key_depends_on_config(monkeypatch):
+    fp1 = extractor_fingerprint(DocumentExtractor())
+    monkeypatch.setenv("OPENAI_MODEL_EXTRACTOR", "otro-modelo")
+    fp2 = extractor_fingerprint(DocumentExtractor())
+
+    assert cache_key("abc", "txt", fp1) == cache_key("abc", "txt", dict(fp1))
+    assert cache_key("abc", "txt", fp1) != cache_key("abc", "txt", fp2)
+    assert cache_key("abc", "txt", fp1) != cache_key("abc", "pdf", fp1)
+
+
+def test_transient_openai_failures_are_not_cached():
+    assert _cacheable(ExtractionResult(items=[], global_warnings=["LOCAL_FIRST_USED"]))
+    assert not _cacheable(ExtractionResult(items=[], global_warnings=["OPENAI_FAILED", "FALLBACK_LOCAL_USED"]))
+
+
+def test_cache_errors_fall_back_to_plain_extract(tmp_path):
+    src = tmp_path / "rfq.txt"
+    src.write_text("10 und breaker 2x40\n5 m cable thhn 12\n", encoding="utf-8")
+
+    res, info = extract_cached(_BrokenEngine(), DocumentExtractor(), str(src), "rfq.txt", None)
+
+    assert len(res.items) == 2
+    assert info["hit"] is False and info["error"] == "RuntimeError"
+    assert res.meta["cache"] is info
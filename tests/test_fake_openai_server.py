@@ -0,0 +1,59 @@
+"""The local Responses/Files stand-in must speak the subset OpenAIExtractor relies on."""
+from __future__ import annotations
+
+import openai
+import pytest
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+from app.services.openai_extractor import OpenAIExtractor
+from benchmarks.fake_openai_server import FakeOpenAI, create_app
+
+
+def _client(fake: FakeOpenAI) -> OpenAI:
+    return OpenAI(api_key="fake", base_url="http://testserver/v1", max_retries=0,
+                  http_client=TestClient(create_app(fake)))
+
+
+def _extractor(monkeypatch, fake: FakeOpenAI) -> OpenAIExtractor:
+    client = _client(fake)
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: client)
+    return OpenAIExtractor()
+
+
+def test_text_extraction_round_trip(monkeypatch):
+    fake = FakeOpenAI(latency_ms=0, jitter_ms=0)
+    ex = _extractor(monkeypatch, fake)
+
+    res = ex.normalize_from_text("CABLE THHN 12 AWG 100 m\ncinta aislante 3M 5 und\nSubtotal 584,200.00")
+
+    assert [(it.line_index, it.quantity) for it in res.items] == [(0, 100), (1, 5)]
+    assert fake.stats["responses"] == 1 and fake.stats["input_tokens"] > 0
+
+
+def test_enrich_and_files(monkeypatch):
+    fake = FakeOpenAI(latency_ms=0, jitter_ms=0)
+    ex = _extractor(monkeypatch, fake)
+
+    out = ex.enrich_items([{"line_index": 3, "description": "cable", "quantity": 2, "uom": "M", "confidence": 0.4}], "[3] cable")
+    assert out[0]["confidence"] == 0.9 and "OPENAI_ENRICHED" in out[0]["warnings"]
+
+    f = ex.client.files.create(file=("a.pdf", b"%PDF-1.4"), purpose="user_data")
+    assert f.id in fake.files
+    ex.client.files.delete(f.id)
+    assert fake.stats["files_deleted"] == 1
+
+
+def test_error_injection_and_truncation(monkeypatch):
+    client = _client(FakeOpenAI(latency_ms=0, jitter_ms=0, error_rate=1.0, error_status=429))
+    with pytest.raises(openai.RateLimitError):
+        client.responses.create(model="m", input="hola")
+
+    fake = FakeOpenAI(latency_ms=0, jitter_ms=0)
+    resp = _client(fake).responses.create(
+        model="m", max_output_tokens=20,
+        input=[{"role": "user", "content": [{"type": "input_text",
+                                             "text": "TEXTO:\n" + "\n".join(f"cable {i} 10 m" for i in range(30))}]}],
+        text={"format": {"type": "json_schema", "name": "x", "schema": {}, "strict": True}},
+    )
+    assert resp.status == "incomplete" and fake.stats["responses_incomplete"] == 1
@@ -0,0 +1,59 @@
+"""Vision uploads are oriented, cropped, downscaled and recompressed before the data URL."""
+from __future__ import annotations
+
+import io
+
+from PIL import Image, ImageDraw
+
+from app.services import image_preprocess
+from app.services.image_preprocess import preprocess_image
+
+
+def _photo(w: int = 4000, h: int = 3000, orientation: int = 1) -> bytes:
+    # hoja blanca con texto en el centro, sobre "mesa" gris: como una foto de celular
+    img = Image.new("RGB", (w, h), (90, 90, 90))
+    d = ImageDraw.Draw(img)
+    d.rectangle((w // 4, h // 4, 3 * w // 4, 3 * h // 4), fill=(250, 250, 250))
+    for i in range(10):
+        y = h // 4 + 40 + i * 60
+        d.line((w // 4 + 40, y, 3 * w // 4 - 40, y), fill=(0, 0, 0), width=6)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=95, exif=exif)
+    return out.getvalue()
+
+
+def test_large_photo_is_shrunk_and_reports_savings():
+    raw = _photo()
+    out, mime, meta = preprocess_image(raw, "image/jpeg")
+
+    assert meta["applied"] and meta["bytes_saved"] == len(raw) - len(out) > 0
+    img = Image.open(io.BytesIO(out))
+    assert img.mode == "L" and mime == "image/jpeg"
+    assert min(img.size) <= 768 and max(img.size) <= 2048
+    assert meta["cropped"]
+
+
+def test_exif_rotation_and_cache(monkeypatch):
+    monkeypatch.setenv("IMAGE_FORMAT", "webp")
+    monkeypatch.setenv("IMAGE_CROP_ENABLED", "false")
+    raw = _photo(1200, 800, orientation=6)  # 6 = girar 90°
+
+    out, mime, meta = preprocess_image(raw, "image/jpeg")
+    assert mime == "image/webp" and meta["oriented"] and not meta["cache_hit"]
+    w, h = Image.open(io.BytesIO(out)).size
+    assert h > w
+
+    again = preprocess_image(raw, "image/jpeg")
+    assert again[0] == out and again[2]["cache_hit"]
+
+
+def test_disabled_or_broken_input_passes_through(monkeypatch):
+    out, mime, meta = preprocess_image(b"not an image", "image/png")
+    assert (out, mime, meta["applied"]) == (b"not an image", "image/png", False)
+
+    monkeypatch.setenv("IMAGE_PREPROCESS_ENABLED", "false")
+    raw = _photo(400, 300)
+    assert preprocess_image(raw, "image/jpeg")[0] == raw
+    assert image_preprocess.preprocess_config()["enabled"] is False
@@ -0,0 +1,74 @@
+"""Jobs in-process: validación de callback_url, acceso acotado a GET /v1/jobs y reconciliación al arrancar."""
+from __future__ import annotations
+
+import os
+import socket
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.routes_jobs import router as jobs_router
+from app.services import jobs
+
+
+def _resolves_to(monkeypatch, *ips):
+    monkeypatch.setattr(jobs.socket, "getaddrinfo", lambda host, port: [(2, 1, 6, "", (ip, port)) for ip in ips])
+
+
+def _code(url):
+    with pytest.raises(HTTPException) as e:
+        jobs.validate_callback_url(url)
+    return e.value.detail["code"]
+
+
+def test_callback_url_needs_allowlisted_public_host(monkeypatch):
+    monkeypatch.setenv("JOB_CALLBACK_ALLOWED_HOSTS", "hooks.cliente.com,*.erp.co")
+    _resolves_to(monkeypatch, "93.184.216.34", "8.8.8.8")
+
+    assert jobs.validate_callback_url(" https://hooks.cliente.com/cb ") == "https://hooks.cliente.com/cb"
+    assert jobs.validate_callback_url("http://a.erp.co/x") == "http://a.erp.co/x"
+    assert jobs.validate_callback_url(None) is None
+    assert _code("ftp://hooks.cliente.com/cb") == "INVALID_CALLBACK_URL"
+    assert _code("https://otro.com/cb") == "CALLBACK_URL_NOT_ALLOWED"
+    assert _code("https://user:pw@hooks.cliente.com/cb") == "CALLBACK_URL_NOT_ALLOWED"
+
+
+@pytest.mark.parametrize("ip", ["127.0.0.1", "10.1.2.3", "169.254.169.254", "192.168.0.5", "::1", "::ffff:10.0.0.1"])
+def test_callback_url_refuses_private_ips(monkeypatch, ip):
+    monkeypatch.setenv("JOB_CALLBACK_ALLOWED_HOSTS", "hooks.cliente.com")
+    _resolves_to(monkeypatch, "8.8.8.8", ip)
+
+    assert _code("https://hooks.cliente.com/cb") == "CALLBACK_URL_NOT_ALLOWED"
+
+
+def test_callbacks_disabled_without_allowlist(monkeypatch):
+    monkeypatch.delenv("JOB_CALLBACK_ALLOWED_HOSTS", raising=False)
+    _resolves_to(monkeypatch, "8.8.8.8")
+
+    assert _code("https://hooks.cliente.com/cb") == "CALLBACK_URL_NOT_ALLOWED"
+
+
+def test_get_job_requires_matching_draft_and_org(monkeypatch):
+    row = {"id": "job_1", "kind": "match", "draft_id": "d1", "status": "SUCCEEDED",
+           "request_json": {"org_id": "org_a"}, "result_json": {"ok": True}}
+    monkeypatch.setattr(jobs, "_get_row", lambda job_id: dict(row) if job_id == "job_1" else None)
+    app = FastAPI()
+    app.include_router(jobs_router)
+    client = TestClient(app)
+
+    assert client.get("/v1/jobs/job_1").status_code == 404
+    assert client.get("/v1/jobs/job_1?draft_id=d1", headers={"X-Org-Id": "org_b"}).status_code == 404
+    r = client.get("/v1/jobs/job_1?draft_id=d1", headers={"X-Org-Id": "org_a"})
+    assert r.status_code == 200 and r.json()["result"] == {"ok": True}
+    assert jobs.poll_url("job_1", "d1") == "/v1/jobs/job_1?draft_id=d1"
+
+
+def test_owner_is_dead():
+    host = socket.gethostname()
+    assert not jobs.owner_is_dead(jobs._INSTANCE_ID)
+    assert jobs.owner_is_dead(f"{host}:{os.getpid()}:01OTROARRANQUE")  # mismo pid, proceso anterior
+    assert jobs.owner_is_dead(f"{host}:999999999:x")
+    assert not jobs.owner_is_dead(f"{host}:{os.getppid()}:x")  # vivo
+    assert not jobs.owner_is_dead("otro-host:1:x")  # otro host: solo por antigüedad
+    assert jobs.owner_is_dead(None)
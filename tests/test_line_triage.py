@@ -0,0 +1,92 @@
+"""Pre-LLM triage: totals and noise never reach the prompt; line_index stays on the original text."""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+from app.services.line_triage import select_for_llm, triage_line, triage_lines
+from app.services.openai_extractor import OpenAIExtractor
+
+RFQ = [
+    "Solicitud de cotizacion",
+    "MATERIALES ELÉCTRICOS",
+    "CABLE THHN 12 AWG 100 m",
+    "Varilla copperweld",
+    "tela asfáltica 2 rollos",
+    "Subtotal 584,200.00",
+    "IVA 19% 111,000",
+    "Total a pagar 695,200",
+    "Atentamente,",
+    "Tel: 300 123 4567",
+    "compras@acme.com",
+]
+
+
+def test_labels():
+    assert triage_lines(RFQ) == [
+        "noise", "section", "item", "item", "item", "totals", "totals", "totals", "noise", "noise", "noise",
+    ]
+
+
+def test_noise_prefix_with_real_qty_and_unit_is_item():
+    assert triage_line("Estimado cliente: cable 12 AWG 100 m") == "item"
+    assert triage_line("Fecha entrega: tubo PVC 2 und") == "item"
+    assert triage_line("Total cable 12 AWG 300 m") == "item"
+    assert triage_line("Fecha: 12/03/2026") == "noise"
+    assert triage_line("NIT 900.123.456-7") == "noise"
+
+
+def test_bare_quantities_are_kept():
+    assert triage_line("100") == "item"
+    assert triage_line("12.5") == "item"
+    assert triage_line("-----") == "noise"
+
+
+def test_noise_next_to_an_item_goes_as_context():
+    lines = ["Atentamente,", "Buenos días", "ver referencia:", "Varilla copperweld", "Subtotal 584,200.00", "Tel: 300 123 4567"]
+    sent, idx, meta = select_for_llm(lines)
+
+    assert idx == [2, 3]
+    assert sent == ["ver referencia:", "Varilla copperweld"]
+    assert meta["context_lines"] == 0
+
+    sent, idx, meta = select_for_llm(["Solicitud de cotizacion", "Cordialmente nota", "cable 12 AWG 100 m", "Gracias", "Tel: 300"])
+    assert idx == [1, 2, 3]
+    assert meta["context_lines"] == 2
+
+
+class _EchoResponses:
+    """Un item por línea del prompt, con line_index relativo a lo que recibió el modelo."""
+
+    def __init__(self) -> None:
+        self.prompts = []
+
+    def create(self, **kwargs):
+        prompt = kwargs["input"][1]["content"][0]["text"]
+        self.prompts.append(prompt)
+        lines = prompt.split("TEXTO:\n", 1)[1].splitlines()
+        items = [{"line_index": i, "raw_text": l, "description": l, "quantity": 1, "uom": "UND"} for i, l in enumerate(lines)]
+        return SimpleNamespace(output_text=json.dumps({"items": items, "global_warnings": [], "meta": {}}))
+
+
+def test_only_items_and_sections_are_sent(monkeypatch):
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_EchoResponses()))
+    ex = OpenAIExtractor()
+
+    res = ex.normalize_from_text("\n".join(RFQ))
+
+    sent = ex.client.responses.prompts[0]
+    assert "Subtotal" not in sent and "Atentamente" not in sent and "CABLE THHN" in sent
+    assert [(it.line_index, it.raw_text) for it in res.items] == [(i, RFQ[i]) for i in (1, 2, 3, 4)]
+    assert res.meta["triage"]["lines_sent"] == 4
+    assert res.meta["triage"]["est_tokens_saved"] > 0
+
+
+def test_triage_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("OPENAI_TRIAGE_ENABLED", "false")
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_EchoResponses()))
+
+    res = OpenAIExtractor().normalize_from_text("\n".join(RFQ))
+
+    assert len(res.items) == len(RFQ)
+    assert "triage" not in res.meta
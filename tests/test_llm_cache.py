@@ -0,0 +1,109 @@
+"""Identical prompts must hit the LLM response cache instead of the API."""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+from app.services import llm_cache
+from app.services.openai_extractor import OpenAIExtractor
+
+
+class _CountingResponses:
+    def __init__(self, status: str = "completed") -> None:
+        self.calls = 0
+        self.status = status
+
+    def create(self, **kwargs):
+        self.calls += 1
+        prompt = kwargs["input"][1]["content"][0]["text"]
+        lines = [l for l in prompt.splitlines() if l.startswith("ITEM ")]
+        items = [
+            {"line_index": i, "raw_text": l, "description": l, "quantity": 1, "uom": "UND"}
+            for i, l in enumerate(lines)
+        ]
+        return SimpleNamespace(output_text=json.dumps({"items": items, "global_warnings": [], "meta": {}}),
+                               status=self.status)
+
+
+def _extractor(monkeypatch, fake) -> OpenAIExtractor:
+    monkeypatch.setenv("OPENAI_TRIAGE_ENABLED", "false")
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=fake))
+    return OpenAIExtractor()
+
+
+def test_identical_text_is_served_from_cache(monkeypatch):
+    fake = _CountingResponses()
+    text = "\n".join(f"ITEM {i} cable" for i in range(5))
+
+    first = _extractor(monkeypatch, fake).normalize_from_text(text)
+    second = _extractor(monkeypatch, fake).normalize_from_text(text)
+
+    assert fake.calls == 1
+    assert [it.raw_text for it in second.items] == [it.raw_text for it in first.items]
+    stats = llm_cache.stats()
+    assert stats["entries"] == 1 and stats["hits"] >= 1
+
+    _extractor(monkeypatch, fake).normalize_from_text(text + "\nITEM 5 cable")
+    assert fake.calls == 2
+
+
+def test_disabled_cache_and_incomplete_responses_skip_store(monkeypatch):
+    fake = _CountingResponses(status="incomplete")
+    ex = _extractor(monkeypatch, fake)
+    ex.normalize_from_text("ITEM 0 cable")
+    ex.normalize_from_text("ITEM 0 cable")
+    assert fake.calls == 2
+
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "false")
+    fake = _CountingResponses()
+    ex = _extractor(monkeypatch, fake)
+    ex.normalize_from_text("ITEM 0 cable")
+    ex.normalize_from_text("ITEM 0 cable")
+    assert fake.calls == 2
+
+
+def test_lru_eviction_keeps_recently_used(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_MAX_ENTRIES", "3")
+    keys = [llm_cache.request_key({"model": "m", "input": f"p{i}", "temperature": 0}) for i in range(4)]
+
+    for k in keys[:3]:
+        llm_cache.put(k, "x")
+    assert llm_cache.get(keys[0]) == "x"  # el más viejo pasa a ser el más reciente
+    llm_cache.put(keys[3], "x")
+
+    assert llm_cache.get(keys[0]) == "x"
+    assert llm_cache.get(keys[1]) is None
+    assert llm_cache.request_key({"model": "m", "input": "p", "temperature": 0.7}) is None
+
+
+def test_malformed_json_is_not_cached(monkeypatch):
+    class _Broken(_CountingResponses):
+        def create(self, **kwargs):
+            self.calls += 1
+            return SimpleNamespace(output_text='{"items": [oops', status="completed")
+
+    fake = _Broken()
+    ex = _extractor(monkeypatch, fake)
+    ex.normalize_from_text("ITEM 0 cable")
+    ex.normalize_from_text("ITEM 0 cable")
+
+    assert fake.calls == 2
+    assert llm_cache.stats()["entries"] == 0
+
+
+def test_totals_track_puts_overwrites_and_evictions(monkeypatch):
+    monkeypatch.setenv("LLM_CACHE_MAX_ENTRIES", "3")
+    keys = [llm_cache.request_key({"model": "m", "input": f"t{i}", "temperature": 0}) for i in range(4)]
+
+    llm_cache.put(keys[0], "xx")
+    llm_cache.put(keys[0], "xxxx")  # overwrite: cambia bytes, no entries
+    llm_cache.put(keys[1], "x")
+    stats = llm_cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (2, 5)
+
+    llm_cache.put(keys[2], "x")
+    llm_cache.put(keys[3], "x")  # 4 > 3: desaloja hasta 90% del tope
+    conn = llm_cache._conn()
+    assert conn.execute("SELECT entries, bytes FROM llm_cache_totals").fetchone() == conn.execute(
+        "SELECT COUNT(*), SUM(size_bytes) FROM llm_responses"
+    ).fetchone()
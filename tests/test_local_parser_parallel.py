@@ -0,0 +1,57 @@
+"""Process-pool local parsing must give the same items, in the same order, as the serial loop."""
+from __future__ import annotations
+
+import pytest
+
+from app.services.local_fallback_parser import fallback_txt_lines_to_extraction
+
+LINES = [
+    "CABLE THHN 12 AWG 100 m",
+    "CANALETA 8X4 NEGRA — 20",
+    "nota: entregar en obra",
+    "5 rollos cable 12 (rollo 100m)",
+    "Subtotal 584,200.00",
+]
+TEXT = "\n".join(f"{LINES[i % len(LINES)]} #{i}" if i % 7 else LINES[i % len(LINES)] for i in range(230))
+
+
+def _dump(res):
+    return [it.model_dump() for it in res.items], res.global_warnings
+
+
+@pytest.mark.parametrize("keep_low,max_items", [("true", 1000), ("false", 1000), ("false", 90), ("true", 229)])
+def test_parallel_matches_serial(monkeypatch, keep_low, max_items):
+    monkeypatch.setenv("KEEP_LOW_CONFIDENCE_ITEMS", keep_low)
+    serial = fallback_txt_lines_to_extraction(TEXT, max_items=max_items)
+
+    monkeypatch.setenv("LOCAL_PARSE_PARALLEL_MIN_LINES", "50")
+    monkeypatch.setenv("LOCAL_PARSE_CHUNK_LINES", "20")
+    monkeypatch.setenv("LOCAL_PARSE_WORKERS", "2")
+    parallel = fallback_txt_lines_to_extraction(TEXT, max_items=max_items)
+
+    assert parallel.meta["local_parse_workers"] == 2
+    assert _dump(parallel) == _dump(serial)
+    assert [it.line_index for it in parallel.items] == sorted(it.line_index for it in parallel.items)
+
+
+@pytest.mark.parametrize("keep_low", ["true", "false"])
+def test_pool_skipped_when_serial_prefix_fills_max_items(monkeypatch, keep_low):
+    monkeypatch.setenv("KEEP_LOW_CONFIDENCE_ITEMS", keep_low)
+    monkeypatch.setenv("LOCAL_PARSE_PARALLEL_MIN_LINES", "50")
+    monkeypatch.setenv("LOCAL_PARSE_WORKERS", "2")
+    res = fallback_txt_lines_to_extraction(TEXT, max_items=10)
+
+    assert "local_parse_workers" not in res.meta
+    assert len(res.items) == 10
+    assert res.global_warnings == ["TRUNCATED_ITEMS_MAX_ITEMS"]
+
+
+def test_meta_reports_workers_of_the_pool_that_ran(monkeypatch):
+    monkeypatch.setenv("KEEP_LOW_CONFIDENCE_ITEMS", "false")
+    monkeypatch.setenv("LOCAL_PARSE_PARALLEL_MIN_LINES", "50")
+    monkeypatch.setenv("LOCAL_PARSE_CHUNK_LINES", "20")
+    monkeypatch.setenv("LOCAL_PARSE_WORKERS", "2")
+    assert fallback_txt_lines_to_extraction(TEXT, max_items=1000).meta["local_parse_workers"] == 2
+
+    monkeypatch.setenv("LOCAL_PARSE_WORKERS", "3")
+    assert fallback_txt_lines_to_extraction(TEXT, max_items=1000).meta["local_parse_workers"] == 3
@@ -0,0 +1,50 @@
+"""The single-pass scanner must give exactly what the legacy regex cascade gives."""
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+from app.services.local_fallback_parser import _extract_qty_uom_desc, _extract_qty_uom_desc_legacy
+
+# piezas con los casos borde de cada regla: specs, x/guion/paréntesis, decimales, totales, conectores
+_PIECES = [
+    "5", "12", "1.5", "1,5", "12.34", "0", "123456", "1,234.5", "3x12", "2x40", "8X4", "4/0",
+    "20 amp", "110 v", "18w", "20 amperios", "5a", "m", "mts", "und", "unid.", "kg", "rollo", "x", "X",
+    "AWG", "ml", ".", " ", "  ", "\t", "-", " - ", "–", "—", "(", ")", "(rollo)", "( m )", "()", ",",
+    "cable", "thhn", "de", "del", "por", "box", "total", "iva", "ñandu", "árbol", "_", "QTY=", "|",
+    "DESC=", "•", "*", "xlpe", "1.", "x5", "9x", "-5", "—20", "12 (rollo 100 m)", ")(", "1.2.3",
+]
+
+
+def _assert_same(line: str) -> None:
+    assert _extract_qty_uom_desc(line) == _extract_qty_uom_desc_legacy(line), line
+
+
+def test_sample_files_match_legacy():
+    for path in (Path(__file__).resolve().parents[1] / "samples").glob("*.txt"):
+        for line in path.read_text(encoding="utf-8", errors="ignore").splitlines():
+            _assert_same(line)
+
+
+def test_known_lines_match_legacy():
+    for line in [
+        "3x12AWG CuTHHN TPX 600V 90C 6500 ML",
+        "breaker 2x40 20 amp - 5 und",
+        "CANALETA 8X4 NEGRA — 20",
+        "Subtotal - 584,200.00",
+        "QTY=3 | DESC=caja 2x4",
+        "5 rollos cable 12 (rollo 100m)",
+        "cable 10 und (rollo)",
+        "tubo conduit x 3",
+        "5 mts",
+        "12.34",
+        "de 3 m",
+        "",
+    ]:
+        _assert_same(line)
+
+
+def test_random_lines_match_legacy():
+    rnd = random.Random(1234)
+    for _ in range(20000):
+        _assert_same("".join(rnd.choice(_PIECES) + rnd.choice(["", " "]) for _ in range(rnd.randint(1, 7))))
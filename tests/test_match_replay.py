@@ -0,0 +1,137 @@
+"""Vectorized replay scoring must agree with the endpoint's Python rerank."""
+from app.api.routes_matching import (
+    _DEFAULT_MATCH_CONFIG,
+    _candidate_flags,
+    _prepare_item,
+    _spec_adjust,
+)
+from app.services.match_replay import (
+    ReplayDataset,
+    candidate_features,
+    sample_weight_configs,
+    block_size,
+    top1_accuracy,
+    weights_matrix,
+)
+
+QUERIES = [
+    "cable thhn #12 aislado",
+    "breaker 2x40 20A",
+    "alambre desnudo 4/0 awg rollo",
+    "cable control 3x12",
+]
+
+CATALOG = [
+    {"code": "C12", "name": "CABLE THHN THWN 12 19HILOS", "score_base": 1.1},
+    {"code": "C12D", "name": "ALAMBRE DESNUDO 12", "score_base": 1.3},
+    {"code": "C12X", "name": "CABLE CONTROL 3X12 AWG", "score_base": 1.2},
+    {"code": "B20", "name": "BREAKER ENCHUFABLE 20A", "score_base": 0.9},
+    {"code": "B40", "name": "BREAKER ENCHUFABLE 40 AMP", "score_base": 1.0},
+    {"code": "D40", "name": "CABLE DESNUDO 4/0 ROLLO", "score_base": 0.8},
+]
+
+
+def _records(cfg):
+    records = []
+    for i, q in enumerate(QUERIES):
+        p = _prepare_item({"line_index": i, "q": q, "raw_text": q, "warnings_json": []}, cfg)
+        cands = []
+        for c in CATALOG:
+            flags = _candidate_flags(c, cfg)
+            cands.append({
+                "code": c["code"],
+                "score_base": c["score_base"],
+                "features": candidate_features(p["specs"], flags, cfg, p["q_base"]),
+                "_flags": flags,
+            })
+        records.append({"line_index": i, "label_code": "C12", "candidates": cands, "_p": p})
+    return records
+
+
+def _python_top1(records, cfg):
+    picks = []
+    for r in records:
+        p = r["_p"]
+        scored = [
+            (c["score_base"] + _spec_adjust(p["specs"], c["_flags"], cfg, q_base=p["q_base"]), c["code"])
+            for c in r["candidates"]
+        ]
+        best = max(range(len(scored)), key=lambda j: (scored[j][0], -j))
+        picks.append(scored[best][1])
+    return picks
+
+
+def test_vectorized_top1_matches_python_rerank():
+    cfg = dict(_DEFAULT_MATCH_CONFIG)
+    records = _records(cfg)
+    ds = ReplayDataset(records)
+
+    for weights in sample_weight_configs(25, seed=7):
+        cfg_w = {**cfg, "weights": weights}
+        W = weights_matrix([weights])
+        scores = ds.base[:, :, None] + ds.feats @ W.T
+        vec_picks = [records[i]["candidates"][j]["code"] for i, j in enumerate(scores[:, :, 0].argmax(axis=1))]
+        assert vec_picks == _python_top1(records, cfg_w)
+
+
+def test_top1_accuracy_counts_label_hits():
+    cfg = dict(_DEFAULT_MATCH_CONFIG)
+    records = _records(cfg)
+    ds = ReplayDataset(records)
+    picks = _python_top1(records, cfg)
+
+    acc = top1_accuracy(ds, weights_matrix([cfg["weights"]]))
+    assert acc[0] == sum(p == "C12" for p in picks) / len(picks)
+
+
+def test_block_size_respects_memory_budget():
+    budget = 256 * 1024 * 1024
+    b = block_size(10_000, 40, budget)
+
+    assert b * 10_000 * 40 * 8 * 3 <= budget
+    assert b >= 1 and block_size(10_000_000, 400, budget) == 1
+
+
+def test_tiny_budget_gives_same_accuracy():
+    cfg = dict(_DEFAULT_MATCH_CONFIG)
+    ds = ReplayDataset(_records(cfg))
+    W = weights_matrix([cfg["weights"], {k: v * 2 for k, v in cfg["weights"].items()}, {}])
+
+    assert list(top1_accuracy(ds, W, mem_budget_mb=1e-6)) == list(top1_accuracy(ds, W))
+
+
+class _FakeConn:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, stmt, params):
+        self.calls.append((str(stmt), params))
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return []
+
+
+def test_export_is_scoped_to_org_drafts_and_catalog(tmp_path):
+    import pytest
+
+    from app.services.match_replay import export_dataset
+
+    calls = []
+    eng = type("Eng", (), {"connect": lambda self: _FakeConn(calls)})()
+    with pytest.raises(ValueError):
+        export_dataset(eng, "org_a", str(tmp_path / "out.jsonl"), [])
+
+    export_dataset(eng, "org_a", str(tmp_path / "out.jsonl"), ["d2", "d1", "d1"])
+    sql, params = calls[0]
+    assert params["org_id"] == "org_a" and params["draft_ids"] == ["d1", "d2"]
+    assert "di.draft_id = ANY(:draft_ids)" in sql and "cp.org_id = :org_id" in sql
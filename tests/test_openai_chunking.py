@@ -0,0 +1,180 @@
+"""Parallel chunked extraction must reassemble items in line order."""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app.services.openai_extractor import OpenAIExtractor
+
+
+class _FakeResponses:
+    """Devuelve un item por línea del chunk; los primeros chunks tardan más (terminan al final)."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.timeouts = []
+
+    def create(self, **kwargs):
+        prompt = kwargs["input"][1]["content"][0]["text"]
+        lines = [l for l in prompt.splitlines() if l.startswith("ITEM ")]
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.timeouts.append(kwargs.get("timeout"))
+        first = int(lines[0].split()[1])
+        time.sleep(0.05 if first < 40 else 0.01)
+        with self.lock:
+            self.active -= 1
+        items = [
+            {"line_index": i, "raw_text": l, "description": l, "quantity": 1, "uom": "UND"}
+            for i, l in enumerate(lines)
+        ]
+        out = {"items": items, "global_warnings": ["DUP_WARNING"], "meta": {}}
+        return SimpleNamespace(output_text=json.dumps(out))
+
+
+def _extractor(monkeypatch, concurrency: str) -> OpenAIExtractor:
+    monkeypatch.setenv("OPENAI_CHUNK_CONCURRENCY", concurrency)
+    monkeypatch.setenv("OPENAI_CHUNK_TIMEOUT_S", "12")
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_FakeResponses()))
+    return OpenAIExtractor()
+
+
+def test_chunks_run_concurrently_and_keep_order(monkeypatch):
+    ex = _extractor(monkeypatch, "4")
+    text = "\n".join(f"ITEM {i} cable" for i in range(130))
+
+    res = ex.normalize_from_text(text)
+
+    assert [it.line_index for it in res.items] == list(range(130))
+    assert [it.raw_text for it in res.items] == [f"ITEM {i} cable" for i in range(130)]
+    assert res.global_warnings == ["DUP_WARNING"]
+    assert ex.client.responses.max_active > 1
+    assert set(ex.client.responses.timeouts) == {12.0}
+    assert res.meta["chunks"] == 4
+    assert res.meta["chunk_wall_saved_ms"] >= 0
+
+
+def test_concurrency_one_is_serial(monkeypatch):
+    ex = _extractor(monkeypatch, "1")
+    res = ex.normalize_from_text("\n".join(f"ITEM {i} tubo" for i in range(90)))
+
+    assert [it.line_index for it in res.items] == list(range(90))
+    assert ex.client.responses.max_active == 1
+    assert res.meta["chunk_concurrency"] == 1
+
+
+class _TruncatingResponses(_FakeResponses):
+    """Como _FakeResponses, pero corta la salida (status=incomplete) si el chunk pasa de 10 líneas."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.sizes = []
+
+    def create(self, **kwargs):
+        prompt = kwargs["input"][1]["content"][0]["text"]
+        n = len([l for l in prompt.splitlines() if l.startswith("ITEM ")])
+        with self.lock:
+            self.sizes.append(n)
+        if n > 10:
+            return SimpleNamespace(status="incomplete", output_text='{"items": [{"line_index": 0, "raw_te')
+        return super().create(**kwargs)
+
+
+def test_truncated_chunk_is_split_and_retried(monkeypatch):
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_TruncatingResponses()))
+    ex = OpenAIExtractor()
+
+    res = ex.normalize_from_text("\n".join(f"ITEM {i} cable" for i in range(70)))
+
+    assert [it.line_index for it in res.items] == list(range(70))
+    assert [it.raw_text for it in res.items] == [f"ITEM {i} cable" for i in range(70)]
+    assert res.meta["chunk_splits"] > 0
+    assert "OPENAI_ERROR_JSONDecodeError" not in (res.global_warnings or [])
+    assert any(n > 10 for n in ex.client.responses.sizes)
+
+
+def test_chunks_follow_token_budget(monkeypatch):
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_FakeResponses()))
+    ex = OpenAIExtractor()
+    short = [f"ITEM {i} tubo" for i in range(40)]
+    long = [f"ITEM {i} " + "cable encauchetado 3x12 AWG THHN 600V 90C marca centelsa rollo x 100 m " * 2 for i in range(40)]
+
+    short_starts, _ = ex._plan_chunks(short)
+    long_starts, long_chunks = ex._plan_chunks(long)
+
+    assert len(short_starts) == 1  # 40 líneas cortas caben en una llamada
+    assert len(long_starts) > 2
+    sizes = [c.count("\n") + 1 for c in long_chunks]
+    assert min(sizes) >= max(sizes) // 2  # repartidos parejo, sin chunk de 1 línea al final
+
+
+class _MalformedResponses(_FakeResponses):
+    """Respuesta completa (sin status=incomplete) pero con JSON roto."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    def create(self, **kwargs):
+        with self.lock:
+            self.calls += 1
+        return SimpleNamespace(status="completed", output_text='{"items": [oops')
+
+
+def test_malformed_complete_json_is_not_split(monkeypatch):
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_MalformedResponses()))
+    ex = OpenAIExtractor()
+
+    ex.normalize_from_text("\n".join(f"ITEM {i} cable" for i in range(30)))
+
+    assert ex.client.responses.calls == 1
+
+
+def test_split_depth_is_capped(monkeypatch):
+    monkeypatch.setenv("OPENAI_CHUNK_MAX_SPLIT_DEPTH", "2")
+
+    class _AlwaysIncomplete(_TruncatingResponses):
+        def create(self, **kwargs):
+            super().create(**kwargs)
+            return SimpleNamespace(status="incomplete", output_text='{"items": [')
+
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_AlwaysIncomplete()))
+    ex = OpenAIExtractor()
+
+    ex.normalize_from_text("\n".join(f"ITEM {i} cable" for i in range(30)))
+
+    assert ex.client.responses.sizes == [30, 15, 7, 8, 15, 7, 8]
+
+
+def test_async_split_halves_respect_chunk_concurrency(monkeypatch):
+    import asyncio
+
+    from app.services.openai_extractor import AsyncOpenAIExtractor
+
+    class _AsyncTruncating:
+        def __init__(self) -> None:
+            self.active = 0
+            self.max_active = 0
+            self.sync = _TruncatingResponses()
+
+        async def create(self, **kwargs):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return self.sync.create(**kwargs)
+
+    monkeypatch.setenv("OPENAI_CHUNK_CONCURRENCY", "2")
+    monkeypatch.setattr(AsyncOpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=_AsyncTruncating()))
+    ex = AsyncOpenAIExtractor()
+
+    res = asyncio.run(ex.normalize_from_text("\n".join(f"ITEM {i} cable" for i in range(70))))
+
+    assert [it.line_index for it in res.items] == list(range(70))
+    assert res.meta["chunk_splits"] > 0
+    assert ex.client.responses.max_active == 2
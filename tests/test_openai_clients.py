@@ -0,0 +1,48 @@
+"""Clientes OpenAI compartidos: uno sync por proceso, uno async por event loop, y pool_stats tolerante."""
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services import openai_clients
+
+
+@pytest.fixture(autouse=True)
+def _fresh(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.delenv("OPENAI_HTTP_MAX_CONNECTIONS", raising=False)
+    monkeypatch.delenv("OPENAI_HTTP_MAX_KEEPALIVE", raising=False)
+    monkeypatch.setattr(openai_clients, "_SYNC", None)
+    monkeypatch.setattr(openai_clients, "_SYNC_PID", None)
+    monkeypatch.setattr(openai_clients, "_ASYNC", openai_clients.weakref.WeakKeyDictionary())
+
+
+def test_sync_client_is_shared_per_process(monkeypatch):
+    a = openai_clients.get_openai_client()
+    assert openai_clients.get_openai_client() is a
+
+    # después de un fork el pid cambia: el hijo no reusa el pool del padre
+    monkeypatch.setattr(openai_clients.os, "getpid", lambda: -1)
+    b = openai_clients.get_openai_client()
+    assert b is not a and openai_clients.get_openai_client() is b
+
+
+def test_async_client_is_shared_per_event_loop():
+    async def two():
+        return openai_clients.get_async_openai_client(), openai_clients.get_async_openai_client()
+
+    a1, a2 = asyncio.run(two())
+    b1, _ = asyncio.run(two())
+    assert a1 is a2
+    assert b1 is not a1
+
+
+def test_pool_stats_reports_pools_and_survives_httpx_internals_changing():
+    openai_clients.get_openai_client()
+    stats = openai_clients.pool_stats()
+    assert stats["sync"]["available"] is True and stats["sync"]["connections"] == 0
+    assert stats["sync"]["max_connections"] == 100
+
+    view = openai_clients._pool_view(object())  # sin _transport._pool
+    assert view["available"] is False and view["max_keepalive"] == 20
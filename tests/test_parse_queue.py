@@ -0,0 +1,207 @@
+"""Retry / dead-letter decisions of the parse job queue."""
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import parse_queue
+
+
+@pytest.fixture(autouse=True)
+def events(monkeypatch):
+    # parse_events sin DB: (draft_id, run_id, stage)
+    recorded = []
+    monkeypatch.setattr(parse_queue, "record_event", lambda eng, draft_id, run_id, stage, data: recorded.append((draft_id, run_id, stage)))
+    return recorded
+
+
+@pytest.fixture
+def finished(monkeypatch):
+    calls = []
+    monkeypatch.setattr(parse_queue, "get_engine", lambda: None)
+    monkeypatch.setattr(parse_queue, "_finish", lambda job, status, **kw: calls.append((status, kw)) or True)
+    monkeypatch.setenv("PARSE_JOB_BACKOFF_S", "10")
+    return calls
+
+
+def _job(attempts, max_attempts=3):
+    return {"id": "job_1", "draft_id": "d1", "attempts": attempts, "max_attempts": max_attempts, "callback_url": None}
+
+
+def _raise(exc):
+    def _f(*a, **k):
+        raise exc
+    return _f
+
+
+def test_transient_error_is_retried_with_backoff(monkeypatch, finished):
+    monkeypatch.setattr(parse_queue, "parse_draft", _raise(TimeoutError("openai slow")))
+
+    assert parse_queue.run_claimed(_job(attempts=2)) == "QUEUED"
+    status, kw = finished[0]
+    assert kw["retry_in_s"] == 20.0
+    assert kw["error"]["detail"]["code"] == "JOB_ERROR_TimeoutError"
+
+
+def test_last_attempt_goes_to_dead_letter(monkeypatch, finished):
+    monkeypatch.setattr(parse_queue, "parse_draft", _raise(TimeoutError("openai slow")))
+
+    assert parse_queue.run_claimed(_job(attempts=3)) == "DEAD"
+    assert "retry_in_s" not in finished[0][1]
+
+
+def test_client_errors_are_not_retried(monkeypatch, finished):
+    monkeypatch.setattr(parse_queue, "parse_draft", _raise(HTTPException(status_code=404, detail="Draft not found")))
+
+    assert parse_queue.run_claimed(_job(attempts=1)) == "FAILED"
+
+
+def test_success_stores_parse_result(monkeypatch, finished, events):
+    monkeypatch.setattr(parse_queue, "parse_draft", lambda eng, draft_id, progress=None: {"draft_id": draft_id, "status": "PARSED"})
+
+    assert parse_queue.run_claimed(_job(attempts=1)) == "SUCCEEDED"
+    assert finished[0][1]["result"]["status"] == "PARSED"
+    assert events == [("d1", "job_1", "done")]
+
+
+class _FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.sql = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, stmt, params=None):
+        self.sql.append(str(stmt))
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_stale_jobs_that_go_dead_deliver_their_callback(monkeypatch):
+    conn = _FakeConn([
+        {"id": "job_1", "draft_id": "d1", "status": "DEAD", "callback_url": "https://hooks.example.com/cb"},
+        {"id": "job_2", "draft_id": "d2", "status": "QUEUED", "callback_url": "https://hooks.example.com/cb"},
+        {"id": "job_3", "draft_id": "d3", "status": "DEAD", "callback_url": None},
+    ])
+    delivered = []
+    monkeypatch.setattr(parse_queue, "get_engine", lambda: type("E", (), {"begin": lambda self: conn})())
+    monkeypatch.setattr(parse_queue, "_deliver_callback", lambda job_id, url: delivered.append(job_id))
+
+    assert parse_queue.requeue_stale() == 3
+    assert delivered == ["job_1"]
+
+
+def test_worker_thread_survives_run_claimed_errors(monkeypatch):
+    import threading
+
+    from app.workers import parse_worker
+
+    stop = threading.Event()
+    claimed = iter([_job(attempts=1), _job(attempts=1)])
+
+    def claim(worker_id):
+        job = next(claimed, None)
+        if job is None:
+            stop.set()
+        return job
+
+    runs = []
+
+    def run(job):
+        runs.append(job["id"])
+        raise RuntimeError("db down in _finish")
+
+    monkeypatch.setattr(parse_queue, "claim_next", claim)
+    monkeypatch.setattr(parse_queue, "run_claimed", run)
+    parse_worker._loop("w1", stop, poll_s=0.0)
+
+    assert runs == ["job_1", "job_1"]
+
+
+def test_proxy_only_enqueues_for_truthy_async(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_quote_drafts
+
+    paths = []
+
+    async def fake_proxy(request, method, path, x_api_key, **kw):
+        paths.append(path)
+        return {"job_id": "job_1"}
+
+    monkeypatch.setattr(routes_quote_drafts, "_proxy", fake_proxy)
+    app = FastAPI()
+    app.include_router(routes_quote_drafts.router)
+    client = TestClient(app)
+    headers = {"X-API-Key": "k"}
+
+    assert client.post("/v1/quote-drafts/d1/parse?async=0", headers=headers).status_code == 200
+    assert client.post("/v1/quote-drafts/d1/parse?async=false", headers=headers).status_code == 200
+    assert client.post("/v1/quote-drafts/d1/parse?async=true", headers=headers).status_code == 202
+    assert paths == ["/v1/drafts/d1/parse", "/v1/drafts/d1/parse", "/v1/drafts/d1/parse?async=1"]
+
+
+class _LockConn:
+    """Engine/conn falsos: UPDATE jobs afecta 1 fila solo si locked_by sigue siendo `owner`."""
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.sql = []
+
+    def begin(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, stmt, params=None):
+        sql = " ".join(str(stmt).split())
+        self.sql.append(sql)
+        rowcount = 1
+        if sql.startswith("UPDATE jobs"):
+            rowcount = 1 if (params or {}).get("worker_id") == self.owner else 0
+        return type("R", (), {"rowcount": rowcount})()
+
+
+def test_running_job_refreshes_its_lock(monkeypatch):
+    import time
+
+    conn = _LockConn(owner="w1")
+    monkeypatch.setattr(parse_queue, "get_engine", lambda: conn)
+    monkeypatch.setenv("PARSE_JOB_HEARTBEAT_S", "0.05")
+    monkeypatch.setattr(parse_queue, "parse_draft", lambda eng, draft_id, progress=None: time.sleep(0.3) or {"status": "PARSED"})
+
+    assert parse_queue.run_claimed({**_job(attempts=1), "locked_by": "w1"}) == "SUCCEEDED"
+    assert sum("SET locked_at = now()" in s for s in conn.sql) >= 2
+
+
+def test_job_requeued_while_running_does_not_overwrite_new_attempt(monkeypatch, events):
+    conn = _LockConn(owner="w1")
+    delivered = []
+    monkeypatch.setattr(parse_queue, "get_engine", lambda: conn)
+    monkeypatch.setattr(parse_queue, "_deliver_callback", lambda job_id, url: delivered.append(job_id))
+
+    def slow_parse(eng, draft_id, progress=None):
+        conn.owner = "w2"  # requeue_stale + otro worker lo tomaron mientras tanto
+        raise TimeoutError("openai slow")
+
+    monkeypatch.setattr(parse_queue, "parse_draft", slow_parse)
+    job = {**_job(attempts=3), "locked_by": "w1", "callback_url": "https://hooks.example.com/cb"}
+
+    assert parse_queue.run_claimed(job) == "LOCK_LOST"
+    assert delivered == []
+    assert not any(s.startswith("UPDATE drafts") for s in conn.sql)
+    assert events == []  # el intento nuevo es el que cierra el stream
@@ -0,0 +1,171 @@
+"""SSE parse stream: stages are relayed in order, stored in parse_events, and GET resumes from Last-Event-ID."""
+from __future__ import annotations
+
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import draft_parsing, parse_events
+
+
+class _Store:
+    """parse_events en memoria (sin DB)."""
+
+    def __init__(self):
+        self.rows = []
+
+    def start_run(self, eng, draft_id, run_id, stage, data=None):
+        self.rows = [r for r in self.rows if r["draft_id"] != draft_id or r["run_id"] == run_id]
+        return self.record(eng, draft_id, run_id, stage, data or {})
+
+    def record(self, eng, draft_id, run_id, stage, data):
+        event_id = len(self.rows) and self.rows[-1]["id"]
+        self.rows.append({"id": event_id + 1, "draft_id": draft_id, "run_id": run_id, "stage": stage, "data": data})
+        return event_id + 1
+
+    def _run(self, draft_id):
+        mine = [r for r in self.rows if r["draft_id"] == draft_id]
+        return [r for r in mine if r["run_id"] == mine[-1]["run_id"]] if mine else []
+
+    def fetch_after(self, eng, draft_id, after_id, limit=200):
+        return [r for r in self._run(draft_id) if r["id"] > after_id][:limit]
+
+    def last_event(self, eng, draft_id):
+        run = self._run(draft_id)
+        return run[-1] if run else None
+
+
+@pytest.fixture
+def store(monkeypatch):
+    s = _Store()
+    for name in ("start_run", "record", "fetch_after", "last_event"):
+        monkeypatch.setattr(parse_events, name, getattr(s, name))
+    monkeypatch.setenv("PARSE_STREAM_POLL_S", "0.01")
+    return s
+
+
+def _collect(eng=None, draft_id="d1"):
+    async def _run():
+        return [chunk async for chunk in draft_parsing.stream_parse_events(eng, draft_id)]
+    return asyncio.run(_run())
+
+
+def _observe(last_event_id=None, draft_id="d1"):
+    async def _run():
+        return [chunk async for chunk in parse_events.observe(None, draft_id, last_event_id)]
+    return asyncio.run(_run())
+
+
+def _parse(chunks):
+    out = []
+    for c in chunks:
+        if c.startswith(":"):
+            continue
+        fields = dict(line.split(": ", 1) for line in c.strip().split("\n"))
+        out.append((int(fields["id"]) if "id" in fields else None, fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def _events(chunks):
+    return [(event, data) for _, event, data in _parse(chunks)]
+
+
+def test_stream_relays_stages_then_done(monkeypatch, store):
+    def fake_parse(eng, draft_id, progress):
+        progress("upload_stored", {"filename": "rfq.txt"})
+        progress("llm_chunk_done", {"chunk": 0, "items": [{"line_index": 3}]})
+        progress("items_persisted", {"items_created": 1})
+        return {"draft_id": draft_id, "status": "PARSED", "items_created": 1}
+
+    monkeypatch.setattr(draft_parsing, "parse_draft", fake_parse)
+    events = _events(_collect())
+
+    assert [e for e, _ in events] == ["upload_stored", "llm_chunk_done", "items_persisted", "done"]
+    assert events[1][1]["items"] == [{"line_index": 3}]
+    assert events[-1][1]["status"] == "PARSED"
+    assert [r["stage"] for r in store.rows] == [e for e, _ in events]
+
+
+def test_stream_reports_http_errors(monkeypatch, store):
+    store.record(None, "d1", "job_1", "job_queued", {})
+
+    def fake_parse(eng, draft_id, progress):
+        raise HTTPException(status_code=409, detail="Draft already has items.")
+
+    monkeypatch.setattr(draft_parsing, "parse_draft", fake_parse)
+    events = _events(_collect())
+
+    assert events == [("error", {"status_code": 409, "detail": "Draft already has items."})]
+    # el POST rechazado no pisa la corrida que otro está observando
+    assert [r["run_id"] for r in store.rows] == ["job_1"]
+
+
+def test_observer_resumes_from_last_event_id(monkeypatch, store):
+    def fake_parse(eng, draft_id, progress):
+        progress("upload_stored", {"filename": "rfq.txt"})
+        progress("llm_chunk_done", {"chunk": 0})
+        progress("items_persisted", {"items_created": 1})
+        return {"draft_id": draft_id, "status": "PARSED"}
+
+    monkeypatch.setattr(draft_parsing, "parse_draft", fake_parse)
+    first = _parse(_collect())
+    # se cortó después del segundo evento: reconecta y sigue, sin volver a parsear
+    monkeypatch.setattr(draft_parsing, "parse_draft", lambda *a: pytest.fail("observer must not parse"))
+    resumed = _parse(_observe(last_event_id=first[1][0]))
+
+    assert resumed == first[2:]
+    assert [e for _, e, _ in _parse(_observe())] == ["upload_stored", "llm_chunk_done", "items_persisted", "done"]
+
+
+def test_observer_follows_running_job_and_reemits_final_event(store):
+    store.start_run(None, "d1", "job_1", "job_queued", {"job_id": "job_1"})
+
+    async def _worker_then_observe():
+        async def worker():
+            await asyncio.sleep(0.05)
+            store.record(None, "d1", "job_1", "items_persisted", {"items_created": 2})
+            store.record(None, "d1", "job_1", "done", {"status": "PARSED"})
+        task = asyncio.create_task(worker())
+        chunks = [c async for c in parse_events.observe(None, "d1", 1)]
+        await task
+        return chunks
+
+    events = _parse(asyncio.run(_worker_then_observe()))
+    assert [e for _, e, _ in events] == ["items_persisted", "done"]
+    # ya terminó y el cliente tiene todo: recibe el done otra vez para cerrar
+    assert _parse(_observe(last_event_id=events[-1][0])) == events[-1:]
+
+
+def test_stream_proxy_starts_with_post_and_closes_client_when_send_fails(monkeypatch):
+    import httpx
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_quote_drafts
+
+    closed = []
+    sent = []
+
+    async def fail_send(self, request, **kw):
+        sent.append((request.method, request.headers.get("Last-Event-ID")))
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async def track_close(self):
+        closed.append(True)
+
+    monkeypatch.setattr(httpx.AsyncClient, "send", fail_send)
+    monkeypatch.setattr(httpx.AsyncClient, "aclose", track_close)
+    app = FastAPI()
+    app.include_router(routes_quote_drafts.router)
+    client = TestClient(app)
+
+    resp = client.post("/v1/quote-drafts/d1/parse/stream", headers={"X-API-Key": "k"})
+    assert resp.status_code == 502
+    assert resp.json()["detail"]["code"] == "UPSTREAM_REQUEST_ERROR"
+    assert closed == [True]
+
+    # GET solo observa y reenvía Last-Event-ID para que el backend siga desde ahí
+    client.get("/v1/quote-drafts/d1/parse/stream", headers={"X-API-Key": "k", "Last-Event-ID": "7"})
+    assert sent == [("POST", None), ("GET", "7")]
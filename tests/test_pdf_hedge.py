@@ -0,0 +1,167 @@
+"""PDF deadline mode: local result past the deadline, LLM result upgrades the draft later."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.schemas.extraction import ExtractionResult, ExtractedItem
+from app.services import draft_parsing
+from app.services.document_extractor import DocumentExtractor
+from app.services.openai_extractor import AsyncOpenAIExtractor, OpenAIExtractor
+
+_LINES = ["10 und Cable THHN 12 AWG", "5 m Tubo conduit 1 pulgada", "20 und Breaker 20A"]
+
+
+def _pdf(tmp_path) -> str:
+    path = str(tmp_path / "rfq.pdf")
+    c = canvas.Canvas(path, pagesize=letter)
+    for i, line in enumerate(_LINES):
+        c.drawString(72, 750 - 15 * i, line)
+    c.save()
+    return path
+
+
+def _llm_result() -> ExtractionResult:
+    items = [ExtractedItem(line_index=i, raw_text=l, description=f"LLM {i}", quantity=1, uom="UND", confidence=0.99)
+             for i, l in enumerate(_LINES)]
+    return ExtractionResult(items=items, global_warnings=[], meta={"source_type": "pdf"})
+
+
+def _setup(monkeypatch, delay_s: float, deadline_s: str = "0.1"):
+    monkeypatch.setenv("OPENAI_ENABLED", "true")
+    monkeypatch.setenv("PDF_HEDGE_DEADLINE_S", deadline_s)
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace())
+    monkeypatch.setattr(AsyncOpenAIExtractor, "_make_client", lambda self: SimpleNamespace())
+
+    def slow(self, pdf_path, content_key=None):
+        time.sleep(delay_s)
+        return _llm_result()
+
+    async def slow_async(self, pdf_path, content_key=None):
+        await asyncio.sleep(delay_s)
+        return _llm_result()
+
+    monkeypatch.setattr(OpenAIExtractor, "extract_from_pdf", slow)
+    monkeypatch.setattr(AsyncOpenAIExtractor, "extract_from_pdf", slow_async)
+
+
+def test_local_result_past_deadline_then_upgrade(monkeypatch, tmp_path):
+    _setup(monkeypatch, delay_s=0.5)
+    ex = DocumentExtractor()
+
+    t0 = time.monotonic()
+    res = ex.extract(_pdf(tmp_path), "rfq.pdf", "application/pdf")
+
+    assert time.monotonic() - t0 < 0.4
+    assert {"LLM_DEADLINE_EXCEEDED", "LOCAL_RESULT_USED", "LLM_UPGRADE_PENDING"} <= set(res.global_warnings)
+    assert res.meta["extractor"] == "local" and res.meta["hedge"]["winner"] == "local"
+    assert res.meta["llm_upgrade_pending"] is True
+
+    applied = {}
+    done = threading.Event()
+
+    def fake_apply(eng, draft_id, result, error=None):
+        applied.update(draft_id=draft_id, result=result, error=error)
+        done.set()
+
+    monkeypatch.setattr(draft_parsing, "apply_llm_upgrade", fake_apply)
+    draft_parsing._schedule_llm_upgrade(None, "d1", ex.pending_upgrade)
+
+    assert done.wait(2)
+    assert applied["error"] is None
+    assert [it.description for it in applied["result"].items] == ["LLM 0", "LLM 1", "LLM 2"]
+    assert applied["result"].meta["extractor"] == "openai"
+
+
+def test_fast_llm_wins(monkeypatch, tmp_path):
+    _setup(monkeypatch, delay_s=0.0, deadline_s="2")
+    ex = DocumentExtractor()
+
+    res = ex.extract(_pdf(tmp_path), "rfq.pdf", "application/pdf")
+
+    assert ex.pending_upgrade is None
+    assert res.meta["extractor"] == "openai" and res.meta["hedge"]["winner"] == "llm"
+    assert "LLM_UPGRADE_PENDING" not in res.global_warnings
+
+
+def test_weak_local_result_keeps_waiting(monkeypatch, tmp_path):
+    _setup(monkeypatch, delay_s=0.3, deadline_s="0.05")
+    monkeypatch.setenv("PDF_HEDGE_MIN_ITEMS", "50")
+    ex = DocumentExtractor()
+
+    res = ex.extract(_pdf(tmp_path), "rfq.pdf", "application/pdf")
+
+    assert ex.pending_upgrade is None
+    assert res.meta["hedge"]["winner"] == "llm_after_deadline"
+    assert res.items[0].description == "LLM 0"
+
+
+def test_async_driver_hedges_too(monkeypatch, tmp_path):
+    _setup(monkeypatch, delay_s=0.5)
+    ex = DocumentExtractor()
+
+    async def _run():
+        res = await ex.extract_async(_pdf(tmp_path), "rfq.pdf", "application/pdf")
+        late = await ex.pending_upgrade.handle
+        return res, late
+
+    res, late = asyncio.run(_run())
+
+    assert res.meta["hedge"]["winner"] == "local"
+    assert [it.description for it in late.items][0] == "LLM 0"
+
+
+class _SqlConn:
+    """Conn falsa: responde según un pedazo del SQL y anota cada sentencia."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.sql = []
+        self.params = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def begin(self):
+        return self
+
+    def execute(self, stmt, params=None):
+        sql = " ".join(str(stmt).split())
+        self.sql.append(sql)
+        self.params.append(params or {})
+        row = next((v for k, v in self.answers.items() if k in sql), None)
+        return SimpleNamespace(mappings=lambda: SimpleNamespace(first=lambda: row), first=lambda: row)
+
+
+def test_upgrade_refused_when_items_were_matched():
+    conn = _SqlConn({
+        "FROM drafts WHERE id": {"id": "d1", "status": "PARSED", "warnings_json": {"meta": {"llm_upgrade_pending": True}}},
+        "item_code IS NOT NULL": (1,),
+    })
+
+    assert draft_parsing.apply_llm_upgrade(conn, "d1", _llm_result()) is False
+    assert not any(s.startswith("DELETE FROM draft_items") for s in conn.sql)
+    payload = next(p["warnings_json"] for s, p in zip(conn.sql, conn.params) if s.startswith("UPDATE drafts"))
+    assert '"llm_upgrade_pending": false' in payload and '"llm_upgrade": "skipped_matched"' in payload
+
+
+def test_manual_select_cancels_pending_upgrade(monkeypatch):
+    from app.api import routes_matching
+
+    monkeypatch.setenv("ENABLE_MATCHING", "true")
+    conn = _SqlConn({"FROM draft_items": {"line_index": 0}, "FROM catalog_products": {"code": "C1", "name": "Cable"}})
+    monkeypatch.setattr(routes_matching, "get_engine", lambda: conn)
+
+    routes_matching.select_item_for_draft_line("d1", 0, routes_matching.SelectItemBody(code="C1"), x_org_id="o1")
+
+    update_item = next(i for i, s in enumerate(conn.sql) if s.startswith("UPDATE draft_items SET item_code"))
+    cancel = next(i for i, s in enumerate(conn.sql) if "llm_upgrade_pending" in s)
+    assert cancel > update_item
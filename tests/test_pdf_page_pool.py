@@ -0,0 +1,99 @@
+"""Per-page PDF text extraction in a process pool: ordered, timed, and bounded by a timeout."""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.services import pdf_utils
+from app.services.document_extractor import DocumentExtractor
+from app.services.pdf_utils import PdfSource
+
+
+def _pdf(tmp_path, pages: int) -> str:
+    path = str(tmp_path / "rfq.pdf")
+    c = canvas.Canvas(path, pagesize=letter)
+    for p in range(pages):
+        c.drawString(72, 750, f"{p + 1} und Breaker 20A hoja {p + 1}")
+        c.showPage()
+    c.save()
+    return path
+
+
+def test_pages_come_back_in_order_with_timings(monkeypatch, tmp_path):
+    monkeypatch.setenv("PDF_TEXT_WORKERS", "2")
+    src = PdfSource(_pdf(tmp_path, 5), max_pages=10)
+
+    texts = src.page_texts()
+
+    assert src.text_mode == "pool"
+    assert [t.strip().split()[-1] for t in texts] == ["1", "2", "3", "4", "5"]
+    assert [st["page"] for st in src.page_stats] == [0, 1, 2, 3, 4]
+    assert all(st["ms"] >= 0 and not st["timed_out"] for st in src.page_stats)
+
+
+def test_stuck_pages_time_out_and_workers_are_replaced(monkeypatch, tmp_path):
+    monkeypatch.setenv("PDF_TEXT_WORKERS", "1")
+    monkeypatch.setenv("PDF_PAGE_TIMEOUT_S", "0.5")
+    stuck = str(tmp_path / "stuck.pdf")
+    os.mkfifo(stuck)  # sin escritor: el worker se queda bloqueado leyendo, como una página patológica
+
+    t0 = time.monotonic()
+    texts, stats = pdf_utils.extract_page_texts(stuck, [0, 1])
+    assert time.monotonic() - t0 < 3
+    assert all(st["timed_out"] for st in stats) and texts == ["", ""]
+    assert pdf_utils._IDLE_WORKERS == []  # el worker colgado se mató, no vuelve al pool
+
+    texts, stats = pdf_utils.extract_page_texts(_pdf(tmp_path, 3), [2, 0])
+    assert "hoja 3" in texts[0] and "hoja 1" in texts[1]
+
+
+def test_extractor_reports_page_times(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_ENABLED", "false")
+
+    res = DocumentExtractor().extract(_pdf(tmp_path, 3), "rfq.pdf", "application/pdf")
+
+    assert len(res.meta["pdf_text"]["page_ms"]) == 3
+    assert res.meta["pdf_text"]["pages_timed_out"] == []
+    assert [it.quantity for it in res.items] == [1, 2, 3]
+
+
+def test_timeout_in_one_request_does_not_kill_other_requests_pages(monkeypatch, tmp_path):
+    monkeypatch.setenv("PDF_TEXT_WORKERS", "2")
+    monkeypatch.setenv("PDF_PAGE_TIMEOUT_S", "1.5")
+    stuck = str(tmp_path / "stuck.pdf")
+    os.mkfifo(stuck)
+    good = _pdf(tmp_path, 2)
+
+    stuck_out = {}
+    t = threading.Thread(target=lambda: stuck_out.update(r=pdf_utils.extract_page_texts(stuck, [0])))
+    t.start()
+    texts, stats = pdf_utils.extract_page_texts(good, [0, 1])
+    t.join()
+
+    assert "hoja 1" in texts[0] and "hoja 2" in texts[1]
+    assert not any(st["timed_out"] for st in stats)
+    assert stuck_out["r"][1][0]["timed_out"]
+
+
+def test_upload_does_not_wait_for_text_extraction(monkeypatch, tmp_path):
+    src = PdfSource(_pdf(tmp_path, 3), max_pages=2)
+    started = threading.Event()
+
+    def slow_pages(path, indexes):
+        started.set()
+        time.sleep(1.0)
+        return [""] * len(indexes), [{"page": i, "ms": 0.0, "chars": 0, "timed_out": False} for i in indexes]
+
+    monkeypatch.setattr(pdf_utils, "extract_page_texts", slow_pages)
+    t = threading.Thread(target=src.page_texts)
+    t.start()
+    started.wait(2)
+
+    t0 = time.monotonic()
+    assert src.truncated is True and src.page_count == 3
+    assert time.monotonic() - t0 < 0.5
+    t.join()
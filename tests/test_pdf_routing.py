@@ -0,0 +1,76 @@
+"""Clasificador texto/escaneado de PDFs y ruteo en DocumentExtractor."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from PIL import Image
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.schemas.extraction import ExtractionResult, ExtractedItem
+from app.services.document_extractor import DocumentExtractor
+from app.services.openai_extractor import OpenAIExtractor
+from app.services.pdf_utils import PdfSource
+
+_LINES = ["10 und Cable THHN 12 AWG", "5 m Tubo conduit 1 pulgada"]
+
+
+def _pdf(tmp_path, name: str, pages: list[str]) -> str:
+    """pages: 'text' o 'image' por página."""
+    path = str(tmp_path / name)
+    c = canvas.Canvas(path, pagesize=letter)
+    for kind in pages:
+        if kind == "text":
+            for i, line in enumerate(_LINES):
+                c.drawString(72, 750 - 15 * i, line)
+        else:
+            c.drawImage(ImageReader(Image.new("L", (200, 260), 230)), 0, 0, width=612, height=792)
+        c.showPage()
+    c.save()
+    return path
+
+
+def test_classify_text_scanned_mixed(tmp_path):
+    assert PdfSource(_pdf(tmp_path, "t.pdf", ["text", "text"]), 10).classify()["kind"] == "text"
+    assert PdfSource(_pdf(tmp_path, "s.pdf", ["image", "image"]), 10).classify()["kind"] == "scanned"
+    mixed = PdfSource(_pdf(tmp_path, "m.pdf", ["image", "text"]), 10).classify()
+    assert mixed["kind"] == "mixed" and mixed["page_kinds"] == ["image", "text"]
+
+
+def _openai_stub(monkeypatch):
+    calls = []
+    monkeypatch.setenv("OPENAI_ENABLED", "true")
+    monkeypatch.setenv("OPENAI_ENRICH_ENABLED", "false")
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace())
+
+    def fake(self, pdf_path, content_key=None):
+        calls.append(pdf_path)
+        item = ExtractedItem(line_index=0, raw_text="x", description="Cable", quantity=1, uom="UND", confidence=0.9)
+        return ExtractionResult(items=[item], global_warnings=[], meta={})
+
+    monkeypatch.setattr(OpenAIExtractor, "extract_from_pdf", fake)
+    return calls
+
+
+def test_text_pdf_is_parsed_locally_without_upload(monkeypatch, tmp_path):
+    calls = _openai_stub(monkeypatch)
+    res = DocumentExtractor().extract(_pdf(tmp_path, "t.pdf", ["text"]), "t.pdf", "application/pdf")
+
+    assert calls == []
+    assert res.meta["extractor"] == "local" and res.meta["pdf_class"]["kind"] == "text"
+    assert "LOCAL_FIRST_USED" in res.global_warnings and len(res.items) == 2
+
+
+def test_scanned_pdf_skips_pypdf_text(monkeypatch, tmp_path):
+    calls = _openai_stub(monkeypatch)
+
+    def no_text(self):
+        raise AssertionError("page_texts no debe correr en un escaneado")
+
+    monkeypatch.setattr(PdfSource, "page_texts", no_text)
+    res = DocumentExtractor().extract(_pdf(tmp_path, "s.pdf", ["image"]), "s.pdf", "application/pdf")
+
+    assert len(calls) == 1
+    assert res.meta["extractor"] == "openai" and res.meta["pdf_class"]["kind"] == "scanned"
+    assert "pdf_text" not in res.meta
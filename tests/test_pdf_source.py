@@ -0,0 +1,66 @@
+"""PDF page limiting works from one reader and never writes truncated copies to disk."""
+from __future__ import annotations
+
+import io
+import os
+from types import SimpleNamespace
+
+from pypdf import PdfReader
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.services.document_extractor import DocumentExtractor
+from app.services.openai_files import upload_or_reuse
+from app.services.pdf_utils import PdfSource
+
+
+def _pdf(tmp_path, pages: int) -> str:
+    path = str(tmp_path / "rfq.pdf")
+    c = canvas.Canvas(path, pagesize=letter)
+    for p in range(pages):
+        c.drawString(72, 750, f"{p + 1} und Cable THHN 12 AWG pagina {p + 1}")
+        c.showPage()
+    c.save()
+    return path
+
+
+def test_truncation_is_in_memory(tmp_path):
+    src = PdfSource(_pdf(tmp_path, 5), max_pages=2)
+
+    assert (src.page_count, src.truncated, src.pages_used) == (5, True, 2)
+    assert len(src.page_texts()) == 2 and "pagina 2" in src.page_texts()[1]
+
+    (name, data), size = src.upload_file()
+    assert name.endswith(".pdf") and size == len(data)
+    assert len(PdfReader(io.BytesIO(data)).pages) == 2
+    assert os.listdir(tmp_path) == ["rfq.pdf"]
+
+
+def test_upload_sends_truncated_bytes_only_when_uploading(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_FILE_REUSE_ENABLED", "false")
+    sent = []
+
+    def create(file, **kw):
+        sent.append(file)
+        return SimpleNamespace(id="file-1")
+
+    client = SimpleNamespace(files=SimpleNamespace(create=create))
+    small = PdfSource(_pdf(tmp_path, 1), max_pages=2)
+    assert upload_or_reuse(client, small) == ("file-1", False)
+    assert sent[-1].closed  # archivo original, handle cerrado
+
+    big = PdfSource(_pdf(tmp_path, 4), max_pages=2)
+    upload_or_reuse(client, big)
+    name, data = sent[-1]
+    assert len(PdfReader(io.BytesIO(data)).pages) == 2
+
+
+def test_extractor_leaves_no_truncated_files(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_ENABLED", "false")
+    monkeypatch.setenv("OPENAI_PDF_MAX_PAGES", "2")
+
+    res = DocumentExtractor().extract(_pdf(tmp_path, 4), "rfq.pdf", "application/pdf")
+
+    assert "TRUNCATED_PDF_PAGES" in res.global_warnings
+    assert len(res.items) == 2
+    assert os.listdir(tmp_path) == ["rfq.pdf"]
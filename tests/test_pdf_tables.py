@@ -0,0 +1,123 @@
+"""Tablas de PDF reconstruidas con el modo layout de pypdf -> fallback_table_text_to_extraction."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.services.document_extractor import DocumentExtractor
+from app.services.local_fallback_parser import fallback_table_text_to_extraction, table_header_columns
+from app.services.openai_extractor import OpenAIExtractor
+from app.services.pdf_tables import rebuild_table
+
+_ROWS = [
+    ("1", "Cable THHN 12 AWG rojo", "100", "m"),
+    ("2", "Tubo conduit PVC 1/2 pulgada", "25", "und"),
+    ("3", "Breaker enchufable 1x20A", "12", "und"),
+]
+
+
+def _table_pdf(tmp_path) -> str:
+    path = str(tmp_path / "cotizacion.pdf")
+    c = canvas.Canvas(path, pagesize=letter)
+    c.drawString(60, 760, "Ferretería El Tornillo - NIT 900.123.456 - Tel 300 123 4567")
+    y = 720
+    for item, desc, qty, uom in [("Item", "Descripción", "Cant.", "Unidad")] + _ROWS + [("", "Subtotal", "1.250.000", "")]:
+        c.drawString(60, y, item)
+        c.drawString(100, y, desc)
+        c.drawRightString(400, y, qty)
+        c.drawString(430, y, uom)
+        y -= 16
+    c.save()
+    return path
+
+
+def test_rebuild_table_pages_continuations_and_totals():
+    page1 = (
+        "COTIZACIÓN 123        Fecha 2026-10-01\n"
+        "Item   Descripción                   Cant.   Unidad\n"
+        "1      Cable THHN 12 AWG               100   m\n"
+        "       rojo x rollo\n"
+        "2      Tubo conduit 1/2                 25   und\n"
+    )
+    page2 = (
+        "Item   Descripción                   Cant.   Unidad\n"
+        "3      Breaker 1x20A                     12   und\n"
+        "       Subtotal                   1.250.000\n"
+        "Condiciones: pago a 30 días       50   und\n"
+    )
+    text, meta = rebuild_table([page1, page2])
+    lines = text.splitlines()
+
+    assert lines[0].split("\t") == ["Item", "Descripción", "Cant.", "Unidad"]
+    assert lines[1].split("\t") == ["1", "Cable THHN 12 AWG rojo x rollo", "100", "m"]
+    assert lines[3].split("\t") == ["3", "Breaker 1x20A", "12", "und"]
+    assert meta["rows"] == 3 and meta["pages"] == [0, 1]
+    assert rebuild_table(["10 und Cable THHN\n5 m Tubo conduit"]) is None
+
+
+def test_table_pdf_parses_columns_locally(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_ENABLED", "false")
+    res = DocumentExtractor().extract(_table_pdf(tmp_path), "cotizacion.pdf", "application/pdf")
+
+    got = [(it.description, it.quantity, it.uom.value) for it in res.items]
+    assert got == [("Cable THHN 12 AWG rojo", 100.0, "M"), ("Tubo conduit PVC 1/2 pulgada", 25.0, "UND"),
+                   ("Breaker enchufable 1x20A", 12.0, "UND")]
+    assert res.meta["pdf_table"]["rows"] == 3
+
+
+def test_table_pdf_skips_llm(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_ENABLED", "true")
+    monkeypatch.setenv("OPENAI_ENRICH_ENABLED", "false")
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace())
+    monkeypatch.setattr(OpenAIExtractor, "extract_from_pdf", lambda *a, **k: (_ for _ in ()).throw(AssertionError()))
+
+    res = DocumentExtractor().extract(_table_pdf(tmp_path), "cotizacion.pdf", "application/pdf")
+
+    assert "SKIPPED_OPENAI" in res.global_warnings and len(res.items) == 3
+
+
+def test_unit_price_column_is_not_the_unit():
+    layout = (
+        "Item  Descripción                 Cant.   Und   Vr. Unitario      Total\n"
+        "1     Cable THHN 12 AWG             100   m          2.500    250.000\n"
+        "2     Tubo conduit 1/2               25   und        3.100     77.500\n"
+    )
+    text, _ = rebuild_table([layout])
+    res = fallback_table_text_to_extraction(text, "pdf")
+
+    got = [(it.description, it.quantity, it.uom.value, it.uom_raw) for it in res.items]
+    assert got == [("Cable THHN 12 AWG", 100.0, "M", "m"), ("Tubo conduit 1/2", 25.0, "UND", "und")]
+    assert table_header_columns(["Item", "Descripción", "Cant.", "Vr. Unitario"])["uom"] is None
+
+
+def test_enrichment_context_uses_table_rows(tmp_path):
+    table_text = "Item\tDescripción\tCant.\tUnidad\n1\tCable THHN\t100\tm\n2\tTubo conduit\t\t\n3\tBreaker\t12\tund"
+    pdf = SimpleNamespace(table=lambda: (table_text, {"rows": 3}))
+    res = fallback_table_text_to_extraction(table_text, "pdf")
+    res.meta = {**(res.meta or {}), "pdf_table": {"rows": 3}}
+    ex = DocumentExtractor()
+
+    ctx = ex._pdf_enrich_context(pdf, res, "Ferretería El Tornillo\nNIT 900.123.456\nItem\nDescripción")
+    batches = ex._enrich_batches(res, ctx)
+
+    assert res.items[1].line_index == 1
+    assert "[1] 2\tTubo conduit" in batches[0][1]
+    assert ex._pdf_enrich_context(pdf, SimpleNamespace(meta={}), "pdf text") == "pdf text"
+
+
+def test_descriptions_mentioning_iva_or_total_are_items():
+    layout = (
+        "Item  Descripción                          Cant.   Unidad\n"
+        "1     Estación total topográfica               2   und\n"
+        "2     Lámina galvanizada sin IVA              20   und\n"
+        "3     Cable THHN 12 AWG                      100   m\n"
+        "      IVA 19%                            237.500\n"
+        "4     Fuera de la tabla                        1   und\n"
+    )
+    text, meta = rebuild_table([layout])
+    rows = [ln.split("\t") for ln in text.splitlines()[1:]]
+
+    assert [r[1] for r in rows] == ["Estación total topográfica", "Lámina galvanizada sin IVA", "Cable THHN 12 AWG"]
+    assert meta["rows"] == 3
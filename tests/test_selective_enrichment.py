@@ -0,0 +1,56 @@
+"""Enrichment sends only flagged items (with nearby context) and merges them back by line_index."""
+from __future__ import annotations
+
+import json
+import threading
+from types import SimpleNamespace
+
+from app.services.document_extractor import DocumentExtractor
+from app.services.openai_extractor import OpenAIExtractor
+
+
+class _EnrichResponses:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.prompts = []
+
+    def create(self, **kwargs):
+        prompt = kwargs["input"][0]["content"][0]["text"]
+        with self.lock:
+            self.prompts.append(prompt)
+        items = json.loads(prompt.split("ÍTEMS PARSEADOS (JSON):\n", 1)[1].split("\n\n", 1)[0])
+        out = [{**it, "description": f"FIXED {it['description']}", "uom": "M"} for it in items]
+        return SimpleNamespace(output_text=json.dumps(out))
+
+
+def _rfq() -> str:
+    lines = ["TUBERIA CONDUIT:"]
+    lines += [f"tubo conduit pvc {i} - {i + 1} und" for i in range(30)]
+    lines += ["CABLES:", "cable encauchetado", "CABLE THHN 12 AWG 100 m"]
+    lines += [f"caja galvanizada {i} - 2 und" for i in range(30)]
+    lines += ["Varilla copperweld"]
+    return "\n".join(lines)
+
+
+def test_only_flagged_lines_are_enriched(monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_ENRICH_ENABLED", "true")
+    monkeypatch.setenv("OPENAI_ENRICH_BATCH_SIZE", "1")
+    monkeypatch.setenv("OPENAI_ENRICH_CONTEXT_LINES", "1")
+    responses = _EnrichResponses()
+    monkeypatch.setattr(OpenAIExtractor, "_make_client", lambda self: SimpleNamespace(responses=responses))
+    src = tmp_path / "rfq.txt"
+    src.write_text(_rfq(), encoding="utf-8")
+
+    res = DocumentExtractor().extract(str(src), "rfq.txt", None)
+
+    fixed = {it.line_index: it for it in res.items if it.description.startswith("FIXED")}
+    # los dos encabezados de sección se parsean como items de baja confianza y también van
+    assert sorted(fixed) == [0, 31, 32, 64]
+    assert fixed[32].description == "FIXED cable encauchetado" and fixed[32].uom.value == "M"
+    assert res.meta["enrichment_items_sent"] == 4
+    assert res.meta["enrichment_batches"] == 4
+
+    # cada lote lleva solo su vecindario + el encabezado de sección más cercano
+    ctx = next(p for p in responses.prompts if '"line_index": 32' in p)
+    assert "[31] CABLES:" in ctx and "[33] CABLE THHN 12 AWG 100 m" in ctx
+    assert "TUBERIA CONDUIT" not in ctx and "caja galvanizada" not in ctx